@@ -0,0 +1,343 @@
+"""ASGI serving mode of the RSS server
+
+Serves the same feeds as rss_server.py from a single event loop. Requests
+never hold a thread while a crawl runs: crawls execute on a small pool and
+every request for a school awaits the same run, or gets the stored feed
+right away while the crawl refreshes it in the background. Sealed archives
+and recently rendered feeds are answered from memory.
+
+Run with any ASGI server, e.g.:
+    uvicorn asgi:app --host 0.0.0.0 --port 5001
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import parse_qs
+import asyncio
+import json
+import os
+import sys
+import time
+
+# Add src directory to Python path
+sys.path.append('src')
+
+from src.utils.log_utils import setup_logger
+from src.utils.format_utils import render_job_html, render_jobs_to_xml
+from src.utils.store_utils import load_job, load_jobs, load_subscription_jobs
+from src.utils.paged_feed_utils import (
+    ITEM_MAX_AGE, render_archive_page, render_category_feed, render_subscription_page, get_archive_path,
+    item_etag, item_url_function
+)
+from src.utils.stream_utils import STREAM_PORT, Broadcaster
+from src.utils.school_utils import SCHOOL_CODES, get_categories, run_crawler
+from src.utils.stats_utils import DEFAULT_TOP, render_stats
+from src.utils.debug_utils import DEBUG_TOKEN, check_token, handle as handle_debug
+from src.scheduler import CrawlScheduler
+
+logger = setup_logger('asgi')
+
+# Threads running crawlers; waiting requests don't occupy any
+CRAWL_WORKERS = int(os.environ.get('CRAWL_WORKERS', '4'))
+
+# Seconds after a crawl during which a school is not crawled again
+CRAWL_FRESHNESS = 300
+
+# Seconds a rendered feed is served from memory
+FEED_CACHE_SECONDS = 5
+
+# Sealed archive documents kept in memory
+ARCHIVE_CACHE_SIZE = 256
+
+# Same meaning as in rss_server.py
+SCHEDULER = os.environ.get('SCHEDULER', '')
+
+XML_HEADERS = [('content-type', 'application/xml; charset=utf-8')]
+
+_crawl_executor = ThreadPoolExecutor(CRAWL_WORKERS, thread_name_prefix='crawl')
+_crawls = {}
+_last_crawl = {}
+_feed_cache = {}
+_archive_cache = OrderedDict()
+
+def _start_crawl(school_code):
+    """Return the running crawl of a school, starting one if there is none"""
+    future = _crawls.get(school_code)
+    if future is None:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(_crawl_executor, run_crawler, school_code)
+        _crawls[school_code] = future
+
+        def finished(_):
+            _crawls.pop(school_code, None)
+            _last_crawl[school_code] = time.time()
+            # Renders of the school's feed for every Host header
+            for key in [key for key in _feed_cache if key[:2] == ('rss', school_code)]:
+                _feed_cache.pop(key, None)
+
+        future.add_done_callback(finished)
+    return future
+
+async def _cached(key, render, *args):
+    """Render a feed on the default executor, reusing the result for FEED_CACHE_SECONDS"""
+    entry = _feed_cache.get(key)
+    if entry is None or entry[0] <= time.monotonic():
+        # Concurrent requests share one render
+        future = asyncio.get_running_loop().run_in_executor(None, render, *args)
+        entry = (time.monotonic() + FEED_CACHE_SECONDS, future)
+        _feed_cache[key] = entry
+        # Don't keep serving a failed or cancelled render
+        future.add_done_callback(lambda f: (f.cancelled() or f.exception()) and _feed_cache.pop(key, None))
+    return await asyncio.shield(entry[1])
+
+def _base_url(scope):
+    """Absolute URL prefix used in feed links"""
+    if os.environ.get('FEED_BASE_URL'):
+        return os.environ['FEED_BASE_URL']
+    headers = dict(scope['headers'])
+    host = headers.get(b'host', b'localhost').decode('latin-1')
+    return f"{scope.get('scheme', 'http')}://{host}"
+
+def _render_school_feed(school_code, base_url):
+    xml = render_subscription_page(school_code, SCHOOL_CODES[school_code]['name'], base_url)
+    if xml:
+        return xml.encode('utf-8')
+    # Fall back to XML file written by the crawler
+    xml_path = Path('data/xml') / f'{school_code}_jobs.xml'
+    return xml_path.read_bytes() if xml_path.exists() else None
+
+async def get_rss(scope, school_code):
+    """Stored feed of a school, crawling first only if nothing is stored yet"""
+    base_url = _base_url(scope)
+    body = await _cached(('rss', school_code, base_url), _render_school_feed, school_code, base_url)
+
+    # Crawl unless the scheduler keeps the store fresh or a crawl just ran
+    if not SCHEDULER and time.time() - _last_crawl.get(school_code, 0) > CRAWL_FRESHNESS:
+        if body is None:
+            await asyncio.shield(_start_crawl(school_code))
+            body = await _cached(('rss', school_code, base_url), _render_school_feed, school_code, base_url)
+        else:
+            # Serve what we have, later requests see the refreshed feed
+            _start_crawl(school_code)
+
+    if body is None:
+        return 404, [], f"XML file not found for {school_code}".encode('utf-8')
+    return 200, XML_HEADERS, body
+
+def _render_category_feed(school_code, category, limit, base_url):
+    xml = render_category_feed(school_code, SCHOOL_CODES[school_code]['name'], category, base_url, limit)
+    return xml.encode('utf-8') if xml is not None else None
+
+async def get_category_rss(scope, school_code, category, limit):
+    """Stored feed of one listing category, refreshed by the school's crawl"""
+    base_url = _base_url(scope)
+    key = ('category', school_code, category, limit, base_url)
+    body = await _cached(key, _render_category_feed, school_code, category, limit, base_url)
+    if body is None:
+        return 404, [], f"Invalid category for {school_code}: {category}".encode('utf-8')
+
+    # All categories are crawled in one run, serve what we have meanwhile
+    if not SCHEDULER and time.time() - _last_crawl.get(school_code, 0) > CRAWL_FRESHNESS:
+        _start_crawl(school_code)
+    return 200, XML_HEADERS, body
+
+def _load_archive(school_code, index, base_url):
+    """Archive page bytes, None if the archive is not sealed yet"""
+    school_name = SCHOOL_CODES[school_code]['name']
+    if os.environ.get('FEED_BASE_URL'):
+        archive_path = get_archive_path(school_code, school_name, index, base_url)
+        return archive_path.read_bytes() if archive_path else None
+    # Links come from the Host header, so the page isn't written to the shared archive
+    xml = render_archive_page(school_code, school_name, index, base_url)
+    return xml.encode('utf-8') if xml is not None else None
+
+async def get_rss_archive(scope, school_code, index):
+    """Sealed archive page, kept in memory per base URL since it never changes"""
+    base_url = _base_url(scope)
+    key = (school_code, index, base_url)
+    body = _archive_cache.get(key)
+    if body is None:
+        loop = asyncio.get_running_loop()
+        body = await loop.run_in_executor(None, _load_archive, school_code, index, base_url)
+        if body is None:
+            return 404, [], f"Archive {index} not found for {school_code}".encode('utf-8')
+        _archive_cache[key] = body
+        if len(_archive_cache) > ARCHIVE_CACHE_SIZE:
+            _archive_cache.popitem(last=False)
+    else:
+        _archive_cache.move_to_end(key)
+
+    return 200, XML_HEADERS + [('cache-control', 'public, max-age=31536000, immutable')], body
+
+async def get_all_rss(scope):
+    """Run all crawlers concurrently and report their results"""
+    codes = list(SCHOOL_CODES)
+    results = await asyncio.gather(*(asyncio.shield(_start_crawl(code)) for code in codes))
+    body = {'results': [
+        {'school': SCHOOL_CODES[code]['name'], 'success': success}
+        for code, success in zip(codes, results)
+    ]}
+    return 200, [('content-type', 'application/json')], json.dumps(body).encode('utf-8')
+
+def _render_merged(limit, collapse, base_url):
+    jobs = load_jobs(limit=limit, collapse_duplicates=collapse)
+    return render_jobs_to_xml(jobs, '全部学校', item_url=item_url_function(base_url)).encode('utf-8')
+
+def _render_subscription(name, limit, base_url):
+    jobs = load_subscription_jobs(name, limit=limit)
+    if jobs is None:
+        return None
+    return render_jobs_to_xml(jobs, f'订阅：{name}', item_url=item_url_function(base_url)).encode('utf-8')
+
+async def get_item(scope, school_code, seq):
+    """Full stored record of a job, linked from compact feed items"""
+    job = await asyncio.get_running_loop().run_in_executor(None, load_job, school_code, seq)
+    if job is None:
+        return 404, [], f"Item {seq} not found for {school_code}".encode('utf-8')
+
+    etag = f'"{item_etag(job)}"'
+    headers = [('etag', etag), ('cache-control', f'public, max-age={ITEM_MAX_AGE}')]
+    if_none_match = dict(scope['headers']).get(b'if-none-match', b'').decode('latin-1')
+    if etag in [tag.strip() for tag in if_none_match.split(',')]:
+        return 304, headers, b''
+    body = render_job_html(job, SCHOOL_CODES[school_code]['name']).encode('utf-8')
+    return 200, headers + [('content-type', 'text/html; charset=utf-8')], body
+
+async def get_debug(scope, action, query):
+    """Profiling and inspection endpoints, see src/utils/debug_utils.py"""
+    token = dict(scope['headers']).get(b'x-debug-token', b'').decode('latin-1')
+    if not check_token(token or query.get('token', [''])[0]):
+        return 403, [], b'Forbidden'
+    params = {name: values[0] for name, values in query.items()}
+    # Profiles sleep while sampling, keep them off the event loop
+    status, content_type, body = await asyncio.get_running_loop().run_in_executor(
+        None, handle_debug, action, params
+    )
+    return status, [('content-type', content_type)], body
+
+def _int_arg(query, name, default):
+    try:
+        return int(query.get(name, [default])[0])
+    except ValueError:
+        return default
+
+def index():
+    """Show available RSS feeds"""
+    links = ''
+    for code, info in SCHOOL_CODES.items():
+        links += f'<li><a href="/rss/{code}">{info["name"]}</a></li>'
+        categories = get_categories(code)
+        if len(categories) > 1:
+            links += '<ul>' + ''.join(
+                f'<li><a href="/rss/{code}/category/{category}">{label}</a></li>'
+                for category, label in categories.items()
+            ) + '</ul>'
+    html = f"""
+    <h1>Available RSS Feeds</h1>
+    <ul>
+        {links}
+        <li><a href="/rss/all">All Schools</a></li>
+        <li><a href="/rss/merged?collapse=1">Merged Feed (duplicates collapsed)</a></li>
+        <li><a href="/stream">Live Stream (Server-Sent Events)</a></li>
+        <li><a href="/stats">Statistics (JSON)</a></li>
+    </ul>
+    """
+    return 200, [('content-type', 'text/html; charset=utf-8')], html.encode('utf-8')
+
+async def route(scope):
+    """Dispatch a request, returns (status, headers, body)"""
+    parts = [part for part in scope['path'].split('/') if part]
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+
+    if not parts:
+        return index()
+    if parts[0] == 'stream' and len(parts) <= 2:
+        if len(parts) == 2 and parts[1] not in SCHOOL_CODES:
+            return 404, [], f"Invalid school code: {parts[1]}".encode('utf-8')
+        host = dict(scope['headers']).get(b'host', b'localhost').decode('latin-1').split(':')[0]
+        stream_base = os.environ.get('STREAM_BASE_URL') or f"{scope.get('scheme', 'http')}://{host}:{STREAM_PORT}"
+        location = f"{stream_base}{scope['path']}"
+        if scope.get('query_string'):
+            location += '?' + scope['query_string'].decode('latin-1')
+        return 307, [('location', location)], b''
+    if parts == ['stats']:
+        top = _int_arg(query, 'top', DEFAULT_TOP)
+        body = await asyncio.get_running_loop().run_in_executor(None, render_stats, top)
+        return 200, [('content-type', 'application/json')], body
+    if parts[0] == 'debug' and DEBUG_TOKEN and len(parts) > 1:
+        return await get_debug(scope, '/'.join(parts[1:]), query)
+    if parts[0] == 'item' and len(parts) == 3 and parts[2].isdigit():
+        if parts[1] not in SCHOOL_CODES:
+            return 404, [], f"Invalid school code: {parts[1]}".encode('utf-8')
+        return await get_item(scope, parts[1], int(parts[2]))
+    if parts[0] != 'rss' or len(parts) < 2:
+        return 404, [], b'Not found'
+
+    if parts[1] == 'all' and len(parts) == 2:
+        return await get_all_rss(scope)
+    if parts[1] == 'merged' and len(parts) == 2:
+        limit = _int_arg(query, 'limit', 200)
+        collapse = query.get('collapse', ['0'])[0] == '1'
+        base_url = _base_url(scope)
+        body = await _cached(('merged', limit, collapse, base_url), _render_merged, limit, collapse, base_url)
+        return 200, XML_HEADERS, body
+    if parts[1] == 'sub' and len(parts) == 3:
+        limit = _int_arg(query, 'limit', 50)
+        base_url = _base_url(scope)
+        body = await _cached(('sub', parts[2], limit, base_url), _render_subscription, parts[2], limit, base_url)
+        if body is None:
+            return 404, [], f"Subscription not found: {parts[2]}".encode('utf-8')
+        return 200, XML_HEADERS, body
+
+    school_code = parts[1]
+    if school_code not in SCHOOL_CODES:
+        return 404, [], f"Invalid school code: {school_code}".encode('utf-8')
+    if len(parts) == 2:
+        return await get_rss(scope, school_code)
+    if len(parts) == 4 and parts[2] == 'archive' and parts[3].isdigit():
+        return await get_rss_archive(scope, school_code, int(parts[3]))
+    if len(parts) == 4 and parts[2] == 'category':
+        return await get_category_rss(scope, school_code, parts[3], _int_arg(query, 'limit', 50))
+    return 404, [], b'Not found'
+
+async def _lifespan(receive, send):
+    background = []
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # The stream server shares this event loop
+            background.append(asyncio.ensure_future(Broadcaster(SCHOOL_CODES).serve()))
+            if SCHEDULER == '1':
+                CrawlScheduler(SCHOOL_CODES).start()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            for task in background:
+                task.cancel()
+            _crawl_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    """ASGI 3 entry point"""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    if scope['method'] not in ('GET', 'HEAD'):
+        status, headers, body = 405, [], b'Method not allowed'
+    else:
+        try:
+            status, headers, body = await route(scope)
+        except Exception as e:
+            logger.error(f"Error handling {scope['path']}: {str(e)}")
+            status, headers, body = 500, [], b'Internal server error'
+
+    headers = headers + [('content-length', str(len(body)))]
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    })
+    await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else body})
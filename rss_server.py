@@ -1,38 +1,35 @@
-from flask import Flask, send_file
+from flask import Flask, Response, redirect, request, send_file
 from pathlib import Path
-import importlib
 import logging
+import os
 import sys
 
 # Add src directory to Python path
 sys.path.append('src')
 
 from src.utils.log_utils import setup_logger
+from src.utils.format_utils import render_job_html, render_jobs_to_xml
+from src.utils.store_utils import load_job, load_jobs, load_subscription_jobs
+from src.utils.paged_feed_utils import (
+    ITEM_MAX_AGE, render_archive_page, render_category_feed, render_subscription_page, get_archive_path,
+    item_etag, item_url_function
+)
+from src.utils.stream_utils import STREAM_PORT, start_stream_server
+from src.utils.school_utils import SCHOOL_CODES, get_categories, run_crawler
+from src.utils.stats_utils import DEFAULT_TOP, render_stats
+from src.utils.debug_utils import DEBUG_TOKEN, check_token, handle as handle_debug
+from src.scheduler import CrawlScheduler
 
 app = Flask(__name__)
 logger = setup_logger('rss_server')
 
-# School code mapping
-SCHOOL_CODES = {
-    'fudan': {'module': 'src.fudan_job_crawl', 'name': '复旦大学'},
-    'sjtu': {'module': 'src.sjtu_job_crawl', 'name': '上海交通大学'},
-    'tongji': {'module': 'src.tongji_job_crawl', 'name': '同济大学'},
-    'hust': {'module': 'src.hust_job_crawl', 'name': '华中科技大学'},
-    'nankai': {'module': 'src.nankai_job_crawl', 'name': '南开大学'},
-    'dlut': {'module': 'src.dlut_job_crawl', 'name': '大连理工大学'}
-}
-
-def run_crawler(school_code):
-    """Run the crawler for specified school"""
-    try:
-        # Import crawler module dynamically
-        module = importlib.import_module(SCHOOL_CODES[school_code]['module'])
-        # Run crawler
-        module.main()
-        return True
-    except Exception as e:
-        logger.error(f"Error running crawler for {school_code}: {str(e)}")
-        return False
+# Crawl in the background instead of on every feed request: '1' runs the
+# scheduler inside this server, 'external' when src/scheduler.py runs as a daemon
+SCHEDULER = os.environ.get('SCHEDULER', '')
+
+def get_base_url():
+    """Absolute URL prefix used in feed links"""
+    return os.environ.get('FEED_BASE_URL') or request.host_url.rstrip('/')
 
 @app.route('/')
 def index():
@@ -40,12 +37,21 @@ def index():
     links = []
     for code, info in SCHOOL_CODES.items():
         links.append(f'<li><a href="/rss/{code}">{info["name"]}</a></li>')
+        categories = get_categories(code)
+        if len(categories) > 1:
+            links.append('<ul>' + ''.join(
+                f'<li><a href="/rss/{code}/category/{category}">{label}</a></li>'
+                for category, label in categories.items()
+            ) + '</ul>')
     
     html = f"""
     <h1>Available RSS Feeds</h1>
     <ul>
         {''.join(links)}
         <li><a href="/rss/all">All Schools</a></li>
+        <li><a href="/rss/merged?collapse=1">Merged Feed (duplicates collapsed)</a></li>
+        <li><a href="/stream">Live Stream (Server-Sent Events)</a></li>
+        <li><a href="/stats">Statistics (JSON)</a></li>
     </ul>
     """
     return html
@@ -58,10 +64,16 @@ def get_rss(school_code):
         
     logger.info(f"RSS request received for {SCHOOL_CODES[school_code]['name']}")
     
-    # Run crawler
-    run_crawler(school_code)
+    # Run crawler unless the scheduler keeps the store fresh
+    if not SCHEDULER:
+        run_crawler(school_code)
+    
+    # Return newest page with links to archived pages
+    xml = render_subscription_page(school_code, SCHOOL_CODES[school_code]['name'], get_base_url())
+    if xml:
+        return Response(xml, mimetype='application/xml')
     
-    # Return XML file
+    # Fall back to XML file written by the crawler
     xml_path = Path('data/xml') / f'{school_code}_jobs.xml'
     if not xml_path.exists():
         return f"XML file not found for {school_code}", 404
@@ -73,6 +85,48 @@ def get_rss(school_code):
         download_name=f'{school_code}_jobs.xml'
     )
 
+@app.route('/rss/<school_code>/archive/<int:index>')
+def get_rss_archive(school_code, index):
+    """Return a sealed RFC 5005 archive page, which never changes"""
+    if school_code not in SCHOOL_CODES:
+        return f"Invalid school code: {school_code}", 404
+        
+    school_name = SCHOOL_CODES[school_code]['name']
+    if os.environ.get('FEED_BASE_URL'):
+        archive_path = get_archive_path(school_code, school_name, index, get_base_url())
+        if archive_path is None:
+            return f"Archive {index} not found for {school_code}", 404
+        response = send_file(
+            archive_path,
+            mimetype='application/xml',
+            as_attachment=False,
+            download_name=f'{school_code}_archive_{index}.xml'
+        )
+    else:
+        # Links come from the Host header, so the page isn't written to the shared archive
+        xml = render_archive_page(school_code, school_name, index, get_base_url())
+        if xml is None:
+            return f"Archive {index} not found for {school_code}", 404
+        response = Response(xml, mimetype='application/xml')
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@app.route('/rss/<school_code>/category/<category>')
+def get_category_rss(school_code, category):
+    """Return feed of one listing category of a school"""
+    if school_code not in SCHOOL_CODES:
+        return f"Invalid school code: {school_code}", 404
+        
+    # All categories are crawled in one run
+    if not SCHEDULER:
+        run_crawler(school_code)
+        
+    limit = request.args.get('limit', 50, type=int)
+    xml = render_category_feed(school_code, SCHOOL_CODES[school_code]['name'], category, get_base_url(), limit)
+    if xml is None:
+        return f"Invalid category for {school_code}: {category}", 404
+    return Response(xml, mimetype='application/xml')
+
 @app.route('/rss/all')
 def get_all_rss():
     """Run all crawlers and return list of XML files"""
@@ -85,5 +139,73 @@ def get_all_rss():
         })
     return {'results': results}
 
+@app.route('/rss/merged')
+def get_merged_rss():
+    """Return newest stored jobs of all schools as one RSS feed"""
+    collapse = request.args.get('collapse', '0') == '1'
+    limit = request.args.get('limit', 200, type=int)
+    
+    jobs = load_jobs(limit=limit, collapse_duplicates=collapse)
+    xml = render_jobs_to_xml(jobs, '全部学校', item_url=item_url_function(get_base_url()))
+    return Response(xml, mimetype='application/xml')
+
+@app.route('/stream')
+@app.route('/stream/<school_code>')
+def get_stream(school_code=None):
+    """Redirect to the SSE stream server, EventSource clients follow redirects"""
+    if school_code and school_code not in SCHOOL_CODES:
+        return f"Invalid school code: {school_code}", 404
+        
+    host = request.host.split(':')[0]
+    stream_base = os.environ.get('STREAM_BASE_URL') or f"{request.scheme}://{host}:{STREAM_PORT}"
+    location = f"{stream_base}{request.full_path.rstrip('?')}"
+    return redirect(location, code=307)
+
+@app.route('/rss/sub/<name>')
+def get_subscription_rss(name):
+    """Return feed of a keyword subscription, filled as crawlers store new jobs"""
+    limit = request.args.get('limit', 50, type=int)
+    
+    jobs = load_subscription_jobs(name, limit=limit)
+    if jobs is None:
+        return f"Subscription not found: {name}", 404
+        
+    xml = render_jobs_to_xml(jobs, f'订阅：{name}', item_url=item_url_function(get_base_url()))
+    return Response(xml, mimetype='application/xml')
+
+@app.route('/item/<school_code>/<int:seq>')
+def get_item(school_code, seq):
+    """Return the full stored record of a job, linked from compact feed items"""
+    if school_code not in SCHOOL_CODES:
+        return f"Invalid school code: {school_code}", 404
+        
+    job = load_job(school_code, seq)
+    if job is None:
+        return f"Item {seq} not found for {school_code}", 404
+        
+    response = Response(render_job_html(job, SCHOOL_CODES[school_code]['name']), mimetype='text/html')
+    response.set_etag(item_etag(job))
+    response.cache_control.public = True
+    response.cache_control.max_age = ITEM_MAX_AGE
+    return response.make_conditional(request)
+
+@app.route('/stats')
+def get_stats():
+    """Return posting counts per school and day, company, location and industry"""
+    top = request.args.get('top', DEFAULT_TOP, type=int)
+    return Response(render_stats(top), mimetype='application/json')
+
+if DEBUG_TOKEN:
+    @app.route('/debug/<path:action>')
+    def get_debug(action):
+        """Profiling and inspection endpoints, see src/utils/debug_utils.py"""
+        if not check_token(request.headers.get('X-Debug-Token') or request.args.get('token')):
+            return "Forbidden", 403
+        status, content_type, body = handle_debug(action, request.args.to_dict())
+        return Response(body, status=status, content_type=content_type)
+
 if __name__ == '__main__':
+    start_stream_server(SCHOOL_CODES)
+    if SCHEDULER == '1':
+        CrawlScheduler(SCHOOL_CODES).start()
     app.run(host='0.0.0.0', port=5001) 
\ No newline at end of file
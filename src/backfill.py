@@ -0,0 +1,188 @@
+"""Full-history backfill of a school's listings
+
+Discovers how many listing pages a school has, fetches them concurrently
+under a per-host rate limit, parses them in a process pool and stores the
+jobs. The rate limit defaults to that of regular crawls; --rate raises it
+for an upstream known to cope. Completed pages are checkpointed, so an
+interrupted run continues where it stopped, as long as the listing hasn't
+changed since: new postings push older items onto page numbers already
+done, so a run that finds a different total or newest posting starts
+over. Pages are requested oldest first to keep the feed log roughly
+chronological.
+
+Usage:
+    python src/backfill.py nankai
+    python src/backfill.py fudan sjtu --concurrency 8 --rate 2
+    python src/backfill.py hust --restart
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from urllib.parse import urlsplit
+import argparse
+import importlib
+import json
+import math
+import time
+from utils.log_utils import setup_logger, get_logger
+from utils.page_size_utils import negotiate_page_size
+from utils.rate_utils import CRAWL_RATE, get_rate_limiter
+from utils.school_utils import SCHOOL_CODES
+from utils.store_utils import store_jobs
+
+# Checkpoints: a JSON header line, then one completed page number per line
+CHECKPOINT_DIR = Path('data/backfill')
+
+def load_crawler(school_code):
+    return importlib.import_module(SCHOOL_CODES[school_code]['module'])
+
+def _parse_page(module_name, content):
+    """Parse one page in a worker process"""
+    return importlib.import_module(module_name).parse_job_list(content)
+
+def discover_pages(school_code, module):
+    """
+    Describe a school's full listing as it is now
+
+    Args:
+        school_code: School code
+        module: Crawler module
+
+    Returns:
+        dict: 'page_size' (None for fixed-size sites), 'pages', 'total'
+            items (None if the site doesn't report it) and URL of the
+            'newest' posting, None if the first page could not be fetched
+    """
+    if hasattr(module, 'get_total_count'):
+        page_size = negotiate_page_size(school_code, module.DEFAULT_PAGE_SIZE,
+                                        module.fetch_job_page, module.parse_job_list)
+        content = module.fetch_job_page(1, page_size)
+        if not content:
+            return None
+        total = module.get_total_count(content) or 0
+        pages = max(math.ceil(total / page_size), 1)
+    else:
+        page_size = total = None
+        content = module.fetch_job_page(1)
+        if not content:
+            return None
+        pages = module.get_max_page(content)
+
+    jobs = module.parse_job_list(content) or []
+    return {'page_size': page_size, 'pages': pages, 'total': total,
+            'newest': jobs[0]['url'] if jobs else None}
+
+def load_checkpoint(school_code, listing):
+    """Return pages completed by an earlier run over the same listing"""
+    path = CHECKPOINT_DIR / f'{school_code}.log'
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if any(header.get(key) != value for key, value in listing.items()):
+                # Items of pages not done yet may have moved onto done ones
+                get_logger(__name__).info(f"Listing of {school_code} changed since the checkpoint, starting over")
+                return set()
+            return {int(line) for line in f if line.strip()}
+    except (OSError, ValueError):
+        return set()
+
+def open_checkpoint(school_code, listing, resumed):
+    """Open checkpoint log for appending, writing a new header unless resumed"""
+    CHECKPOINT_DIR.mkdir(parents=True, exist_ok=True)
+    path = CHECKPOINT_DIR / f'{school_code}.log'
+    if not resumed:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({**listing, 'started_at': time.time()}, ensure_ascii=False) + '\n')
+    return open(path, 'a', encoding='utf-8')
+
+def backfill_school(school_code, concurrency=4, rate=CRAWL_RATE, processes=None, restart=False):
+    """
+    Fetch and store every listing page of a school
+
+    Args:
+        school_code: School code
+        concurrency: Pages fetched at the same time
+        rate: Maximum requests per second to the school's host
+        processes: Parser processes, CPU count by default
+        restart: Ignore the checkpoint of an earlier run
+
+    Returns:
+        dict: Pages total, done, failed and jobs stored
+    """
+    logger = get_logger(__name__)
+    module = load_crawler(school_code)
+    limiter = get_rate_limiter(urlsplit(module.BASE_URL).netloc, rate)
+
+    limiter.acquire()
+    listing = discover_pages(school_code, module)
+    if listing is None:
+        logger.error(f"Could not fetch first page of {school_code}")
+        return {'pages': 0, 'done': 0, 'failed': 0, 'stored': 0}
+    page_size, pages = listing['page_size'], listing['pages']
+
+    done = set() if restart else load_checkpoint(school_code, listing)
+    todo = [page for page in range(pages, 0, -1) if page not in done]
+    logger.info(f"Backfilling {school_code}: {pages} pages, {len(done)} already done")
+
+    def fetch(page):
+        limiter.acquire()
+        if page_size:
+            content = module.fetch_job_page(page, page_size)
+        else:
+            content = module.fetch_job_page(page)
+        if not content:
+            return None
+        return parse_pool.submit(_parse_page, module.__name__, content).result()
+
+    stored = 0
+    failed = 0
+    started = time.time()
+    checkpoint = open_checkpoint(school_code, listing, bool(done))
+    try:
+        with ProcessPoolExecutor(processes) as parse_pool, ThreadPoolExecutor(concurrency) as fetch_pool:
+            futures = {fetch_pool.submit(fetch, page): page for page in todo}
+            for count, future in enumerate(as_completed(futures), 1):
+                page = futures[future]
+                try:
+                    jobs = future.result()
+                except Exception as e:
+                    logger.error(f"Error processing {school_code} page {page}: {str(e)}")
+                    jobs = None
+                if jobs is None:
+                    failed += 1
+                    continue
+
+                stored += len(store_jobs(school_code, jobs))
+                # Only pages whose jobs are committed count as done
+                checkpoint.write(f'{page}\n')
+                checkpoint.flush()
+                if count % 50 == 0:
+                    logger.info(f"{school_code}: {count}/{len(todo)} pages, {stored} new jobs, "
+                                f"{count / (time.time() - started):.1f} pages/s")
+    finally:
+        checkpoint.close()
+
+    logger.info(f"Backfill of {school_code} finished: {len(todo) - failed} pages fetched, "
+                f"{failed} failed, {stored} new jobs in {time.time() - started:.0f}s")
+    return {'pages': pages, 'done': pages - failed, 'failed': failed, 'stored': stored}
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill the full listing history of schools')
+    parser.add_argument('schools', nargs='+', help='School codes')
+    parser.add_argument('--concurrency', type=int, default=4, help='Pages fetched at the same time')
+    parser.add_argument('--rate', type=float, default=CRAWL_RATE,
+                        help='Requests per second per host, defaults to the regular crawl rate')
+    parser.add_argument('--processes', type=int, default=None, help='Parser processes, CPU count by default')
+    parser.add_argument('--restart', action='store_true', help='Ignore checkpoints of earlier runs')
+    args = parser.parse_args()
+
+    setup_logger(__name__)
+
+    unknown = set(args.schools) - set(SCHOOL_CODES)
+    if unknown:
+        parser.error(f"Invalid school code: {', '.join(sorted(unknown))}")
+
+    for school_code in args.schools:
+        backfill_school(school_code, args.concurrency, args.rate, args.processes, args.restart)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""Headless batch crawl of several schools
+
+Imports the crawler modules once and runs the selected schools
+concurrently in one process, then prints a JSON report with per-school
+timing, request counts, new feed items and errors. Meant for cron; the web
+server and Flask are never imported.
+
+Exit codes:
+    0  every school crawled without errors
+    1  a crawler raised or none of a school's fetches succeeded
+    2  invalid arguments
+    3  every school fetched something, but some fetches were given up
+
+Usage:
+    python -m src.crawl --schools fudan,sjtu --parallel 4
+    python src/crawl.py --report data/cache/last_crawl.json
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+import argparse
+import importlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+# Crawler modules and utils import each other with src/ on sys.path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.log_utils import setup_logger, get_logger
+from utils.request_utils import get_request_counts
+from utils.school_utils import SCHOOL_CODES
+from utils.store_utils import count_feed_entries
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_PARTIAL = 3
+
+# Error messages kept per school in the report
+MAX_ERRORS = 20
+
+class _ErrorCollector(logging.Handler):
+    """Collect error log messages by the name of the thread that logged them"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.errors = {}
+
+    def emit(self, record):
+        # Called with the handler's lock held
+        errors = self.errors.setdefault(record.threadName, [])
+        if len(errors) < MAX_ERRORS:
+            errors.append(f"{record.name}: {record.getMessage()}")
+
+def crawl_school(school_code, module, collector):
+    """
+    Run one crawler and measure it
+
+    Args:
+        school_code: School code
+        module: Imported crawler module
+        collector: Error collector attached to the root logger
+
+    Returns:
+        dict: Report entry of the school
+    """
+    threading.current_thread().name = f'crawl-{school_code}'
+    host = urlsplit(module.BASE_URL).netloc
+    counts_before = get_request_counts(host)
+    entries_before = count_feed_entries(school_code)
+    started = time.monotonic()
+
+    exception = None
+    try:
+        module.main()
+    except Exception as e:
+        exception = f"{type(e).__name__}: {str(e)}"
+        get_logger(__name__).error(f"Crawler for {school_code} raised {exception}")
+
+    counts = get_request_counts(host)
+    requests = {key: counts[key] - counts_before[key] for key in counts}
+    if exception or (requests['failures'] and not requests['fetched'] and not requests['cache_hits']):
+        status = 'failed'
+    elif requests['failures']:
+        status = 'partial'
+    else:
+        status = 'ok'
+
+    with collector.lock:
+        errors = collector.errors.pop(threading.current_thread().name, [])
+    return {
+        'school': school_code,
+        'status': status,
+        'seconds': round(time.monotonic() - started, 3),
+        'requests': requests['requests'],
+        'fetched': requests['fetched'],
+        'cache_hits': requests['cache_hits'],
+        'failed_fetches': requests['failures'],
+        # Feed entries also include re-emitted edits of known jobs
+        'new_items': count_feed_entries(school_code) - entries_before,
+        'exception': exception,
+        'errors': errors
+    }
+
+def run(school_codes, parallel):
+    """
+    Crawl schools concurrently
+
+    Args:
+        school_codes: School codes to crawl
+        parallel: Schools crawled at the same time
+
+    Returns:
+        dict: Report with one entry per school, in the given order
+    """
+    collector = _ErrorCollector()
+    logging.getLogger().addHandler(collector)
+    started = time.time()
+    try:
+        # Import up front, concurrent first imports would serialize anyway
+        modules = {code: importlib.import_module(SCHOOL_CODES[code]['module']) for code in school_codes}
+        with ThreadPoolExecutor(parallel) as pool:
+            futures = [pool.submit(crawl_school, code, modules[code], collector) for code in school_codes]
+            schools = [future.result() for future in futures]
+    finally:
+        logging.getLogger().removeHandler(collector)
+
+    return {
+        'started_at': started,
+        'seconds': round(time.time() - started, 3),
+        'parallel': parallel,
+        'schools': schools
+    }
+
+def exit_code(report):
+    """Exit code summarizing a report"""
+    statuses = {school['status'] for school in report['schools']}
+    if 'failed' in statuses:
+        return EXIT_FAILED
+    if 'partial' in statuses:
+        return EXIT_PARTIAL
+    return EXIT_OK
+
+def main():
+    parser = argparse.ArgumentParser(description='Crawl schools concurrently and print a JSON report')
+    parser.add_argument('--schools', help='Comma separated school codes, all schools by default')
+    parser.add_argument('--parallel', type=int, default=4, help='Schools crawled at the same time')
+    parser.add_argument('--report', help='Also write the report to this file')
+    args = parser.parse_args()
+
+    school_codes = args.schools.split(',') if args.schools else list(SCHOOL_CODES)
+    unknown = set(school_codes) - set(SCHOOL_CODES)
+    if unknown:
+        parser.error(f"Invalid school code: {', '.join(sorted(unknown))}")
+    if args.parallel < 1:
+        parser.error('--parallel must be at least 1')
+
+    # Logs go to stderr and the log file, stdout carries only the report
+    setup_logger(__name__)
+
+    report = run(school_codes, args.parallel)
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.report:
+        report_path = Path(args.report)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = report_path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(output)
+        os.replace(tmp_path, report_path)
+    print(output)
+    sys.exit(exit_code(report))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Crawl workers sharing a lease-based task queue
+
+Each queued task is one listing page of one school, in one listing
+category for schools that have several. Any number of workers, in
+separate processes or on machines sharing the queue file, claim tasks,
+keep their lease alive with heartbeats while fetching, and store parsed
+jobs in the job store. Tasks of crashed workers are re-queued once their
+lease expires.
+
+Usage:
+    python src/crawl_worker.py enqueue --schools fudan,sjtu
+    python src/crawl_worker.py work --exit-when-empty
+    python src/crawl_worker.py stats
+"""
+from urllib.parse import urlsplit
+import argparse
+import importlib
+import math
+import os
+import socket
+import threading
+import time
+import uuid
+from utils.log_utils import setup_logger, get_logger
+from utils.page_size_utils import get_page_size
+from utils.queue_utils import (
+    LEASE_SECONDS, claim_task, complete_task, enqueue_tasks, fail_task, heartbeat,
+    pending_count, queue_stats, release_host
+)
+from utils.school_utils import SCHOOL_CODES
+from utils.store_utils import store_jobs
+
+# Seconds an idle worker waits before polling the queue again
+IDLE_INTERVAL = 1.0
+
+def load_crawler(school_code):
+    return importlib.import_module(SCHOOL_CODES[school_code]['module'])
+
+def enqueue_school(school_code):
+    """
+    Queue the pages a regular crawl of the school would fetch, in each of
+    its listing categories
+
+    Returns:
+        int: Number of tasks added
+    """
+    module = load_crawler(school_code)
+    host = urlsplit(module.BASE_URL).netloc
+    if hasattr(module, 'CRAWL_WINDOW'):
+        page_size = get_page_size(school_code, module.DEFAULT_PAGE_SIZE)
+        pages = math.ceil(module.CRAWL_WINDOW / page_size)
+    else:
+        page_size = None
+        pages = module.CRAWL_PAGES
+    categories = getattr(module, 'CATEGORIES', None) or [None]
+    return sum(
+        enqueue_tasks(school_code, host, range(1, pages + 1), page_size, category)
+        for category in categories
+    )
+
+def process_task(task):
+    """Fetch, parse and store one page, returns number of new jobs"""
+    module = load_crawler(task['school'])
+    fetch_args = {'page_size': task['page_size']} if task['page_size'] else {}
+    # Tasks queued before categories were recorded crawl the default one
+    category_args = {'category': task['category']} if task['category'] else {}
+    try:
+        content = module.fetch_job_page(task['page'], **fetch_args, **category_args)
+    finally:
+        # The host stays reserved by the claim until the fetch and its retries end
+        release_host(task['host'])
+    if not content:
+        raise RuntimeError(f"Failed to fetch page {task['page']}")
+
+    return len(store_jobs(task['school'], module.parse_job_list(content, **category_args)))
+
+def _describe_task(task):
+    """Short label of a task for log messages"""
+    if task['category']:
+        return f"{task['school']} category {task['category']} page {task['page']}"
+    return f"{task['school']} page {task['page']}"
+
+def _keep_alive(task, worker_id, done):
+    """Renew the lease until the task finishes"""
+    logger = get_logger(__name__)
+    while not done.wait(LEASE_SECONDS / 3):
+        if not heartbeat(task['task_id'], worker_id):
+            logger.warning(f"Lost lease of task {task['task_id']}")
+            return
+
+def work(worker_id, exit_when_empty=False):
+    """
+    Process tasks until interrupted
+
+    Args:
+        worker_id: Unique worker ID, recorded as lease owner
+        exit_when_empty: Return once no task is queued or leased
+    """
+    logger = get_logger(__name__)
+    logger.info(f"Worker {worker_id} started")
+
+    while True:
+        task = claim_task(worker_id)
+        if task is None:
+            if exit_when_empty and not pending_count():
+                logger.info(f"Worker {worker_id} finished, queue is empty")
+                return
+            time.sleep(IDLE_INTERVAL)
+            continue
+
+        done = threading.Event()
+        keeper = threading.Thread(target=_keep_alive, args=(task, worker_id, done), daemon=True)
+        keeper.start()
+        try:
+            new_jobs = process_task(task)
+            complete_task(task['task_id'], worker_id)
+            logger.info(f"Task {task['task_id']} {_describe_task(task)}: {new_jobs} new jobs")
+        except Exception as e:
+            fail_task(task['task_id'], worker_id, e)
+            logger.error(f"Task {task['task_id']} {_describe_task(task)} failed "
+                         f"(attempt {task['attempts']}): {str(e)}")
+        finally:
+            done.set()
+            keeper.join()
+
+def main():
+    parser = argparse.ArgumentParser(description='Crawl workers sharing a lease-based task queue')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    enqueue = commands.add_parser('enqueue', help='Queue page tasks for schools')
+    enqueue.add_argument('--schools', help='Comma separated school codes, all schools by default')
+
+    worker = commands.add_parser('work', help='Process queued tasks')
+    worker.add_argument('--worker-id', help='Defaults to host name, PID and a random suffix')
+    worker.add_argument('--exit-when-empty', action='store_true')
+
+    commands.add_parser('stats', help='Show number of tasks per status')
+    args = parser.parse_args()
+
+    logger = setup_logger(__name__)
+
+    if args.command == 'enqueue':
+        school_codes = args.schools.split(',') if args.schools else list(SCHOOL_CODES)
+        unknown = set(school_codes) - set(SCHOOL_CODES)
+        if unknown:
+            parser.error(f"Invalid school code: {', '.join(sorted(unknown))}")
+        for school_code in school_codes:
+            logger.info(f"Queued {enqueue_school(school_code)} tasks for {school_code}")
+    elif args.command == 'work':
+        worker_id = args.worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        try:
+            work(worker_id, args.exit_when_empty)
+        except KeyboardInterrupt:
+            # The lease runs out and another worker picks the task up
+            pass
+    else:
+        for status, count in sorted(queue_stats().items()):
+            print(f"{status}: {count}")
+
+if __name__ == '__main__':
+    main()
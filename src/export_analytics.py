@@ -0,0 +1,209 @@
+"""Columnar export of stored jobs for analytics
+
+Appends jobs stored since the last export to a Parquet dataset with one
+partition per crawl day (data/analytics/jobs/crawl_date=YYYY-MM-DD/).
+Dates are timestamp columns, read as datetime64 by pandas and NumPy, and
+repetitive text columns such as school, company, industry and location
+are dictionary-encoded. Existing files are never rewritten: each run adds
+one file per crawl day it covers. Jobs edited after their export keep the
+version they were exported with.
+
+Requires pyarrow (pip install pyarrow), which the crawlers and servers
+don't need.
+
+Usage:
+    python src/export_analytics.py
+    python src/export_analytics.py --summary industry
+    python src/export_analytics.py --rebuild
+"""
+from datetime import datetime
+from pathlib import Path
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from utils.log_utils import setup_logger, get_logger
+from utils.store_utils import iter_stored_jobs
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    sys.exit('The analytics export needs pyarrow: pip install pyarrow')
+
+# Parquet dataset, partitioned by the local date jobs were stored on
+EXPORT_DIR = Path('data/analytics/jobs')
+
+# Sequence number of the last exported job
+STATE_PATH = Path('data/analytics/export_state.json')
+
+# Dictionary-encoded columns, a few thousand distinct values at most
+CATEGORICAL_COLUMNS = ('school', 'company', 'industry', 'location', 'type', 'education', 'company_type')
+
+# Plain text columns
+TEXT_COLUMNS = ('title', 'url', 'salary')
+
+SCHEMA = pa.schema(
+    [('seq', pa.int64()), ('cluster_id', pa.int64())]
+    + [(name, pa.dictionary(pa.int32(), pa.string())) for name in CATEGORICAL_COLUMNS]
+    + [(name, pa.string()) for name in TEXT_COLUMNS]
+    + [('publish_date', pa.timestamp('ms')), ('deadline', pa.timestamp('ms')),
+       ('crawled_at', pa.timestamp('ms'))]
+)
+
+def parse_date(value):
+    """Parse the date part of a 'YYYY-MM-DD[ ...]' string, None if it has none"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d')
+    except ValueError:
+        return None
+
+def load_state():
+    try:
+        with open(STATE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'last_seq': 0}
+
+def save_state(state):
+    STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = STATE_PATH.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, STATE_PATH)
+
+def _new_columns():
+    return {name: [] for name in SCHEMA.names}
+
+def _append_row(columns, created_at, job):
+    columns['seq'].append(job['seq'])
+    columns['cluster_id'].append(job.get('cluster_id'))
+    for name in CATEGORICAL_COLUMNS + TEXT_COLUMNS:
+        columns[name].append(job.get(name) or None)
+    columns['publish_date'].append(parse_date(job.get('publish_date')))
+    columns['deadline'].append(parse_date(job.get('deadline')))
+    columns['crawled_at'].append(datetime.fromtimestamp(int(created_at)))
+
+def write_partition(crawl_date, columns):
+    """
+    Write one crawl day's new jobs as a file of that day's partition
+
+    The file is named after its first sequence number. A rerun after a
+    crash before the state was saved starts from the same job, so it
+    replaces the file, also when jobs were stored in between, instead of
+    duplicating rows.
+
+    Returns:
+        Path: Written file
+    """
+    arrays = []
+    for field in SCHEMA:
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(columns[field.name], pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(columns[field.name], field.type))
+    table = pa.Table.from_arrays(arrays, schema=SCHEMA)
+
+    partition_dir = EXPORT_DIR / f'crawl_date={crawl_date}'
+    partition_dir.mkdir(parents=True, exist_ok=True)
+    path = partition_dir / f"part-{columns['seq'][0]}.parquet"
+    tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+    return path
+
+def export_jobs(db_path=None):
+    """
+    Append jobs stored since the last export to the dataset
+
+    Returns:
+        int: Number of exported jobs
+    """
+    logger = get_logger(__name__)
+    state = load_state()
+    partitions = {}
+    for created_at, job in iter_stored_jobs(state['last_seq'], db_path):
+        crawl_date = datetime.fromtimestamp(created_at).strftime('%Y-%m-%d')
+        _append_row(partitions.setdefault(crawl_date, _new_columns()), created_at, job)
+
+    exported = 0
+    # Days in store order, each saved right after its file so a crash
+    # never leaves written rows beyond the saved state
+    for crawl_date, columns in sorted(partitions.items()):
+        path = write_partition(crawl_date, columns)
+        exported += len(columns['seq'])
+        state['last_seq'] = max(state['last_seq'], columns['seq'][-1])
+        state['exported_at'] = time.time()
+        save_state(state)
+        logger.info(f"Wrote {len(columns['seq'])} jobs to {path}")
+    return exported
+
+def load_dataset(columns=None):
+    """
+    Read the exported dataset as one Arrow table
+
+    Args:
+        columns: Optional list of columns to read
+
+    Returns:
+        pyarrow.Table: All exported jobs, with crawl_date as partition column
+    """
+    dataset = ds.dataset(EXPORT_DIR, format='parquet', partitioning='hive')
+    return dataset.to_table(columns=columns).unify_dictionaries()
+
+def postings_per_week(table, column):
+    """
+    Count postings per publish week and value of column, vectorized
+
+    Args:
+        table: Table as returned by load_dataset
+        column: Column to group by, e.g. 'industry' or 'school'
+
+    Returns:
+        pyarrow.Table: week, column and count, newest week first
+    """
+    week = pc.floor_temporal(table['publish_date'], unit='week')
+    counts = (
+        pa.table({'week': week, column: table[column]})
+        .group_by(['week', column])
+        .aggregate([([], 'count_all')])
+    )
+    return counts.rename_columns(['week', column, 'count']).sort_by(
+        [('week', 'descending'), ('count', 'descending')]
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description='Export stored jobs to a partitioned Parquet dataset')
+    parser.add_argument('--rebuild', action='store_true', help='Delete the dataset and export all jobs again')
+    parser.add_argument('--summary', metavar='COLUMN', help='Print postings per week and COLUMN afterwards')
+    args = parser.parse_args()
+
+    logger = setup_logger(__name__)
+
+    if args.rebuild:
+        shutil.rmtree(EXPORT_DIR, ignore_errors=True)
+        STATE_PATH.unlink(missing_ok=True)
+
+    started = time.time()
+    exported = export_jobs()
+    logger.info(f"Exported {exported} jobs in {time.time() - started:.1f}s")
+
+    if args.summary:
+        if args.summary not in SCHEMA.names or args.summary == 'seq':
+            parser.error(f"Invalid summary column: {args.summary}")
+        table = load_dataset(['publish_date', args.summary])
+        started = time.perf_counter()
+        summary = postings_per_week(table, args.summary)
+        logger.info(f"Aggregated {table.num_rows} jobs in {(time.perf_counter() - started) * 1000:.1f} ms")
+        for row in summary.slice(0, 50).to_pylist():
+            week = row['week'].strftime('%Y-%m-%d') if row['week'] else '-'
+            print(f"{week}\t{row[args.summary] or '-'}\t{row['count']}")
+
+if __name__ == '__main__':
+    main()
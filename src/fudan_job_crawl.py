@@ -1,19 +1,81 @@
 from bs4 import BeautifulSoup
 import json
+import os
 from pathlib import Path
+from urllib.parse import urlsplit
 import re
 from datetime import datetime
-from utils.request_utils import fetch_page_post
+from utils.request_utils import CACHE_TTL, fetch_page_post, parse_json
 from utils.log_utils import setup_logger, get_logger
 from utils.format_utils import save_jobs_to_xml
-import time
+from utils.store_utils import store_jobs
+from utils.wal_utils import CrawlLog
+from utils.rate_utils import CRAWL_RATE, get_rate_limiter
+from utils.school_utils import get_categories
+from utils.job_utils import Job
+from utils.page_size_utils import negotiate_page_size, check_page_size
 
-def parse_job_list(json_content):
-    """Parse job listing information from JSON content"""
+# Upstream site, override with FUDAN_BASE_URL to point at a mock server
+BASE_URL = os.environ.get('FUDAN_BASE_URL', 'https://career.fudan.edu.cn')
+
+# Known response encoding, override with FUDAN_ENCODING; unset trusts the
+# charset the upstream declares
+ENCODING = os.environ.get('FUDAN_ENCODING') or None
+
+# Page size of the upstream web UI, used when negotiation fails
+DEFAULT_PAGE_SIZE = 20
+
+# Number of newest items checked on each crawl
+CRAWL_WINDOW = 2 * DEFAULT_PAGE_SIZE
+
+# Listing categories crawled on each run, see school_utils.get_categories;
+# pages fetched without a category come from the first
+CATEGORIES = get_categories('fudan')
+DEFAULT_CATEGORY = next(iter(CATEGORIES))
+
+def fetch_job_page(page, page_size=DEFAULT_PAGE_SIZE, category=DEFAULT_CATEGORY):
+    """Fetch one page of a listing category, returns undecoded JSON content or None"""
+    # API URL
+    url = f"{BASE_URL}/mobile.php/enrollment/getlist"
+    
+    # Request headers
+    headers = {
+        'Accept': 'application/json, text/javascript, */*; q=0.01',
+        'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
+        'Origin': 'https://career.fudan.edu.cn',
+        'Referer': f'https://career.fudan.edu.cn/Zhaopin/zhaopinList.html?type={category}&page=1',
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
+        'X-Requested-With': 'XMLHttpRequest',
+        'auth': 'Baisc MTAyNDY6MTAyNDY=',
+    }
+    
+    # Request data
+    data = {
+        'type': category,
+        'school_id': '5f431052-b4af-0969-a37a-955f7903c8d5',
+        'page': str(page),
+        'size': str(page_size),
+        'login_user_id': '1',
+        'login_admin_school_code': '10246',
+        'login_admin_school_id': '5f431052-b4af-0969-a37a-955f7903c8d5'
+    }
+    
+    return fetch_page_post(url, headers=headers, data=data, cache_ttl=CACHE_TTL,
+                           raw=True, encoding=ENCODING)
+
+def get_total_count(json_content):
+    """Extract total number of listings from JSON content"""
+    try:
+        return int(parse_json(json_content)['data']['count'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+def parse_job_list(json_content, category=DEFAULT_CATEGORY):
+    """Parse job listing information from JSON content of a listing category"""
     logger = get_logger(__name__)
     
     try:
-        data = json.loads(json_content)
+        data = parse_json(json_content)
         if data['code'] != 0:
             logger.error(f"API returned error code: {data['code']}")
             return []
@@ -28,14 +90,15 @@ def parse_job_list(json_content):
                     int(job_item['addtime'])
                 ).strftime('%Y-%m-%d')
                 
-                job = {
-                    'title': job_item['title'].strip(),
-                    'company': job_item['com_id_name'].strip(),
-                    'publish_date': publish_date,
-                    'location': job_item.get('province_id_name', ''),
-                    'type': '招聘信息',
-                    'url': f"https://career.fudan.edu.cn/Zhaopin/xiaozhao.html?id={job_item['id']}"
-                }
+                job = Job(
+                    title=job_item['title'].strip(),
+                    company=job_item['com_id_name'].strip(),
+                    publish_date=publish_date,
+                    location=job_item.get('province_id_name', ''),
+                    type=CATEGORIES.get(category, category),
+                    category=category,
+                    url=f"{BASE_URL}/Zhaopin/xiaozhao.html?id={job_item['id']}"
+                )
                 
                 # Add remarks if available
                 if job_item.get('remarks'):
@@ -113,77 +176,106 @@ def main():
     # Setup logging
     logger = setup_logger(__name__)
     
-    # API URL
-    url = "https://career.fudan.edu.cn/mobile.php/enrollment/getlist"
-    
-    # Request headers
-    headers = {
-        'Accept': 'application/json, text/javascript, */*; q=0.01',
-        'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-        'Origin': 'https://career.fudan.edu.cn',
-        'Referer': 'https://career.fudan.edu.cn/Zhaopin/zhaopinList.html?type=1&page=1',
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
-        'X-Requested-With': 'XMLHttpRequest',
-        'auth': 'Baisc MTAyNDY6MTAyNDY=',
-    }
-    
-    # Request data
-    data = {
-        'type': '1',
-        'school_id': '5f431052-b4af-0969-a37a-955f7903c8d5',
-        'page': '1',
-        'size': '20',
-        'login_user_id': '1',
-        'login_admin_school_code': '10246',
-        'login_admin_school_id': '5f431052-b4af-0969-a37a-955f7903c8d5'
-    }
+    # One crawl of a school at a time, they share its log and XML file
+    wal = CrawlLog('fudan')
+    if not wal.acquire():
+        logger.warning("Another fudan crawl is running, skipping this one")
+        return
     
-    # Setup output path
-    output_dir = Path('data/xml')
-    output_dir.mkdir(parents=True, exist_ok=True)
-    output_path = output_dir / 'fudan_jobs.xml'
-    
-    # Load existing jobs
-    existing_jobs = load_existing_jobs(output_path) if output_path.exists() else []
-    existing_urls = {job['url'] for job in existing_jobs}
-    
-    all_new_jobs = []
-    current_page = 1
-    
-    while current_page <= 2:
-        logger.info(f"Processing page {current_page}")
+    try:
+        # Setup output path
+        output_dir = Path('data/xml')
+        output_dir.mkdir(parents=True, exist_ok=True)
+        output_path = output_dir / 'fudan_jobs.xml'
         
-        # Update page number in request data
-        data['page'] = str(current_page)
+        # Load existing jobs
+        existing_jobs = load_existing_jobs(output_path) if output_path.exists() else []
+        existing_urls = {job['url'] for job in existing_jobs}
         
-        # Fetch JSON content
-        json_content = fetch_page_post(url, headers=headers, data=data)
-        if not json_content:
-            logger.error(f"Failed to fetch page {current_page}")
-            break
-            
-        # Parse jobs
-        new_jobs = [job for job in parse_job_list(json_content) 
-                   if job['url'] not in existing_urls]
+        # Resume after the last page an interrupted run logged
+        recovered = wal.recover()
+        found = {job['url']: job for job in recovered['jobs'] if job['url'] not in existing_urls}
         
-        if not new_jobs:
-            logger.info(f"No new jobs found on page {current_page}")
-            break
-            
-        all_new_jobs.extend(new_jobs)
-        existing_urls.update(job['url'] for job in new_jobs)
-        logger.info(f"Found {len(new_jobs)} new jobs on page {current_page}")
+        # Use the largest page size the upstream honors
+        page_size = recovered['state'].get('page_size') or negotiate_page_size(
+            'fudan', DEFAULT_PAGE_SIZE, fetch_job_page, parse_job_list
+        )
         
-        current_page += 1
-        time.sleep(2)  # Add delay between requests
+        # All categories share the host's pooled connections and request spacing
+        limiter = get_rate_limiter(urlsplit(BASE_URL).netloc, CRAWL_RATE)
+        # Cleared when a category is cut short, keeping the log for a resumed run
+        complete = True
+        for category in CATEGORIES:
+            # A crawl that had finished fetching only publishes what it logged
+            if recovered['done'] or category in recovered['categories_done']:
+                continue
+            # Items of the category covered so far; counted in items, not pages,
+            # because the page size shrinks if the upstream starts capping
+            offset = 0
+            if category == recovered['state'].get('category'):
+                offset = recovered['state'].get('offset', recovered['page'] * page_size)
+            
+            fetch_failed = False
+            while offset < CRAWL_WINDOW:
+                current_page = offset // page_size + 1
+                logger.info(f"Processing {CATEGORIES[category]} page {current_page}, from item {offset} of {CRAWL_WINDOW}")
+                
+                # Fetch JSON content
+                limiter.acquire()
+                json_content = fetch_job_page(current_page, page_size, category)
+                if not json_content:
+                    logger.error(f"Failed to fetch page {current_page}")
+                    fetch_failed = True
+                    break
+                    
+                # Parse jobs
+                jobs = parse_job_list(json_content, category)
+                unseen = [job for job in jobs if job['url'] not in existing_urls]
+                
+                # Fall back if the upstream started capping results
+                total = get_total_count(json_content) or 0
+                end = (current_page - 1) * page_size + len(jobs)
+                page_size = check_page_size('fudan', page_size, len(jobs), end < total, DEFAULT_PAGE_SIZE)
+                
+                # Also stop if the page ended before items already covered
+                if not unseen or end <= offset:
+                    logger.info(f"No new jobs found on page {current_page}")
+                    break
+                offset = end
+                    
+                # Jobs listed in several categories are kept once, in the first
+                new_jobs = [job for job in unseen if job['url'] not in found]
+                wal.append(current_page, new_jobs, category=category, page_size=page_size, offset=offset)
+                found.update((job['url'], job) for job in new_jobs)
+                logger.info(f"Found {len(new_jobs)} new jobs on page {current_page}")
+                
+            # A category cut short by a failed fetch stays open for a resumed run
+            if fetch_failed:
+                complete = False
+            else:
+                wal.finish(category)
+            
+        if complete:
+            wal.finish()
+        all_new_jobs = list(found.values())
         
-    # Save all new jobs
-    if all_new_jobs:
-        save_jobs_to_xml(all_new_jobs, output_path, '复旦大学', mode='a' if existing_jobs else 'w')
-
-        logger.info(f"Saved {len(all_new_jobs)} new jobs to {output_path}")
-    else:
-        logger.info("No new jobs to save")
+        # Save all new jobs
+        if all_new_jobs:
+            # Store first, replaying a log stores again harmlessly but skips jobs already in the XML
+            store_jobs('fudan', all_new_jobs)
+            save_jobs_to_xml(all_new_jobs, output_path, '复旦大学', mode='a' if existing_jobs else 'w')
+            logger.info(f"Saved {len(all_new_jobs)} new jobs to {output_path}")
+        else:
+            logger.info("No new jobs to save")
+            
+        # The log of an incomplete crawl is kept, so the next run retries the
+        # failed pages; jobs published here are skipped by it as already saved
+        if complete:
+            wal.truncate()
+        else:
+            logger.warning("Crawl incomplete, keeping its log for the next run")
+    finally:
+        wal.release()
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -1,18 +1,49 @@
 from bs4 import BeautifulSoup
 import json
+import os
 from pathlib import Path
+from urllib.parse import urlsplit
 import re
 from datetime import datetime
-from utils.request_utils import fetch_page
+from utils.request_utils import fetch_page, parse_html
 from utils.log_utils import setup_logger, get_logger
 from utils.format_utils import save_jobs_to_xml
-import time
+from utils.store_utils import store_jobs
+from utils.wal_utils import CrawlLog
+from utils.rate_utils import CRAWL_RATE, get_rate_limiter
+from utils.school_utils import get_categories
+from utils.job_utils import Job
+from utils.enrich_utils import ENRICH_DETAILS, enrich_jobs, extract_text
 
-def parse_job_list(html_content):
-    """Parse job listing information from HTML content"""
+# Seconds a fetched listing page is cached, twice the request_utils default:
+# the server-rendered listing changes slowly and is costly to render
+CACHE_TTL = 600
+
+# Upstream site, override with HUST_BASE_URL to point at a mock server
+BASE_URL = os.environ.get('HUST_BASE_URL', 'https://job.hust.edu.cn')
+
+# Known response encoding, override with HUST_ENCODING; unset trusts the
+# charset the upstream declares
+ENCODING = os.environ.get('HUST_ENCODING') or None
+
+# Listing pages crawled per run, the site serves a fixed page size
+CRAWL_PAGES = 2
+
+# Listing categories crawled on each run, see school_utils.get_categories;
+# pages fetched without a category come from the first
+CATEGORIES = get_categories('hust')
+DEFAULT_CATEGORY = next(iter(CATEGORIES))
+
+def fetch_job_page(page, page_size=None, category=DEFAULT_CATEGORY):
+    """Fetch one page of a listing category, returns undecoded HTML content or None"""
+    return fetch_page(f"{BASE_URL}/searchJob_{page}.jspx?fbsj=&q=&type={category}",
+                      cache_ttl=CACHE_TTL, raw=True, encoding=ENCODING)
+
+def parse_job_list(html_content, category=DEFAULT_CATEGORY):
+    """Parse job listing information from HTML content of a listing category"""
     logger = get_logger(__name__)
     
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = parse_html(html_content)
     
     # Find all tables with class 'fdhy_tb002'
     tables = soup.find_all('table', {'class': 'fdhy_tb002'})
@@ -50,12 +81,13 @@ def parse_job_list(html_content):
         if not date_match:
             continue
             
-        job = {
-            'title': job_link.get('title', '').strip(),
-            'url': f"https://job.hust.edu.cn{job_link['href']}",
-            'publish_date': date_match.group(1),
-            'type': '招聘信息'  # Default type
-        }
+        job = Job(
+            title=job_link.get('title', '').strip(),
+            url=f"{BASE_URL}{job_link['href']}",
+            publish_date=date_match.group(1),
+            type=CATEGORIES.get(category, category),  # Default type
+            category=category
+        )
         
         # Extract job type from the category link
         type_link = job_col.find('a', href=re.compile(r'/searchJob\.jspx'))
@@ -72,9 +104,13 @@ def parse_job_list(html_content):
         
     return jobs
 
+def extract_detail(html_content):
+    """Extract job description from a detail page"""
+    return extract_text(html_content, ['div.zw_con', 'div.content', 'div.article', '#vsb_content', 'td.fdhy_td'])
+
 def get_max_page(html_content):
     """Extract maximum page number from HTML content"""
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = parse_html(html_content)
     pagination = soup.find('ul', {'class': 'pagination'})
     if not pagination:
         return 1
@@ -119,62 +155,105 @@ def main():
     # Setup logging
     logger = setup_logger(__name__)
     
-    # Base URL
-    base_url = "https://job.hust.edu.cn/searchJob_{}.jspx?fbsj=&q=&type=2"
-    
-    # Setup output path
-    output_dir = Path('data/xml')
-    output_dir.mkdir(parents=True, exist_ok=True)
-    output_path = output_dir / f'hust_jobs.xml'
-    
-    # Load existing jobs
-    existing_jobs = load_existing_jobs(output_path) if output_path.exists() else []
-    existing_urls = {job['url'] for job in existing_jobs}
+    # One crawl of a school at a time, they share its log and XML file
+    wal = CrawlLog('hust')
+    if not wal.acquire():
+        logger.warning("Another hust crawl is running, skipping this one")
+        return
     
-    # Start with page 1
-    current_page = 1
-    max_page = 2
-    all_new_jobs = []
-    
-    while True:
-        url = base_url.format(current_page)
-        logger.info(f"Processing page {current_page}")
+    try:
+        # Setup output path
+        output_dir = Path('data/xml')
+        output_dir.mkdir(parents=True, exist_ok=True)
+        output_path = output_dir / f'hust_jobs.xml'
+        
+        # Load existing jobs
+        existing_jobs = load_existing_jobs(output_path) if output_path.exists() else []
+        existing_urls = {job['url'] for job in existing_jobs}
+        
+        # Resume after the last page an interrupted run logged
+        recovered = wal.recover()
+        found = {job['url']: job for job in recovered['jobs'] if job['url'] not in existing_urls}
         
-        # Fetch HTML content
-        html_content = fetch_page(url)
-        if not html_content:
-            logger.error(f"Failed to fetch page {current_page}")
-            break
+        # All categories share the host's pooled connections and request spacing
+        limiter = get_rate_limiter(urlsplit(BASE_URL).netloc, CRAWL_RATE)
+        
+        # Cleared when a category is cut short, keeping the log for a resumed run
+        complete = True
+        for category in CATEGORIES:
+            # A crawl that had finished fetching only publishes what it logged
+            if recovered['done'] or category in recovered['categories_done']:
+                continue
+            
+            # Start with page 1 unless resuming
+            if category == recovered['state'].get('category'):
+                current_page = recovered['page'] + 1
+                max_page = recovered['state'].get('max_page', CRAWL_PAGES)
+            else:
+                current_page = 1
+                max_page = CRAWL_PAGES
             
-        # Get max page number on first page
-        if max_page is None:
-            max_page = get_max_page(html_content)
-            logger.info(f"Total pages: {max_page}")
+            fetch_failed = False
+            while max_page is None or current_page <= max_page:
+                logger.info(f"Processing {CATEGORIES[category]} page {current_page}")
+                
+                # Fetch HTML content
+                limiter.acquire()
+                html_content = fetch_job_page(current_page, category=category)
+                if not html_content:
+                    logger.error(f"Failed to fetch page {current_page}")
+                    fetch_failed = True
+                    break
+                    
+                # Get max page number on first page
+                if max_page is None:
+                    max_page = get_max_page(html_content)
+                    logger.info(f"Total pages: {max_page}")
+                    
+                # Parse jobs, keeping jobs listed in several categories once
+                new_jobs = [job for job in parse_job_list(html_content, category)
+                           if job['url'] not in existing_urls and job['url'] not in found]
+                
+                wal.append(current_page, new_jobs, category=category, max_page=max_page)
+                if new_jobs:
+                    found.update((job['url'], job) for job in new_jobs)
+                    logger.info(f"Found {len(new_jobs)} new jobs on page {current_page}")
+                else:
+                    logger.info(f"No new jobs found on page {current_page}")
+                    
+                current_page += 1
+                
+            # A category cut short by a failed fetch stays open for a resumed run
+            if fetch_failed:
+                complete = False
+            else:
+                wal.finish(category)
             
-        # Parse jobs
-        new_jobs = [job for job in parse_job_list(html_content) 
-                   if job['url'] not in existing_urls]
+        if complete:
+            wal.finish()
+        all_new_jobs = list(found.values())
         
-        if new_jobs:
-            all_new_jobs.extend(new_jobs)
-            existing_urls.update(job['url'] for job in new_jobs)
-            logger.info(f"Found {len(new_jobs)} new jobs on page {current_page}")
-        else:
-            logger.info(f"No new jobs found on page {current_page}")
+        # Fill descriptions from detail pages
+        if all_new_jobs and ENRICH_DETAILS:
+            enrich_jobs(all_new_jobs, 'hust', extract_detail, encoding=ENCODING)
             
-        # Break if we've reached the last page
-        if current_page >= max_page:
-            break
+        # Save all new jobs
+        if all_new_jobs:
+            # Store first, replaying a log stores again harmlessly but skips jobs already in the XML
+            store_jobs('hust', all_new_jobs)
+            save_jobs_to_xml(all_new_jobs, output_path, '华中科技大学', mode='a' if existing_jobs else 'w')
+            logger.info(f"Saved {len(all_new_jobs)} new jobs to {output_path}")
+        else:
+            logger.info("No new jobs to save")
             
-        current_page += 1
-        time.sleep(2)  # Add delay between requests
-        
-    # Save all new jobs
-    if all_new_jobs:
-        save_jobs_to_xml(all_new_jobs, output_path, '华中科技大学', mode='a' if existing_jobs else 'w')
-        logger.info(f"Saved {len(all_new_jobs)} new jobs to {output_path}")
-    else:
-        logger.info("No new jobs to save")
+        # The log of an incomplete crawl is kept, so the next run retries the
+        # failed pages; jobs published here are skipped by it as already saved
+        if complete:
+            wal.truncate()
+        else:
+            logger.warning("Crawl incomplete, keeping its log for the next run")
+    finally:
+        wal.release()
 
 if __name__ == '__main__':
     main()
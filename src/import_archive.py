@@ -0,0 +1,155 @@
+"""Bulk import of XML archives into the job store
+
+Reads legacy <jobs><job> snapshots (data/xml/*_20241121.xml) as well as RSS
+<item> feeds with an incremental parser, clearing every element once it has
+been handled, so memory use stays flat regardless of archive size.
+
+Usage:
+    python src/import_archive.py data/xml/*_20241121.xml
+    python src/import_archive.py --school fudan old_fudan_feed.xml
+"""
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+import argparse
+import re
+from lxml import etree
+from utils.job_utils import Job
+from utils.log_utils import setup_logger, get_logger
+from utils.store_utils import store_jobs
+
+# Links written by older crawler versions and their current form
+LEGACY_URL_PATTERNS = [
+    (re.compile(r'^https://career\.fudan\.edu\.cn/detail/enrollment/([\w-]+)$'),
+     r'https://career.fudan.edu.cn/Zhaopin/xiaozhao.html?id=\1'),
+    (re.compile(r'^https://www\.job\.sjtu\.edu\.cn/career/zpxx/zpxx/view\?id=(\w+)$'),
+     r'https://www.job.sjtu.edu.cn/career/zpxx/view/zpxx/\1'),
+    (re.compile(r'^https://job\.dlut\.edu\.cn/portals/detail\.html\?id=([\w-]+)$'),
+     r'https://job.dlut.edu.cn/portals/newspage.html?id=\1')
+]
+
+def normalize_url(url):
+    """Rewrite legacy job links to the form current crawlers produce"""
+    for pattern, replacement in LEGACY_URL_PATTERNS:
+        if pattern.match(url):
+            return pattern.sub(replacement, url)
+    return url
+
+def normalize_job(elem):
+    """
+    Convert a <job> or RSS <item> element into a job dict
+
+    Args:
+        elem: lxml element
+
+    Returns:
+        Job: Job in the current schema, None if it has no link
+    """
+    fields = {}
+    for child in elem:
+        if isinstance(child.tag, str):
+            fields[child.tag] = (child.text or '').strip()
+
+    if elem.tag == 'item':
+        job = {
+            'title': fields.get('title', ''),
+            'url': fields.get('link') or fields.get('guid', ''),
+            'type': fields.get('category') or '招聘信息'
+        }
+        if fields.get('description') and fields['description'] != job['title']:
+            job['description'] = fields['description']
+        try:
+            job['publish_date'] = parsedate_to_datetime(fields['pubDate']).strftime('%Y-%m-%d')
+        except (KeyError, TypeError, ValueError):
+            pass
+    else:
+        job = {k: v for k, v in fields.items() if v}
+
+    if not job.get('url'):
+        return None
+    job['url'] = normalize_url(job['url'])
+    return Job(job)
+
+def iter_archive_jobs(path):
+    """
+    Stream jobs from an XML archive
+
+    Args:
+        path: Path of a <jobs> snapshot or an RSS feed
+
+    Yields:
+        Job: Normalized job
+    """
+    logger = get_logger(__name__)
+
+    context = etree.iterparse(str(path), events=('end',), tag=('job', 'item'), recover=True)
+    for _, elem in context:
+        try:
+            job = normalize_job(elem)
+        except Exception as e:
+            logger.error(f"Error normalizing element in {path}: {str(e)}")
+            job = None
+        if job:
+            yield job
+
+        # Free the element and everything parsed before it
+        elem.clear(keep_tail=False)
+        parent = elem.getparent()
+        if parent is not None:
+            while elem.getprevious() is not None:
+                del parent[0]
+    del context
+
+def school_from_path(path):
+    """Derive school code from file names like fudan_jobs_20241121.xml"""
+    return Path(path).name.split('_', 1)[0]
+
+def import_archive(path, school_code=None, batch_size=500):
+    """
+    Import one archive file into the job store
+
+    Args:
+        path: Archive path
+        school_code: School code, derived from the file name if None
+        batch_size: Number of jobs written per store transaction
+
+    Returns:
+        tuple: (jobs read, jobs newly stored)
+    """
+    logger = get_logger(__name__)
+    school_code = school_code or school_from_path(path)
+
+    read = 0
+    stored = 0
+    batch = []
+    for job in iter_archive_jobs(path):
+        batch.append(job)
+        read += 1
+        if len(batch) >= batch_size:
+            stored += len(store_jobs(school_code, batch))
+            batch = []
+    if batch:
+        stored += len(store_jobs(school_code, batch))
+
+    logger.info(f"Imported {path}: {read} jobs read, {stored} new for {school_code}")
+    return read, stored
+
+def main():
+    parser = argparse.ArgumentParser(description='Import XML job archives into the job store')
+    parser.add_argument('paths', nargs='+', help='Archive files (<jobs> snapshots or RSS feeds)')
+    parser.add_argument('--school', help='School code, derived from each file name by default')
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    logger = setup_logger(__name__)
+
+    total_read = 0
+    total_stored = 0
+    for path in args.paths:
+        read, stored = import_archive(path, args.school, args.batch_size)
+        total_read += read
+        total_stored += stored
+
+    logger.info(f"Import finished: {total_read} jobs read, {total_stored} new")
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,42 @@
 from bs4 import BeautifulSoup
 import json
+import os
 from pathlib import Path
 import re
 from datetime import datetime
-from utils.request_utils import fetch_page
+from utils.request_utils import fetch_page, parse_html
 from utils.log_utils import setup_logger, get_logger
 from utils.format_utils import save_jobs_to_xml
+from utils.store_utils import store_jobs
+from utils.wal_utils import CrawlLog
+from utils.job_utils import Job
+from utils.enrich_utils import ENRICH_DETAILS, enrich_jobs, extract_text
 import time
 
+# Seconds a fetched listing page is cached, twice the request_utils default:
+# the server-rendered listing changes slowly and is costly to render
+CACHE_TTL = 600
+
+# Upstream site, override with NANKAI_BASE_URL to point at a mock server
+BASE_URL = os.environ.get('NANKAI_BASE_URL', 'https://career.nankai.edu.cn')
+
+# Known response encoding, override with NANKAI_ENCODING; unset trusts the
+# charset the upstream declares
+ENCODING = os.environ.get('NANKAI_ENCODING') or None
+
+# Listing pages crawled per run, the site serves a fixed page size
+CRAWL_PAGES = 2
+
+def fetch_job_page(page, page_size=None):
+    """Fetch one listing page, returns undecoded HTML content or None"""
+    return fetch_page(f"{BASE_URL}/correcruit/index/p/{page}.html",
+                      cache_ttl=CACHE_TTL, raw=True, encoding=ENCODING)
+
 def parse_job_list(html_content):
     """Parse job listing information from HTML content"""
     logger = get_logger(__name__)
     
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = parse_html(html_content)
     
     # Find the job listings container
     content_div = soup.find('div', {'class': 'content'})
@@ -41,7 +65,7 @@ def parse_job_list(html_content):
                 
             title_link = title_div.find('a')
             title = title_link.text.strip()
-            url = f"https://career.nankai.edu.cn{title_link['href']}"
+            url = f"{BASE_URL}{title_link['href']}"
             
             # Extract company info
             company_div = job_item.find('div', {'class': 'company'})
@@ -52,15 +76,15 @@ def parse_job_list(html_content):
             company_parts = company_text.split('/')
             
             # Create job dict
-            job = {
-                'title': company_parts[0].strip(),
-                'url': url,
-                'publish_date': publish_date,
-                'company': company_parts[0].strip(),
-                'location': company_parts[1].strip() if len(company_parts) > 1 else '',
-                'description': title,
-                'type': '招聘信息'
-            }
+            job = Job(
+                title=company_parts[0].strip(),
+                url=url,
+                publish_date=publish_date,
+                company=company_parts[0].strip(),
+                location=company_parts[1].strip() if len(company_parts) > 1 else '',
+                description=title,
+                type='招聘信息'
+            )
             
             # Add additional info if available
             if len(company_parts) > 2:
@@ -84,9 +108,13 @@ def parse_job_list(html_content):
         
     return jobs
 
+def extract_detail(html_content):
+    """Extract job description from a detail page"""
+    return extract_text(html_content, ['div.content_detail', 'div.con_text', 'div.article', 'div.content'])
+
 def get_max_page(html_content):
     """Extract maximum page number from HTML content"""
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = parse_html(html_content)
     pagination = soup.find('div', {'class': 'page'})
     if not pagination:
         return 1
@@ -163,63 +191,91 @@ def main():
     # Setup logging
     logger = setup_logger(__name__)
     
-    # Base URL
-    base_url = "https://career.nankai.edu.cn/correcruit/index/p/{}.html"
+    # One crawl of a school at a time, they share its log and XML file
+    wal = CrawlLog('nankai')
+    if not wal.acquire():
+        logger.warning("Another nankai crawl is running, skipping this one")
+        return
     
-    # Setup output path
-    output_dir = Path('data/xml')
-    output_dir.mkdir(parents=True, exist_ok=True)
-    output_path = output_dir / f'nankai_jobs.xml'
-    
-    # Load existing jobs
-    existing_jobs = load_existing_jobs(output_path) if output_path.exists() else []
-    existing_urls = {job['url'] for job in existing_jobs}
-    
-    # Start with page 1
-    current_page = 1
-    max_page = 2
-    all_new_jobs = []
-    
-    while True:
-        url = base_url.format(current_page)
-        logger.info(f"Processing page {current_page}")
+    try:
+        # Setup output path
+        output_dir = Path('data/xml')
+        output_dir.mkdir(parents=True, exist_ok=True)
+        output_path = output_dir / f'nankai_jobs.xml'
+        
+        # Load existing jobs
+        existing_jobs = load_existing_jobs(output_path) if output_path.exists() else []
+        existing_urls = {job['url'] for job in existing_jobs}
+        
+        # Resume after the last page an interrupted run logged
+        recovered = wal.recover()
+        all_new_jobs = [job for job in recovered['jobs'] if job['url'] not in existing_urls]
+        existing_urls.update(job['url'] for job in all_new_jobs)
+        
+        # Start with page 1 unless resuming
+        current_page = recovered['page'] + 1
+        max_page = recovered['state'].get('max_page', CRAWL_PAGES)
         
-        # Fetch HTML content
-        html_content = fetch_page(url)
-        if not html_content:
-            logger.error(f"Failed to fetch page {current_page}")
-            break
+        # Cleared by a failed fetch, keeping the log for a resumed run
+        complete = True
+        while not recovered['done'] and (max_page is None or current_page <= max_page):
+            logger.info(f"Processing page {current_page}")
             
-        # Get max page number on first page
-        if max_page is None:
-            max_page = get_max_page(html_content)
-            logger.info(f"Total pages: {max_page}")
+            # Fetch HTML content
+            html_content = fetch_job_page(current_page)
+            if not html_content:
+                logger.error(f"Failed to fetch page {current_page}")
+                complete = False
+                break
+                
+            # Get max page number on first page
+            if max_page is None:
+                max_page = get_max_page(html_content)
+                logger.info(f"Total pages: {max_page}")
+                
+            # Parse jobs
+            new_jobs = [job for job in parse_job_list(html_content) 
+                       if job['url'] not in existing_urls]
+            
+            wal.append(current_page, new_jobs, max_page=max_page)
+            if new_jobs:
+                all_new_jobs.extend(new_jobs)
+                existing_urls.update(job['url'] for job in new_jobs)
+                logger.info(f"Found {len(new_jobs)} new jobs on page {current_page}")
+            else:
+                logger.info(f"No new jobs found on page {current_page}")
+                
+            # Break if we've reached the last page
+            if current_page >= max_page:
+                break
+                
+            current_page += 1
+            time.sleep(2)  # Add delay between requests
             
-        # Parse jobs
-        new_jobs = [job for job in parse_job_list(html_content) 
-                   if job['url'] not in existing_urls]
+        if complete:
+            wal.finish()
         
-        if new_jobs:
-            all_new_jobs.extend(new_jobs)
-            existing_urls.update(job['url'] for job in new_jobs)
-            logger.info(f"Found {len(new_jobs)} new jobs on page {current_page}")
-        else:
-            logger.info(f"No new jobs found on page {current_page}")
+        # Fill descriptions from detail pages
+        if all_new_jobs and ENRICH_DETAILS:
+            enrich_jobs(all_new_jobs, 'nankai', extract_detail, encoding=ENCODING)
             
-        # Break if we've reached the last page
-        if current_page >= max_page:
-            break
+        # Save all new jobs
+        if all_new_jobs:
+            # Store first, replaying a log stores again harmlessly but skips jobs already in the XML
+            store_jobs('nankai', all_new_jobs)
+            save_jobs_to_xml(all_new_jobs, output_path, '南开大学', mode='a' if existing_jobs else 'w')
+            logger.info(f"Saved {len(all_new_jobs)} new jobs to {output_path}")
+        else:
+            logger.info("No new jobs to save")
             
-        current_page += 1
-        time.sleep(2)  # Add delay between requests
-        
-    # Save all new jobs
-    if all_new_jobs:
-        save_jobs_to_xml(all_new_jobs, output_path, '南开大学', mode='a' if existing_jobs else 'w')
-
-        logger.info(f"Saved {len(all_new_jobs)} new jobs to {output_path}")
-    else:
-        logger.info("No new jobs to save")
+        # The log of an incomplete crawl is kept, so the next run retries the
+        # failed pages; jobs published here are skipped by it as already saved
+        if complete:
+            wal.truncate()
+        else:
+            logger.warning("Crawl incomplete, keeping its log for the next run")
+    finally:
+        wal.release()
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
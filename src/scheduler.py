@@ -0,0 +1,164 @@
+"""Background crawl scheduler
+
+Crawls every school on its own interval, derived from the rate at which new
+jobs showed up in earlier crawls: busy schools are crawled often, quiet ones
+back off. Runs inside the RSS server (SCHEDULER=1) or as a daemon.
+
+Usage:
+    python src/scheduler.py
+    python src/scheduler.py --schools fudan,sjtu
+"""
+from pathlib import Path
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from utils.log_utils import setup_logger, get_logger
+from utils.school_utils import SCHOOL_CODES, run_crawler
+from utils.store_utils import count_feed_entries
+
+# Learned intervals and posting rates, kept across restarts
+SCHEDULE_PATH = Path('data/cache/schedule.json')
+
+# Bounds and starting point of crawl intervals in seconds
+MIN_INTERVAL = 5 * 60
+MAX_INTERVAL = 6 * 3600
+INITIAL_INTERVAL = 30 * 60
+
+# Interval is chosen so a crawl finds about this many new jobs
+TARGET_NEW_JOBS = 5
+
+# Weight of the latest observation in the smoothed posting rate
+RATE_SMOOTHING = 0.3
+
+# Random spread of each interval, keeps schools from firing together
+JITTER = 0.2
+
+# First crawls after a start are spread over this many seconds
+START_SPREAD = 60
+
+class CrawlScheduler:
+    """Runs crawlers one at a time, each school on its adaptive interval"""
+
+    def __init__(self, school_codes=None, run=run_crawler):
+        """
+        Args:
+            school_codes: Schools to crawl, all of SCHOOL_CODES by default
+            run: Function (school_code) running a crawl, returns success
+        """
+        self.school_codes = list(school_codes or SCHOOL_CODES)
+        self.run = run
+        self.stop_event = threading.Event()
+        self.logger = get_logger(__name__)
+        self.state = self._load_state()
+
+        now = time.time()
+        for school_code in self.school_codes:
+            entry = self.state.setdefault(school_code, {
+                'interval': INITIAL_INTERVAL, 'rate': None, 'last_run': None,
+                'crawls': 0, 'new_jobs': 0
+            })
+            # Keep schedules that survived a restart, spread the overdue ones
+            if not entry.get('next_run') or entry['next_run'] < now:
+                entry['next_run'] = now + random.uniform(0, START_SPREAD)
+
+    def _load_state(self):
+        try:
+            with open(SCHEDULE_PATH, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        SCHEDULE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = SCHEDULE_PATH.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, SCHEDULE_PATH)
+
+    def _reschedule(self, school_code, new_jobs, started):
+        """
+        Update posting rate and next crawl time of a school
+
+        Args:
+            school_code: School code
+            new_jobs: Jobs found by the crawl, None if it failed
+            started: Start time of the crawl
+        """
+        entry = self.state[school_code]
+        if new_jobs is not None:
+            entry['crawls'] += 1
+            entry['new_jobs'] += new_jobs
+            if entry['last_run']:
+                observed = new_jobs / max(started - entry['last_run'], 1)
+                if entry['rate'] is None:
+                    entry['rate'] = observed
+                else:
+                    entry['rate'] = RATE_SMOOTHING * observed + (1 - RATE_SMOOTHING) * entry['rate']
+
+                if entry['rate']:
+                    entry['interval'] = TARGET_NEW_JOBS / entry['rate']
+                else:
+                    # Nothing ever found, back off geometrically
+                    entry['interval'] = entry['interval'] * 1.5
+                entry['interval'] = min(max(entry['interval'], MIN_INTERVAL), MAX_INTERVAL)
+            entry['last_run'] = started
+
+        entry['next_run'] = time.time() + entry['interval'] * random.uniform(1 - JITTER, 1 + JITTER)
+
+    def crawl(self, school_code):
+        """Crawl one school now and schedule its next crawl"""
+        before = count_feed_entries(school_code)
+        started = time.time()
+        success = self.run(school_code)
+        new_jobs = count_feed_entries(school_code) - before if success else None
+
+        self._reschedule(school_code, new_jobs, started)
+        self._save_state()
+
+        entry = self.state[school_code]
+        rate = (entry['rate'] or 0) * 3600
+        self.logger.info(f"Crawled {school_code}: {new_jobs if success else 'failed'} new, "
+                         f"{rate:.2f} jobs/hour, next in {entry['interval'] / 60:.0f} min")
+
+    def run_forever(self):
+        """Crawl schools as they become due until stop() is called"""
+        self.logger.info(f"Scheduler started for {', '.join(self.school_codes)}")
+        while not self.stop_event.is_set():
+            school_code = min(self.school_codes, key=lambda code: self.state[code]['next_run'])
+            delay = self.state[school_code]['next_run'] - time.time()
+            if delay > 0 and self.stop_event.wait(delay):
+                break
+            self.crawl(school_code)
+
+    def start(self):
+        """Run the scheduler in a daemon thread"""
+        thread = threading.Thread(target=self.run_forever, name='crawl-scheduler', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.stop_event.set()
+
+def main():
+    parser = argparse.ArgumentParser(description='Crawl schools on adaptive intervals')
+    parser.add_argument('--schools', help='Comma separated school codes, all schools by default')
+    args = parser.parse_args()
+
+    setup_logger(__name__)
+
+    school_codes = args.schools.split(',') if args.schools else None
+    unknown = set(school_codes or ()) - set(SCHOOL_CODES)
+    if unknown:
+        parser.error(f"Invalid school code: {', '.join(sorted(unknown))}")
+
+    scheduler = CrawlScheduler(school_codes)
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+if __name__ == '__main__':
+    main()
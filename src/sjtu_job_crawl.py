@@ -1,32 +1,75 @@
 from bs4 import BeautifulSoup
 import json
+import os
 from pathlib import Path
 import re
 from datetime import datetime
-from utils.request_utils import fetch_page_post
+from utils.request_utils import CACHE_TTL, fetch_page_post, parse_json
 from utils.log_utils import setup_logger, get_logger
 from utils.format_utils import save_jobs_to_xml
+from utils.store_utils import store_jobs
+from utils.wal_utils import CrawlLog
+from utils.job_utils import Job
+from utils.page_size_utils import negotiate_page_size, check_page_size
 import time
 
+# Upstream site, override with SJTU_BASE_URL to point at a mock server
+BASE_URL = os.environ.get('SJTU_BASE_URL', 'https://www.job.sjtu.edu.cn')
+
+# Known response encoding, override with SJTU_ENCODING; unset trusts the
+# charset the upstream declares
+ENCODING = os.environ.get('SJTU_ENCODING') or None
+
+# Page size of the upstream web UI, used when negotiation fails
+DEFAULT_PAGE_SIZE = 10
+
+# Number of newest items checked on each crawl
+CRAWL_WINDOW = 2 * DEFAULT_PAGE_SIZE
+
+def fetch_job_page(page, page_size=DEFAULT_PAGE_SIZE):
+    """Fetch one page of the listing API, returns undecoded JSON content or None"""
+    # URL with page number and page size parameters
+    url = f"{BASE_URL}/career//zpxx/search/zpxx/{page}/{page_size}"
+    
+    # Request headers
+    headers = {
+        'Accept': 'application/json, text/javascript, */*; q=0.01',
+        'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
+        'Origin': 'https://www.job.sjtu.edu.cn',
+        'Referer': 'https://www.job.sjtu.edu.cn/career/zpxx/zpxx',
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
+        'X-Requested-With': 'XMLHttpRequest'
+    }
+    
+    return fetch_page_post(url, headers=headers, cache_ttl=CACHE_TTL,
+                           raw=True, encoding=ENCODING)
+
+def get_total_count(json_content):
+    """Extract total number of listings from JSON content"""
+    try:
+        return int(parse_json(json_content)['data']['total'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
 def parse_job_list(json_content):
     """Parse job listing information from JSON content"""
     logger = get_logger(__name__)
     
     try:
-        data = json.loads(json_content)
+        data = parse_json(json_content)
         jobs_data = data.get('data', {}).get('list', [])
         jobs = []
         
         for job_item in jobs_data:
             try:
-                job = {
+                fields = {
                     'title': job_item['zpzt'].strip(),
                     'id': job_item['zpxxid'],
                     'company': job_item['dwmc'].strip(),
                     'publish_date': job_item['fbrq'],
                     'deadline': job_item.get('zpjzrq', ''),
                     'type': '招聘信息',
-                    'url': f"https://www.job.sjtu.edu.cn/career/zpxx/view/zpxx/{job_item['zpxxid']}",
+                    'url': f"{BASE_URL}/career/zpxx/view/zpxx/{job_item['zpxxid']}",
                     'location': f"{job_item.get('szssmc', '')} {job_item.get('szsmc', '')}".strip(),
                     'company_type': job_item.get('xzyjmc', ''),
                     'industry': job_item.get('hyyjmc', ''),
@@ -37,7 +80,7 @@ def parse_job_list(json_content):
                 }
                 
                 # Clean up empty values
-                job = {k: v for k, v in job.items() if v}
+                job = Job({k: v for k, v in fields.items() if v})
                 
                 jobs.append(job)
                 logger.debug(f"Added job: {job['title']}")
@@ -111,65 +154,91 @@ def main():
     # Setup logging
     logger = setup_logger(__name__)
     
-    # Base URL with page number and page size parameters
-    base_url = "https://www.job.sjtu.edu.cn/career//zpxx/search/zpxx/{}/{}"
-    page_size = 10  # Number of items per page
-    
-    # Request headers
-    headers = {
-        'Accept': 'application/json, text/javascript, */*; q=0.01',
-        'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-        'Origin': 'https://www.job.sjtu.edu.cn',
-        'Referer': 'https://www.job.sjtu.edu.cn/career/zpxx/zpxx',
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
-        'X-Requested-With': 'XMLHttpRequest'
-    }
-    
-    # Setup output path
-    output_dir = Path('data/xml')
-    output_dir.mkdir(parents=True, exist_ok=True)
-    output_path = output_dir / f'sjtu_jobs.xml'
-    
-    # Load existing jobs
-    existing_jobs = load_existing_jobs(output_path) if output_path.exists() else []
-    existing_urls = {job['url'] for job in existing_jobs}
-    
-    all_new_jobs = []
-    max_pages = 2
+    # One crawl of a school at a time, they share its log and XML file
+    wal = CrawlLog('sjtu')
+    if not wal.acquire():
+        logger.warning("Another sjtu crawl is running, skipping this one")
+        return
     
-    for page in range(1, max_pages + 1):
-        logger.info(f"Processing page {page}/{max_pages}")
+    try:
+        # Setup output path
+        output_dir = Path('data/xml')
+        output_dir.mkdir(parents=True, exist_ok=True)
+        output_path = output_dir / f'sjtu_jobs.xml'
         
-        # Construct URL with page number and size
-        url = base_url.format(page, page_size)
+        # Load existing jobs
+        existing_jobs = load_existing_jobs(output_path) if output_path.exists() else []
+        existing_urls = {job['url'] for job in existing_jobs}
         
-        # Fetch JSON content
-        json_content = fetch_page_post(url, headers=headers)
-        if not json_content:
-            logger.error(f"Failed to fetch page {page}")
-            break
-            
-        # Parse jobs
-        new_jobs = [job for job in parse_job_list(json_content) 
-                   if job['url'] not in existing_urls]
+        # Resume after the last page an interrupted run logged
+        recovered = wal.recover()
+        all_new_jobs = [job for job in recovered['jobs'] if job['url'] not in existing_urls]
+        existing_urls.update(job['url'] for job in all_new_jobs)
         
-        if not new_jobs:
-            logger.info(f"No new jobs found on page {page}")
-            break
-            
-        all_new_jobs.extend(new_jobs)
-        existing_urls.update(job['url'] for job in new_jobs)
-        logger.info(f"Found {len(new_jobs)} new jobs on page {page}")
+        # Use the largest page size the upstream honors
+        page_size = recovered['state'].get('page_size') or negotiate_page_size(
+            'sjtu', DEFAULT_PAGE_SIZE, fetch_job_page, parse_job_list
+        )
         
-        time.sleep(2)  # Add delay between requests
+        # Items of the listing covered so far; counted in items, not pages,
+        # because the page size shrinks if the upstream starts capping
+        offset = recovered['state'].get('offset', recovered['page'] * page_size)
         
-    # Save all new jobs
-    if all_new_jobs:
-        save_jobs_to_xml(all_new_jobs, output_path, '上海交通大学', mode='a' if existing_jobs else 'w')
-
-        logger.info(f"Saved {len(all_new_jobs)} new jobs to {output_path}")
-    else:
-        logger.info("No new jobs to save")
+        # Cleared by a failed fetch, keeping the log for a resumed run
+        complete = True
+        while not recovered['done'] and offset < CRAWL_WINDOW:
+            page = offset // page_size + 1
+            logger.info(f"Processing page {page}, from item {offset} of {CRAWL_WINDOW}")
+            
+            # Fetch JSON content
+            json_content = fetch_job_page(page, page_size)
+            if not json_content:
+                logger.error(f"Failed to fetch page {page}")
+                complete = False
+                break
+                
+            # Parse jobs
+            jobs = parse_job_list(json_content)
+            new_jobs = [job for job in jobs if job['url'] not in existing_urls]
+            
+            # Fall back if the upstream started capping results
+            total = get_total_count(json_content) or 0
+            end = (page - 1) * page_size + len(jobs)
+            page_size = check_page_size('sjtu', page_size, len(jobs), end < total, DEFAULT_PAGE_SIZE)
+            
+            # Also stop if the page ended before items already covered
+            if not new_jobs or end <= offset:
+                logger.info(f"No new jobs found on page {page}")
+                break
+            offset = end
+                
+            wal.append(page, new_jobs, page_size=page_size, offset=offset)
+            all_new_jobs.extend(new_jobs)
+            existing_urls.update(job['url'] for job in new_jobs)
+            logger.info(f"Found {len(new_jobs)} new jobs on page {page}")
+            
+            time.sleep(2)  # Add delay between requests
+            
+        if complete:
+            wal.finish()
+        
+        # Save all new jobs
+        if all_new_jobs:
+            # Store first, replaying a log stores again harmlessly but skips jobs already in the XML
+            store_jobs('sjtu', all_new_jobs)
+            save_jobs_to_xml(all_new_jobs, output_path, '上海交通大学', mode='a' if existing_jobs else 'w')
+            logger.info(f"Saved {len(all_new_jobs)} new jobs to {output_path}")
+        else:
+            logger.info("No new jobs to save")
+            
+        # The log of an incomplete crawl is kept, so the next run retries the
+        # failed pages; jobs published here are skipped by it as already saved
+        if complete:
+            wal.truncate()
+        else:
+            logger.warning("Crawl incomplete, keeping its log for the next run")
+    finally:
+        wal.release()
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""Archive dated feed snapshots without storing repeated items twice
+
+Adds snapshots such as data/xml/fudan_jobs_20241121.xml to the archive in
+data/snapshots/ (see utils/snapshot_utils.py) and rebuilds the snapshot of
+any archived day. Files without a date in their name are archived under
+today's date, so a daily cron job can archive the live feeds.
+
+Usage:
+    python src/snapshot_archive.py add data/xml/*_20241121.xml --remove
+    python src/snapshot_archive.py add data/xml/fudan_jobs.xml --date 2026-10-19
+    python src/snapshot_archive.py get fudan 2024-11-21 -o fudan_jobs_20241121.xml
+    python src/snapshot_archive.py list --school fudan
+    python src/snapshot_archive.py stats
+"""
+from datetime import date, datetime
+from pathlib import Path
+import argparse
+import json
+import os
+import re
+import sys
+from import_archive import school_from_path
+from utils.log_utils import setup_logger, get_logger
+from utils.snapshot_utils import SnapshotArchive, split_snapshot
+
+# Date in snapshot file names like fudan_jobs_20241121.xml
+DATE_PATTERN = re.compile(r'_(\d{8})\.xml$')
+
+def snapshot_day(path):
+    """Return the 'YYYY-MM-DD' date in a snapshot file name, None if it has none"""
+    match = DATE_PATTERN.search(Path(path).name)
+    if not match:
+        return None
+    return datetime.strptime(match.group(1), '%Y%m%d').strftime('%Y-%m-%d')
+
+def add_snapshot(archive, path, school_code=None, day=None, remove=False):
+    """
+    Archive one snapshot file
+
+    Args:
+        archive: SnapshotArchive
+        path: Snapshot file
+        school_code: School code, derived from the file name if None
+        day: Date as 'YYYY-MM-DD', from the file name or today if None
+        remove: Delete the file once its archived copy was read back intact
+
+    Returns:
+        dict: Result of SnapshotArchive.add
+    """
+    logger = get_logger(__name__)
+    school_code = school_code or school_from_path(path)
+    day = day or snapshot_day(path) or date.today().strftime('%Y-%m-%d')
+
+    content = Path(path).read_bytes()
+    result = archive.add(school_code, day, content)
+    logger.info(f"Archived {path} as {school_code} {day}: {result['items']} items, "
+                f"{result['new_items']} new, {result['new_bytes']} bytes added")
+
+    if remove:
+        if split_snapshot(archive.read(school_code, day))[1] != split_snapshot(content)[1]:
+            raise RuntimeError(f"Archived copy of {path} differs, file kept")
+        os.remove(path)
+        logger.info(f"Removed {path}")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Deduplicated archive of daily feed snapshots')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add_parser = subparsers.add_parser('add', help='Archive snapshot files')
+    add_parser.add_argument('paths', nargs='+', help='Snapshot files (<jobs> snapshots or RSS feeds)')
+    add_parser.add_argument('--school', help='School code, derived from each file name by default')
+    add_parser.add_argument('--date', help='Snapshot date YYYY-MM-DD, from the file name or today by default')
+    add_parser.add_argument('--remove', action='store_true', help='Delete files once archived and verified')
+
+    get_parser = subparsers.add_parser('get', help='Rebuild the snapshot of a day')
+    get_parser.add_argument('school')
+    get_parser.add_argument('date', help='YYYY-MM-DD')
+    get_parser.add_argument('-o', '--output', help='Output file, stdout by default')
+
+    list_parser = subparsers.add_parser('list', help='List archived days')
+    list_parser.add_argument('--school')
+
+    subparsers.add_parser('stats', help='Print archive size figures as JSON')
+
+    args = parser.parse_args()
+    if getattr(args, 'date', None):
+        try:
+            datetime.strptime(args.date, '%Y-%m-%d')
+        except ValueError:
+            parser.error(f"Invalid date: {args.date}")
+
+    # Logs go to stderr and the log file, stdout carries snapshots and listings
+    setup_logger(__name__)
+
+    with SnapshotArchive() as archive:
+        if args.command == 'add':
+            for path in args.paths:
+                add_snapshot(archive, path, args.school, args.date, args.remove)
+        elif args.command == 'get':
+            content = archive.read(args.school, args.date)
+            if content is None:
+                sys.exit(f"No snapshot of {args.school} on {args.date}")
+            if args.output:
+                Path(args.output).write_bytes(content)
+            else:
+                sys.stdout.buffer.write(content)
+        elif args.command == 'list':
+            for school_code, day in archive.days(args.school):
+                print(f"{school_code}\t{day}")
+        else:
+            print(json.dumps(archive.stats(), indent=2))
+
+if __name__ == '__main__':
+    main()
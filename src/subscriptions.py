@@ -0,0 +1,59 @@
+"""Manage keyword subscriptions
+
+Each subscription gets its own feed at /rss/sub/<name>. New jobs are matched
+against all subscriptions when crawlers store them.
+
+Usage:
+    python src/subscriptions.py add ai-chips --keywords 算法,芯片 --schools sjtu,fudan --exclude 销售
+    python src/subscriptions.py list
+    python src/subscriptions.py remove ai-chips
+"""
+import argparse
+import re
+from utils.log_utils import setup_logger
+from utils.store_utils import delete_subscription, load_subscriptions, save_subscription
+
+# Names end up in feed URLs
+NAME_PATTERN = re.compile(r'^[\w-]+$')
+
+def split_list(value):
+    """Split a comma separated option, accepting full-width commas too"""
+    return [item.strip() for item in re.split(r'[,，]', value or '') if item.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage keyword subscriptions')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help='Create or replace a subscription')
+    add.add_argument('name')
+    add.add_argument('--keywords', help='Comma separated, any of them matches')
+    add.add_argument('--exclude', help='Comma separated, any of them excludes a job')
+    add.add_argument('--schools', help='Comma separated school codes, all schools by default')
+
+    remove = commands.add_parser('remove', help='Delete a subscription')
+    remove.add_argument('name')
+
+    commands.add_parser('list', help='List subscriptions')
+    args = parser.parse_args()
+
+    logger = setup_logger(__name__)
+
+    if args.command == 'add':
+        if not NAME_PATTERN.match(args.name):
+            parser.error(f"Invalid subscription name: {args.name}")
+        matched = save_subscription(
+            args.name, split_list(args.keywords), split_list(args.exclude), split_list(args.schools)
+        )
+        logger.info(f"Saved subscription {args.name}, {matched} stored jobs matched")
+    elif args.command == 'remove':
+        if not delete_subscription(args.name):
+            parser.error(f"Subscription not found: {args.name}")
+        logger.info(f"Deleted subscription {args.name}")
+    else:
+        for subscription in load_subscriptions():
+            print(f"{subscription['name']}: keywords={','.join(subscription['keywords']) or '*'} "
+                  f"exclude={','.join(subscription['exclude']) or '-'} "
+                  f"schools={','.join(subscription['schools']) or '*'}")
+
+if __name__ == '__main__':
+    main()
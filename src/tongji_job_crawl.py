@@ -1,19 +1,77 @@
 from bs4 import BeautifulSoup
 import json
+import os
 from pathlib import Path
+from urllib.parse import urlsplit
 import re
 from datetime import datetime
-from utils.request_utils import fetch_page_post
+from utils.request_utils import CACHE_TTL, fetch_page_post, parse_json
 from utils.log_utils import setup_logger, get_logger
 from utils.format_utils import save_jobs_to_xml
-import time
+from utils.store_utils import store_jobs
+from utils.wal_utils import CrawlLog
+from utils.rate_utils import CRAWL_RATE, get_rate_limiter
+from utils.school_utils import get_categories
+from utils.job_utils import Job
+from utils.page_size_utils import negotiate_page_size, check_page_size
 
-def parse_job_list(json_content):
-    """Parse job listing information from JSON content"""
+# Upstream site, override with TONGJI_BASE_URL to point at a mock server
+BASE_URL = os.environ.get('TONGJI_BASE_URL', 'https://tj91.tongji.edu.cn')
+
+# Known response encoding, override with TONGJI_ENCODING; unset trusts the
+# charset the upstream declares
+ENCODING = os.environ.get('TONGJI_ENCODING') or None
+
+# Page size of the upstream web UI, used when negotiation fails
+DEFAULT_PAGE_SIZE = 10
+
+# Number of newest items checked on each crawl
+CRAWL_WINDOW = 2 * DEFAULT_PAGE_SIZE
+
+# Listing categories crawled on each run, see school_utils.get_categories;
+# pages fetched without a category come from the first
+CATEGORIES = get_categories('tongji')
+DEFAULT_CATEGORY = next(iter(CATEGORIES))
+
+def fetch_job_page(page, page_size=DEFAULT_PAGE_SIZE, category=DEFAULT_CATEGORY):
+    """Fetch one page of a listing category, returns undecoded JSON content or None"""
+    # API URL
+    url = f"{BASE_URL}/f/newsCenter/ajax_thisNewsAndSiblingCategoryList"
+    
+    # Request headers
+    headers = {
+        'Accept': 'application/json, text/javascript, */*; q=0.01',
+        'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
+        'Origin': 'https://tj91.tongji.edu.cn',
+        'Referer': f'https://tj91.tongji.edu.cn/frontpage/tongji/html/newsList.html?id={category}',
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
+        'X-Requested-With': 'XMLHttpRequest'
+    }
+    
+    # Request data
+    data = {
+        'categoryId': category,
+        'pageSize': str(page_size),
+        'title': '',
+        'pageNo': str(page)
+    }
+    
+    return fetch_page_post(url, headers=headers, data=data, cache_ttl=CACHE_TTL,
+                           raw=True, encoding=ENCODING)
+
+def get_total_count(json_content):
+    """Extract total number of listings from JSON content"""
+    try:
+        return int(parse_json(json_content)['object']['newsPage']['count'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+def parse_job_list(json_content, category=DEFAULT_CATEGORY):
+    """Parse job listing information from JSON content of a listing category"""
     logger = get_logger(__name__)
     
     try:
-        data = json.loads(json_content)
+        data = parse_json(json_content)
         if data.get('state') != 1:
             logger.error(f"API returned error state: {data.get('state')}")
             return []
@@ -23,19 +81,20 @@ def parse_job_list(json_content):
         
         for job_item in jobs_data:
             try:
-                job = {
+                fields = {
                     'title': job_item['title'].strip(),
                     'id': job_item['id'],
                     'publish_date': job_item['releaseDate'],
-                    'type': '招聘信息',
-                    'url': f"https://tj91.tongji.edu.cn{job_item['url']}",
+                    'type': CATEGORIES.get(category, category),
+                    'category': category,
+                    'url': f"{BASE_URL}{job_item['url']}",
                     'publisher': job_item.get('publisher', ''),
                     'views': str(job_item.get('hits', 0)),
                     'description': job_item.get('description', '').strip()
                 }
                 
                 # Clean up empty values
-                job = {k: v for k, v in job.items() if v}
+                job = Job({k: v for k, v in fields.items() if v})
                 
                 jobs.append(job)
                 logger.debug(f"Added job: {job['title']}")
@@ -109,70 +168,106 @@ def main():
     # Setup logging
     logger = setup_logger(__name__)
     
-    # API URL
-    url = "https://tj91.tongji.edu.cn/f/newsCenter/ajax_thisNewsAndSiblingCategoryList"
+    # One crawl of a school at a time, they share its log and XML file
+    wal = CrawlLog('tongji')
+    if not wal.acquire():
+        logger.warning("Another tongji crawl is running, skipping this one")
+        return
     
-    # Request headers
-    headers = {
-        'Accept': 'application/json, text/javascript, */*; q=0.01',
-        'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-        'Origin': 'https://tj91.tongji.edu.cn',
-        'Referer': 'https://tj91.tongji.edu.cn/frontpage/tongji/html/newsList.html?id=1012',
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
-        'X-Requested-With': 'XMLHttpRequest'
-    }
-    
-    # Request data
-    data = {
-        'categoryId': '1012',
-        'pageSize': '10',
-        'title': ''
-    }
-    
-    # Setup output path
-    output_dir = Path('data/xml')
-    output_dir.mkdir(parents=True, exist_ok=True)
-    output_path = output_dir / f'tongji_jobs.xml'
-    
-    # Load existing jobs
-    existing_jobs = load_existing_jobs(output_path) if output_path.exists() else []
-    existing_urls = {job['url'] for job in existing_jobs}
-    
-    all_new_jobs = []
-    max_pages = 2
-    
-    for page in range(1, max_pages + 1):
-        logger.info(f"Processing page {page}/{max_pages}")
+    try:
+        # Setup output path
+        output_dir = Path('data/xml')
+        output_dir.mkdir(parents=True, exist_ok=True)
+        output_path = output_dir / f'tongji_jobs.xml'
         
-        # Update page number in request data
-        data['pageNo'] = str(page)
+        # Load existing jobs
+        existing_jobs = load_existing_jobs(output_path) if output_path.exists() else []
+        existing_urls = {job['url'] for job in existing_jobs}
         
-        # Fetch JSON content
-        json_content = fetch_page_post(url, headers=headers, data=data)
-        if not json_content:
-            logger.error(f"Failed to fetch page {page}")
-            break
-            
-        # Parse jobs
-        new_jobs = [job for job in parse_job_list(json_content) 
-                   if job['url'] not in existing_urls]
+        # Resume after the last page an interrupted run logged
+        recovered = wal.recover()
+        found = {job['url']: job for job in recovered['jobs'] if job['url'] not in existing_urls}
         
-        if not new_jobs:
-            logger.info(f"No new jobs found on page {page}")
-            break
-            
-        all_new_jobs.extend(new_jobs)
-        existing_urls.update(job['url'] for job in new_jobs)
-        logger.info(f"Found {len(new_jobs)} new jobs on page {page}")
+        # Use the largest page size the upstream honors
+        page_size = recovered['state'].get('page_size') or negotiate_page_size(
+            'tongji', DEFAULT_PAGE_SIZE, fetch_job_page, parse_job_list
+        )
         
-        time.sleep(2)  # Add delay between requests
+        # All categories share the host's pooled connections and request spacing
+        limiter = get_rate_limiter(urlsplit(BASE_URL).netloc, CRAWL_RATE)
+        # Cleared when a category is cut short, keeping the log for a resumed run
+        complete = True
+        for category in CATEGORIES:
+            # A crawl that had finished fetching only publishes what it logged
+            if recovered['done'] or category in recovered['categories_done']:
+                continue
+            # Items of the category covered so far; counted in items, not pages,
+            # because the page size shrinks if the upstream starts capping
+            offset = 0
+            if category == recovered['state'].get('category'):
+                offset = recovered['state'].get('offset', recovered['page'] * page_size)
+            
+            fetch_failed = False
+            while offset < CRAWL_WINDOW:
+                page = offset // page_size + 1
+                logger.info(f"Processing {CATEGORIES[category]} page {page}, from item {offset} of {CRAWL_WINDOW}")
+                
+                # Fetch JSON content
+                limiter.acquire()
+                json_content = fetch_job_page(page, page_size, category)
+                if not json_content:
+                    logger.error(f"Failed to fetch page {page}")
+                    fetch_failed = True
+                    break
+                    
+                # Parse jobs
+                jobs = parse_job_list(json_content, category)
+                unseen = [job for job in jobs if job['url'] not in existing_urls]
+                
+                # Fall back if the upstream started capping results
+                total = get_total_count(json_content) or 0
+                end = (page - 1) * page_size + len(jobs)
+                page_size = check_page_size('tongji', page_size, len(jobs), end < total, DEFAULT_PAGE_SIZE)
+                
+                # Also stop if the page ended before items already covered
+                if not unseen or end <= offset:
+                    logger.info(f"No new jobs found on page {page}")
+                    break
+                offset = end
+                    
+                # Jobs listed in several categories are kept once, in the first
+                new_jobs = [job for job in unseen if job['url'] not in found]
+                wal.append(page, new_jobs, category=category, page_size=page_size, offset=offset)
+                found.update((job['url'], job) for job in new_jobs)
+                logger.info(f"Found {len(new_jobs)} new jobs on page {page}")
+                
+            # A category cut short by a failed fetch stays open for a resumed run
+            if fetch_failed:
+                complete = False
+            else:
+                wal.finish(category)
+            
+        if complete:
+            wal.finish()
+        all_new_jobs = list(found.values())
         
-    # Save all new jobs
-    if all_new_jobs:
-        save_jobs_to_xml(all_new_jobs, output_path, '同济大学', mode='a' if existing_jobs else 'w')
-        logger.info(f"Saved {len(all_new_jobs)} new jobs to {output_path}")
-    else:
-        logger.info("No new jobs to save")
+        # Save all new jobs
+        if all_new_jobs:
+            # Store first, replaying a log stores again harmlessly but skips jobs already in the XML
+            store_jobs('tongji', all_new_jobs)
+            save_jobs_to_xml(all_new_jobs, output_path, '同济大学', mode='a' if existing_jobs else 'w')
+            logger.info(f"Saved {len(all_new_jobs)} new jobs to {output_path}")
+        else:
+            logger.info("No new jobs to save")
+            
+        # The log of an incomplete crawl is kept, so the next run retries the
+        # failed pages; jobs published here are skipped by it as already saved
+        if complete:
+            wal.truncate()
+        else:
+            logger.warning("Crawl incomplete, keeping its log for the next run")
+    finally:
+        wal.release()
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -0,0 +1,228 @@
+"""Debug endpoints for looking inside a running server
+
+Disabled unless DEBUG_TOKEN is set; the servers then don't even register
+the routes, so they cost nothing when off. Every request must carry the
+token as X-Debug-Token header or ?token= parameter.
+
+    /debug/profile?seconds=10&format=collapsed   sampling CPU profile of all threads
+    /debug/profile?seconds=10&format=pstats      same, as a file for pstats or snakeviz
+    /debug/memory/start?frames=10                start tracemalloc
+    /debug/memory/snapshot?limit=30&group=lineno top allocations, diffed against the last snapshot
+    /debug/memory/stop                           stop tracemalloc, drop snapshots
+    /debug/crawls                                in-flight crawls with their current stacks
+"""
+from collections import Counter
+import hmac
+import json
+import marshal
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from urllib.parse import urlsplit
+from utils.request_utils import get_request_counts
+from utils.school_utils import SCHOOL_CODES, crawl_state
+
+# Shared secret of the debug endpoints, unset disables them
+DEBUG_TOKEN = os.environ.get('DEBUG_TOKEN', '')
+
+# Limits of one profiling run
+MAX_PROFILE_SECONDS = 60
+SAMPLE_INTERVAL = 0.01
+
+_profile_lock = threading.Lock()
+_last_snapshot = [None]
+
+def check_token(token):
+    """Return True if token grants access to the debug endpoints"""
+    return bool(DEBUG_TOKEN) and hmac.compare_digest(token or '', DEBUG_TOKEN)
+
+def _frame_key(frame):
+    code = frame.f_code
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+def _stack(frame):
+    """Return frame keys of a stack, outermost first"""
+    stack = []
+    while frame is not None:
+        stack.append(_frame_key(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+def sample_stacks(seconds, interval=SAMPLE_INTERVAL):
+    """
+    Sample the stacks of all other threads
+
+    Args:
+        seconds: Sampling duration
+        interval: Seconds between samples
+
+    Returns:
+        Counter: (thread name, stack tuple) to number of samples
+    """
+    own = threading.get_ident()
+    samples = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id != own:
+                samples[names.get(thread_id, str(thread_id)), tuple(_stack(frame))] += 1
+        time.sleep(interval)
+    return samples
+
+def collapsed_stacks(samples):
+    """Format samples as collapsed stacks, one 'thread;frame;... count' line each"""
+    lines = []
+    for (thread_name, stack), count in samples.most_common():
+        frames = [f"{name} ({os.path.basename(filename)}:{line})" for filename, line, name in stack]
+        lines.append(f"{';'.join([thread_name] + frames)} {count}")
+    return '\n'.join(lines) + '\n'
+
+def pstats_dump(samples, interval=SAMPLE_INTERVAL):
+    """
+    Convert samples to the marshalled format read by pstats.Stats
+
+    Call counts are sample counts; own and cumulative times are samples
+    where the function was on top of or anywhere on the stack, times the
+    sampling interval.
+    """
+    own = Counter()
+    total = Counter()
+    callers = {}
+    for (_, stack), count in samples.items():
+        if not stack:
+            continue
+        own[stack[-1]] += count
+        for key in set(stack):
+            total[key] += count
+        for caller, callee in set(zip(stack, stack[1:])):
+            edges = callers.setdefault(callee, Counter())
+            edges[caller] += count
+
+    stats = {}
+    for key, count in total.items():
+        edges = {
+            caller: (n, n, 0.0, n * interval)
+            for caller, n in callers.get(key, {}).items()
+        }
+        stats[key] = (count, count, own[key] * interval, count * interval, edges)
+    return marshal.dumps(stats)
+
+def profile(seconds, output='collapsed'):
+    """
+    Run a sampling profile of the whole process
+
+    Returns:
+        tuple: (status, content type, body)
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return 409, 'text/plain', b'A profile is already running'
+    try:
+        samples = sample_stacks(min(max(seconds, 0.1), MAX_PROFILE_SECONDS))
+    finally:
+        _profile_lock.release()
+
+    if output == 'pstats':
+        return 200, 'application/octet-stream', pstats_dump(samples)
+    return 200, 'text/plain; charset=utf-8', collapsed_stacks(samples).encode('utf-8')
+
+def start_tracing(frames=10):
+    """Start tracemalloc, keeping frames frames per allocation"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+        _last_snapshot[0] = None
+    return 200, 'text/plain', f"Tracing with {tracemalloc.get_traceback_limit()} frames\n".encode('utf-8')
+
+def stop_tracing():
+    """Stop tracemalloc and drop the stored snapshot"""
+    tracemalloc.stop()
+    _last_snapshot[0] = None
+    return 200, 'text/plain', b'Tracing stopped\n'
+
+def memory_snapshot(limit=30, group='lineno'):
+    """
+    Take a tracemalloc snapshot and report top allocations
+
+    The first snapshot lists the largest allocation sites, later ones the
+    largest changes since the previous snapshot.
+
+    Returns:
+        tuple: (status, content type, body)
+    """
+    if not tracemalloc.is_tracing():
+        return 409, 'text/plain', b'Not tracing, call /debug/memory/start first\n'
+    if group not in ('lineno', 'filename', 'traceback'):
+        return 400, 'text/plain', f"Invalid group: {group}\n".encode('utf-8')
+
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>')
+    ))
+    previous = _last_snapshot[0]
+    _last_snapshot[0] = snapshot
+
+    current, peak = tracemalloc.get_traced_memory()
+    lines = [f"Traced memory: {current / 1024 / 1024:.1f} MiB, peak {peak / 1024 / 1024:.1f} MiB"]
+    if previous is None:
+        lines.append(f"Top {limit} allocation sites:")
+        stats = snapshot.statistics(group)
+    else:
+        lines.append(f"Top {limit} changes since previous snapshot:")
+        stats = snapshot.compare_to(previous, group)
+    for stat in stats[:limit]:
+        lines.append(str(stat))
+        if group == 'traceback':
+            lines.extend(f"    {line}" for line in stat.traceback.format())
+    return 200, 'text/plain; charset=utf-8', ('\n'.join(lines) + '\n').encode('utf-8')
+
+def crawls():
+    """
+    Report crawls in flight with their current stack, plus request counters
+
+    Returns:
+        tuple: (status, content type, body)
+    """
+    frames = sys._current_frames()
+    state = {}
+    for school_code, running in crawl_state().items():
+        for run in running:
+            run['seconds'] = round(time.time() - run['started_at'], 3)
+            frame = frames.get(run['thread'])
+            run['stack'] = [
+                f"{name} ({os.path.basename(filename)}:{line})" for filename, line, name in _stack(frame)
+            ] if frame else []
+        entry = {'running': running}
+        module = sys.modules.get(SCHOOL_CODES[school_code]['module'])
+        if module is not None:
+            entry['requests'] = get_request_counts(urlsplit(module.BASE_URL).netloc)
+        state[school_code] = entry
+    return 200, 'application/json', json.dumps(state, ensure_ascii=False, indent=2).encode('utf-8')
+
+def handle(path, params):
+    """
+    Dispatch a debug request, the caller has checked the token
+
+    Args:
+        path: Path below /debug/, e.g. 'memory/snapshot'
+        params: Dict of query parameters
+
+    Returns:
+        tuple: (status, content type, body)
+    """
+    try:
+        if path == 'profile':
+            return profile(float(params.get('seconds', 10)), params.get('format', 'collapsed'))
+        if path == 'memory/start':
+            return start_tracing(int(params.get('frames', 10)))
+        if path == 'memory/snapshot':
+            return memory_snapshot(int(params.get('limit', 30)), params.get('group', 'lineno'))
+        if path == 'memory/stop':
+            return stop_tracing()
+        if path == 'crawls':
+            return crawls()
+    except ValueError as e:
+        return 400, 'text/plain', f"Invalid parameter: {str(e)}\n".encode('utf-8')
+    return 404, 'text/plain', b'Not found\n'
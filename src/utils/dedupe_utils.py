@@ -0,0 +1,146 @@
+from array import array
+import hashlib
+import json
+import random
+import re
+import unicodedata
+
+# MinHash signature length, split into LSH bands of ROWS_PER_BAND values.
+# Pairs with Jaccard similarity s share a band with probability
+# 1 - (1 - s ** ROWS_PER_BAND) ** BAND_COUNT, ~0.99 at s = 0.7.
+NUM_PERM = 64
+BAND_COUNT = 16
+ROWS_PER_BAND = NUM_PERM // BAND_COUNT
+
+# Candidates at or above this estimated Jaccard similarity are near-duplicates
+MIN_SIMILARITY = 0.75
+
+# Times each title shingle counts against one company shingle. Titles tell
+# postings apart; without the weight, short titles at an employer with a
+# long name ('高中化学老师' and '高中数学老师' at one school) look alike
+# through the company name alone.
+TITLE_WEIGHT = 3
+
+# Generic words shared by most postings, removed so they don't make
+# unrelated postings look similar
+STOPWORDS = (
+    '股份有限公司', '有限责任公司', '有限公司', '校园招聘', '招聘公告', '招聘简章',
+    '招聘启事', '招聘', '公告', '简章', '届'
+)
+
+# Fields left out of content hashes: counters that change on every visit,
+# the listing category a job was first found in and store metadata
+VOLATILE_FIELDS = frozenset(('views', 'category', 'school', 'cluster_id', 'seq', 'version', 'updated_at'))
+
+_MASK64 = (1 << 64) - 1
+
+# Fixed seed so signatures stay comparable across processes and restarts
+_rng = random.Random(20241121)
+_PERMUTATIONS = [(_rng.getrandbits(64) | 1, _rng.getrandbits(64)) for _ in range(NUM_PERM)]
+
+def strip_tags(title):
+    """Drop bracketed tags such as 【线下】 or [宣讲会] from a title"""
+    title = unicodedata.normalize('NFKC', title or '')
+    return re.sub(r'【[^】]*】|\[[^\]]*\]', '', title)
+
+def normalize_text(text):
+    """Normalize text for fingerprinting: width, case, stopwords and punctuation"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    for word in STOPWORDS:
+        text = text.replace(word, '')
+    return re.sub(r'[\W_]+', '', text)
+
+def shingles(text, size=2):
+    """Split normalized text into a set of overlapping character shingles"""
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+def minhash(tokens):
+    """
+    Compute MinHash signature of a set of tokens
+
+    Args:
+        tokens: Set of strings, e.g. shingles
+
+    Returns:
+        tuple: NUM_PERM 32-bit values, None if there are no tokens
+    """
+    if not tokens:
+        return None
+
+    hashes = [
+        int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+        for token in tokens
+    ]
+    # Multiply-shift hashing stands in for random permutations
+    return tuple(
+        min(((a * h + b) & _MASK64) >> 32 for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+def job_tokens(job):
+    """
+    Weighted shingles of a job's title and company
+
+    Each title shingle appears TITLE_WEIGHT times, which turns the Jaccard
+    similarity of the token sets into a weighted one. Only the title loses
+    bracketed tags: some sites put the company itself in brackets, e.g.
+    nankai's '【公司】 北京市'.
+    """
+    tokens = {
+        f'{copy}:{shingle}'
+        for shingle in shingles(normalize_text(strip_tags(job.get('title'))))
+        for copy in range(TITLE_WEIGHT)
+    }
+    tokens.update(f'company:{shingle}' for shingle in shingles(normalize_text(job.get('company'))))
+    return tokens
+
+def job_signature(job):
+    """MinHash signature of a job's title and company, None if both are empty"""
+    return minhash(job_tokens(job))
+
+def bucket_keys(signature):
+    """
+    Hash each band of a signature into an LSH bucket key
+
+    Returns:
+        list: BAND_COUNT signed 64-bit keys, distinct per band index
+    """
+    keys = []
+    for band in range(BAND_COUNT):
+        values = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        raw = array('I', (band,) + tuple(values)).tobytes()
+        keys.append(int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), 'little', signed=True))
+    return keys
+
+def similarity(signature_a, signature_b):
+    """Estimate Jaccard similarity from two signatures"""
+    return sum(1 for a, b in zip(signature_a, signature_b) if a == b) / NUM_PERM
+
+def pack_signature(signature):
+    """Serialize signature for storage"""
+    return array('I', signature).tobytes() if signature else None
+
+def unpack_signature(blob):
+    """Deserialize stored signature"""
+    if not blob:
+        return None
+    values = array('I')
+    values.frombytes(blob)
+    return tuple(values)
+
+def content_hash(job):
+    """
+    Hash a job's normalized fields to detect edited postings
+
+    Returns:
+        str: 16 hex digits, equal for jobs differing only in whitespace,
+            field order or volatile fields
+    """
+    fields = sorted(
+        (key, ' '.join(str(value).split()))
+        for key, value in job.items() if key not in VOLATILE_FIELDS and value not in (None, '')
+    )
+    raw = json.dumps(fields, ensure_ascii=False)
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=8).hexdigest()
@@ -0,0 +1,116 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import json
+import os
+import re
+from utils.request_utils import fetch_page, parse_html
+from utils.log_utils import get_logger
+
+# Detail page enrichment is opt-in, set ENRICH_DETAILS=1 to enable it
+ENRICH_DETAILS = os.environ.get('ENRICH_DETAILS', '') == '1'
+
+DETAIL_CACHE_DIR = Path('data/cache/details')
+
+def extract_text(html_content, selectors, max_length=1000):
+    """
+    Extract readable body text from a detail page
+
+    Args:
+        html_content: HTML content of the detail page, text or RawContent
+        selectors: CSS selectors tried in order, falls back to <body>
+        max_length: Maximum number of characters to keep
+
+    Returns:
+        str: Extracted text, empty string if nothing was found
+    """
+    soup = parse_html(html_content)
+    for tag in soup(['script', 'style', 'noscript']):
+        tag.decompose()
+
+    container = None
+    for selector in selectors:
+        container = soup.select_one(selector)
+        if container and container.get_text(strip=True):
+            break
+    else:
+        container = soup.body or soup
+
+    text = re.sub(r'\s+', ' ', container.get_text(' ', strip=True)).strip()
+    return text[:max_length]
+
+def load_detail_cache(school_code):
+    """Load cached detail descriptions keyed by job ID"""
+    cache_path = DETAIL_CACHE_DIR / f'{school_code}.json'
+    if not cache_path.exists():
+        return {}
+
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_detail_cache(school_code, cache):
+    """Persist detail descriptions keyed by job ID"""
+    DETAIL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    cache_path = DETAIL_CACHE_DIR / f'{school_code}.json'
+    tmp_path = cache_path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
+
+def enrich_jobs(jobs, school_code, extract_detail, max_workers=4, encoding=None):
+    """
+    Fill job descriptions from their detail pages
+
+    Each detail page is fetched at most once, results are cached by job ID
+    (or URL when the school has no ID) and reused by later runs.
+
+    Args:
+        jobs: List of job dicts, updated in place
+        school_code: School code used to name the cache file
+        extract_detail: Function turning detail page HTML into description text
+        max_workers: Maximum number of detail pages fetched concurrently
+        encoding: Known encoding of the detail pages, None trusts the declared charset
+
+    Returns:
+        int: Number of jobs that received a description
+    """
+    logger = get_logger(__name__)
+
+    cache = load_detail_cache(school_code)
+    pending = {}
+    for job in jobs:
+        job_key = str(job.get('id') or job['url'])
+        if job_key not in cache:
+            pending[job_key] = job['url']
+
+    def fetch_detail(url):
+        html_content = fetch_page(url, max_retries=2, retry_delay=2, raw=True, encoding=encoding)
+        if not html_content:
+            return None
+        try:
+            return extract_detail(html_content)
+        except Exception as e:
+            logger.error(f"Error extracting detail page {url}: {str(e)}")
+            return None
+
+    if pending:
+        logger.info(f"Fetching {len(pending)} detail pages with {max_workers} workers")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(fetch_detail, pending.values())
+            for job_key, description in zip(pending.keys(), results):
+                # Failed fetches are retried on the next run
+                if description is not None:
+                    cache[job_key] = description
+        save_detail_cache(school_code, cache)
+
+    enriched = 0
+    for job in jobs:
+        description = cache.get(str(job.get('id') or job['url']))
+        if description:
+            job['description'] = description
+            enriched += 1
+
+    logger.info(f"Enriched {enriched}/{len(jobs)} jobs from detail pages")
+    return enriched
@@ -1,6 +1,201 @@
 from bs4 import BeautifulSoup
 from email.utils import formatdate
 from datetime import datetime
+import html
+import os
+
+# Characters of the description kept in compact feed items
+SUMMARY_LENGTH = 120
+
+# Labels of fields shown on item pages, other fields are listed after them
+FIELD_LABELS = {
+    'title': '职位',
+    'company': '单位',
+    'publish_date': '发布日期',
+    'deadline': '截止日期',
+    'type': '类型',
+    'location': '地点',
+    'position_type': '职位类别',
+    'education': '学历要求',
+    'salary': '薪资',
+    'company_type': '单位性质',
+    'industry': '行业',
+    'company_size': '单位规模',
+    'company_address': '单位地址',
+    'company_website': '单位网站',
+    'company_description': '单位介绍',
+    'description': '详情'
+}
+
+# Store metadata not shown on item pages
+HIDDEN_FIELDS = frozenset(('url', 'category', 'school', 'cluster_id', 'seq', 'version', 'updated_at'))
+
+def _new_feed(school_name):
+    """Create empty RSS document and return soup and channel element"""
+    soup = BeautifulSoup('', 'xml')
+    
+    # Add RSS root element
+    rss = soup.new_tag('rss', version="2.0")
+    soup.append(rss)
+    
+    # Add channel element
+    channel = soup.new_tag('channel')
+    rss.append(channel)
+    
+    # Add channel metadata
+    title = soup.new_tag('title')
+    title.string = f"{school_name}招聘信息"
+    channel.append(title)
+    
+    link = soup.new_tag('link')
+    link.string = "https://example.com/jobs"
+    channel.append(link)
+    
+    description = soup.new_tag('description')
+    description.string = f"{school_name}招聘信息RSS订阅"
+    channel.append(description)
+    
+    language = soup.new_tag('language')
+    language.string = 'zh-cn'
+    channel.append(language)
+    
+    pub_date = soup.new_tag('pubDate')
+    pub_date.string = formatdate(localtime=True)
+    channel.append(pub_date)
+    
+    last_build_date = soup.new_tag('lastBuildDate')
+    last_build_date.string = formatdate(localtime=True)
+    channel.append(last_build_date)
+    
+    return soup, channel
+
+def summarize(text, length=SUMMARY_LENGTH):
+    """Collapse whitespace and cut text to length characters"""
+    text = ' '.join(text.split())
+    if len(text) <= length:
+        return text
+    return text[:length].rstrip() + '…'
+
+def _append_job_item(soup, channel, job, item_url=None):
+    """
+    Append a job as RSS item to channel
+
+    With item_url, a function returning the URL of a job's item page, the
+    description is cut to a summary linking to that page.
+    """
+    item = soup.new_tag('item')
+    
+    # Add title
+    title = soup.new_tag('title')
+    title.string = job['title']
+    item.append(title)
+    
+    # Add link
+    link = soup.new_tag('link')
+    link.string = job['url']
+    item.append(link)
+    
+    # Add description
+    description = soup.new_tag('description')
+    if item_url:
+        summary = html.escape(summarize(job.get('description', job['title'])))
+        description.string = f'{summary} <a href="{html.escape(item_url(job))}">查看详情</a>'
+    else:
+        description.string = job.get('description', job['title'])
+    item.append(description)
+    
+    # Add pubDate
+    pub_date = soup.new_tag('pubDate')
+    version = job.get('version') or 1
+    # Edited jobs carry the time of the edit so readers show them again
+    if version > 1 and job.get('updated_at'):
+        pub_date.string = formatdate(job['updated_at'], localtime=True)
+    else:
+        # Convert job's publish_date to RFC 2822 format
+        try:
+            date_obj = datetime.strptime(job['publish_date'], '%Y-%m-%d')
+            pub_date.string = formatdate(float(date_obj.timestamp()), localtime=True)
+        except:
+            pub_date.string = formatdate(localtime=True)
+    item.append(pub_date)
+    
+    # Add guid, versioned once the job was edited
+    guid = soup.new_tag('guid')
+    if version > 1:
+        guid['isPermaLink'] = 'false'
+        guid.string = f"{job['url']}#v{version}"
+    else:
+        guid.string = job['url']
+    item.append(guid)
+    
+    # Add category
+    category = soup.new_tag('category')
+    category.string = job.get('type', '招聘信息')
+    item.append(category)
+    
+    channel.append(item)
+
+def _add_feed_links(soup, channel, links, archive=False):
+    """Add RFC 5005 paging links and archive marker to channel"""
+    rss = soup.find('rss')
+    rss['xmlns:atom'] = 'http://www.w3.org/2005/Atom'
+    rss['xmlns:fh'] = 'http://purl.org/syndication/history/1.0'
+    
+    for rel, href in links:
+        link = soup.new_tag('atom:link', rel=rel, href=href, type='application/rss+xml')
+        channel.append(link)
+        
+    if archive:
+        channel.append(soup.new_tag('fh:archive'))
+
+def render_jobs_to_xml(jobs, school_name, links=None, archive=False, item_url=None):
+    """
+    Render jobs as RSS document string
+    
+    Args:
+        jobs: List of job dicts
+        school_name: School name used in channel metadata
+        links: Optional list of (rel, href) feed links, e.g. prev-archive
+        archive: Mark the document as an RFC 5005 archive document
+        item_url: Optional function returning the item page URL of a job,
+            renders compact items whose description is a summary
+    
+    Returns:
+        str: RSS document
+    """
+    soup, channel = _new_feed(school_name)
+    if links or archive:
+        _add_feed_links(soup, channel, links or [], archive)
+    for job in jobs:
+        _append_job_item(soup, channel, job, item_url)
+    return str(soup.prettify())
+
+def render_job_html(job, school_name):
+    """
+    Render the full record of a job as HTML page
+
+    Args:
+        job: Stored job
+        school_name: School name shown in the heading
+
+    Returns:
+        str: HTML document
+    """
+    keys = [key for key in FIELD_LABELS if job.get(key)]
+    keys += [key for key in job if key not in FIELD_LABELS and key not in HIDDEN_FIELDS and job.get(key)]
+    rows = ''.join(
+        f'<dt>{html.escape(FIELD_LABELS.get(key, key))}</dt><dd>{html.escape(str(job[key]))}</dd>'
+        for key in keys
+    )
+    title = html.escape(job['title'])
+    return (
+        '<!DOCTYPE html>\n<html lang="zh-cn"><head><meta charset="utf-8">'
+        f'<title>{title}</title></head><body>'
+        f'<h1>{title}</h1><p>{html.escape(school_name)}招聘信息</p>'
+        f'<dl style="white-space: pre-wrap">{rows}</dl>'
+        f'<p><a href="{html.escape(job["url"])}">原文链接</a></p>'
+        '</body></html>\n'
+    )
 
 def save_jobs_to_xml(jobs, output_path, school_name, mode='w'):
     """Save jobs to XML file in RSS format"""
@@ -16,82 +211,14 @@ def save_jobs_to_xml(jobs, output_path, school_name, mode='w'):
             last_build_date.string = formatdate(localtime=True)
     else:
         # Create new RSS structure
-        soup = BeautifulSoup('', 'xml')
-        
-        # Add RSS root element
-        rss = soup.new_tag('rss', version="2.0")
-        soup.append(rss)
-        
-        # Add channel element
-        channel = soup.new_tag('channel')
-        rss.append(channel)
-        
-        # Add channel metadata
-        title = soup.new_tag('title')
-        title.string = f"{school_name}招聘信息"
-        channel.append(title)
-        
-        link = soup.new_tag('link')
-        link.string = "https://example.com/jobs"
-        channel.append(link)
-        
-        description = soup.new_tag('description')
-        description.string = f"{school_name}招聘信息RSS订阅"
-        channel.append(description)
-        
-        language = soup.new_tag('language')
-        language.string = 'zh-cn'
-        channel.append(language)
-        
-        pub_date = soup.new_tag('pubDate')
-        pub_date.string = formatdate(localtime=True)
-        channel.append(pub_date)
-        
-        last_build_date = soup.new_tag('lastBuildDate')
-        last_build_date.string = formatdate(localtime=True)
-        channel.append(last_build_date)
+        soup, channel = _new_feed(school_name)
 
     # Add new jobs as items
     for job in jobs:
-        item = soup.new_tag('item')
-        
-        # Add title
-        title = soup.new_tag('title')
-        title.string = job['title']
-        item.append(title)
-        
-        # Add link
-        link = soup.new_tag('link')
-        link.string = job['url']
-        item.append(link)
-        
-        # Add description
-        description = soup.new_tag('description')
-        description.string = job.get('description', job['title'])
-        item.append(description)
-        
-        # Add pubDate
-        pub_date = soup.new_tag('pubDate')
-        # Convert job's publish_date to RFC 2822 format
-        try:
-            date_obj = datetime.strptime(job['publish_date'], '%Y-%m-%d')
-            pub_date.string = formatdate(float(date_obj.timestamp()), localtime=True)
-        except:
-            pub_date.string = formatdate(localtime=True)
-        item.append(pub_date)
-        
-        # Add guid
-        guid = soup.new_tag('guid')
-        guid.string = job['url']
-        item.append(guid)
-        
-        # Add category
-        category = soup.new_tag('category')
-        category.string = job.get('type', '招聘信息')
-        item.append(category)
-        
-        channel.append(item)
+        _append_job_item(soup, channel, job)
 
-    # Save to file
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(str(soup.prettify()))
\ No newline at end of file
+    # Save to file, replaced atomically so a crash never leaves half a feed
+    tmp_path = output_path.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(str(soup.prettify()))
+    os.replace(tmp_path, output_path)
\ No newline at end of file
@@ -0,0 +1,91 @@
+from collections.abc import MutableMapping
+import sys
+
+# Fields set by crawlers and the store, in serialization order
+FIELDS = (
+    'title', 'url', 'id', 'company', 'publish_date', 'deadline', 'recruiter_date',
+    'type', 'category', 'location', 'position_type', 'education', 'salary', 'company_type',
+    'industry', 'company_size', 'company_address', 'company_website',
+    'company_description', 'publisher', 'views', 'description', 'school', 'cluster_id',
+    'seq', 'version', 'updated_at'
+)
+
+# Fields whose values repeat across many jobs, each distinct value is kept once
+CATEGORICAL_FIELDS = frozenset((
+    'type', 'category', 'company', 'location', 'position_type', 'education', 'salary',
+    'company_type', 'industry', 'company_size', 'publisher', 'school'
+))
+
+_FIELD_SET = frozenset(FIELDS)
+
+class Job(MutableMapping):
+    """
+    Compact job record
+
+    Behaves like the job dicts used throughout the crawlers, but keeps known
+    fields in slots instead of a per-job hash table and interns categorical
+    values. Unset fields cost one pointer; unknown fields go to a lazily
+    created dict.
+    """
+
+    __slots__ = FIELDS + ('extra',)
+
+    def __init__(self, fields=None, **kwargs):
+        self.extra = None
+        for source in (fields or {}, kwargs):
+            for key, value in source.items():
+                self[key] = value
+
+    def __getitem__(self, key):
+        if key in _FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in _FIELD_SET:
+            if key in CATEGORICAL_FIELDS and type(value) is str:
+                value = sys.intern(value)
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _FIELD_SET:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self.extra and key in self.extra:
+            del self.extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for key in FIELDS:
+            if hasattr(self, key):
+                yield key
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"Job({self.to_dict()!r})"
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self.__init__(state)
+
+    def to_dict(self):
+        """Return fields as a plain dict, e.g. for JSON"""
+        return {key: self[key] for key in self}
@@ -0,0 +1,126 @@
+from collections import deque
+import unicodedata
+
+# Job fields scanned for subscription keywords
+MATCH_FIELDS = ('title', 'company', 'description')
+
+def normalize_keyword(text):
+    """Normalize keywords and scanned text alike: width and case"""
+    return unicodedata.normalize('NFKC', text or '').lower().strip()
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton finding all of many keywords in one pass over a text"""
+
+    def __init__(self, keywords):
+        # Node 0 is the root; goto holds the trie edges of each node
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+
+        for index, keyword in enumerate(keywords):
+            node = 0
+            for char in keyword:
+                child = self.goto[node].get(char)
+                if child is None:
+                    child = len(self.goto)
+                    self.goto[node][char] = child
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                node = child
+            self.output[node] += (index,)
+
+        # Breadth-first, so fail targets are complete before they are used
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                target = self.fail[node]
+                while target and char not in self.goto[target]:
+                    target = self.fail[target]
+                self.fail[child] = self.goto[target].get(char, 0)
+                self.output[child] += self.output[self.fail[child]]
+
+    def search(self, text):
+        """Return indexes of all keywords occurring in text"""
+        found = set()
+        node = 0
+        for char in text:
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            if self.output[node]:
+                found.update(self.output[node])
+        return found
+
+class SubscriptionMatcher:
+    """
+    Match jobs against many keyword subscriptions at once
+
+    Every include and exclude keyword of every subscription goes into one
+    automaton, so the cost per job depends on its text length and the
+    subscriptions it hits, not on the number of subscriptions.
+    """
+
+    def __init__(self, subscriptions):
+        """
+        Args:
+            subscriptions: Dicts with name, keywords, exclude and schools;
+                empty keywords match every job, empty schools every school
+        """
+        self.names = []
+        self.schools = []
+        self.catch_all = []
+        keywords = {}
+        includes = []
+        excludes = []
+
+        for index, subscription in enumerate(subscriptions):
+            self.names.append(subscription['name'])
+            self.schools.append(frozenset(subscription.get('schools') or ()))
+            has_keyword = False
+            for field, targets in (('keywords', includes), ('exclude', excludes)):
+                for keyword in subscription.get(field) or ():
+                    keyword = normalize_keyword(keyword)
+                    if not keyword:
+                        continue
+                    if keyword not in keywords:
+                        keywords[keyword] = len(keywords)
+                        includes.append([])
+                        excludes.append([])
+                    targets[keywords[keyword]].append(index)
+                    has_keyword = has_keyword or field == 'keywords'
+            if not has_keyword:
+                self.catch_all.append(index)
+
+        self.includes = includes
+        self.excludes = excludes
+        self.automaton = KeywordAutomaton(keywords)
+
+    def __len__(self):
+        return len(self.names)
+
+    def match(self, job, school_code):
+        """
+        Return names of subscriptions a job belongs to
+
+        Args:
+            job: Job dict
+            school_code: School the job was crawled from
+
+        Returns:
+            list: Subscription names
+        """
+        # Fields are joined with a newline, which no keyword contains
+        text = '\n'.join(normalize_keyword(job.get(field)) for field in MATCH_FIELDS)
+        hits = set(self.catch_all)
+        excluded = set()
+        for keyword in self.automaton.search(text):
+            hits.update(self.includes[keyword])
+            excluded.update(self.excludes[keyword])
+
+        return [
+            self.names[index] for index in sorted(hits - excluded)
+            if not self.schools[index] or school_code in self.schools[index]
+        ]
@@ -0,0 +1,107 @@
+from collections import deque
+from pathlib import Path
+import atexit
+import json
+import math
+import os
+import threading
+import time
+
+# Rolling latency samples per upstream host, kept across crawler runs
+LATENCY_PATH = Path('data/cache/latency.json')
+
+# Samples kept per host and needed before timeouts adapt
+WINDOW = 200
+MIN_SAMPLES = 20
+
+# Timeouts in seconds used until a host has enough samples
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 30
+
+# Timeouts are p99 latency times a factor, clamped to [floor, ceiling]
+CONNECT_FACTOR = 2
+CONNECT_FLOOR = 3
+CONNECT_CEILING = 10
+READ_FACTOR = 3
+READ_FLOOR = 5
+READ_CEILING = 60
+
+# Seconds between writes of the samples file
+SAVE_INTERVAL = 30
+
+class HostLatency:
+    """Rolling window of response latencies of one host"""
+
+    def __init__(self, samples=()):
+        self.samples = deque(samples, maxlen=WINDOW)
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(round(seconds, 3))
+
+    def percentile(self, p):
+        """Return the p-th percentile in seconds, None with too few samples"""
+        with self.lock:
+            if len(self.samples) < MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+    def timeouts(self):
+        """Return (connect, read) timeouts for requests"""
+        p99 = self.percentile(99)
+        if p99 is None:
+            return DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+        return (
+            min(max(p99 * CONNECT_FACTOR, CONNECT_FLOOR), CONNECT_CEILING),
+            min(max(p99 * READ_FACTOR, READ_FLOOR), READ_CEILING)
+        )
+
+_hosts = {}
+_hosts_lock = threading.Lock()
+_last_save = [time.monotonic()]
+
+def _load():
+    try:
+        with open(LATENCY_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_latencies():
+    """Persist samples of all hosts seen by this process"""
+    with _hosts_lock:
+        if not _hosts:
+            return
+        saved = _load()
+        for host, latency in _hosts.items():
+            with latency.lock:
+                saved[host] = list(latency.samples)
+        _last_save[0] = time.monotonic()
+
+    try:
+        LATENCY_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = LATENCY_PATH.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(saved, f)
+        os.replace(tmp_path, LATENCY_PATH)
+    except OSError:
+        pass
+
+atexit.register(save_latencies)
+
+def get_host_latency(host):
+    """Return latency tracker of host, seeded with samples of earlier runs"""
+    with _hosts_lock:
+        latency = _hosts.get(host)
+        if latency is None:
+            latency = HostLatency(_load().get(host, ()))
+            _hosts[host] = latency
+        return latency
+
+def record_latency(host, seconds):
+    """Record a response latency and persist samples every SAVE_INTERVAL seconds"""
+    get_host_latency(host).record(seconds)
+    if time.monotonic() - _last_save[0] > SAVE_INTERVAL:
+        save_latencies()
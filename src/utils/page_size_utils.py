@@ -0,0 +1,97 @@
+from pathlib import Path
+import json
+import os
+import time
+from utils.log_utils import get_logger
+
+# Negotiated page sizes per school, shared by normal and backfill crawls
+PAGE_SIZE_PATH = Path('data/cache/page_sizes.json')
+
+# Largest page size ever requested from an upstream
+MAX_PAGE_SIZE = 100
+
+# Re-probe after this many seconds in case the upstream raised its limit
+PROBE_INTERVAL = 7 * 24 * 3600
+
+def _load_page_sizes():
+    try:
+        with open(PAGE_SIZE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_page_size(school_code, page_size):
+    """Persist negotiated page size for school"""
+    page_sizes = _load_page_sizes()
+    page_sizes[school_code] = {'size': page_size, 'probed_at': time.time()}
+
+    PAGE_SIZE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = PAGE_SIZE_PATH.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(page_sizes, f, indent=2)
+    os.replace(tmp_path, PAGE_SIZE_PATH)
+
+def get_page_size(school_code, default):
+    """Return negotiated page size for school, default if never probed"""
+    entry = _load_page_sizes().get(school_code)
+    return entry['size'] if entry else default
+
+def negotiate_page_size(school_code, default, fetch_job_page, parse_job_list):
+    """
+    Find the largest page size the upstream honors
+
+    Requests the first page with MAX_PAGE_SIZE items and takes the number of
+    items actually returned as the honored size. The result is persisted and
+    reused until PROBE_INTERVAL has passed.
+
+    Args:
+        school_code: School code, e.g. 'fudan'
+        default: Page size used when probing fails
+        fetch_job_page: Function (page, page_size) returning raw page content
+        parse_job_list: Function turning raw page content into a job list
+
+    Returns:
+        int: Page size to use
+    """
+    logger = get_logger(__name__)
+
+    entry = _load_page_sizes().get(school_code)
+    if entry and time.time() - entry.get('probed_at', 0) < PROBE_INTERVAL:
+        return entry['size']
+
+    logger.info(f"Probing page size for {school_code} with {MAX_PAGE_SIZE} items")
+    content = fetch_job_page(1, MAX_PAGE_SIZE)
+    if not content:
+        logger.warning(f"Page size probe failed for {school_code}, using {default}")
+        return entry['size'] if entry else default
+
+    count = len(parse_job_list(content))
+    # Fewer items than the default means the probe told us nothing useful
+    page_size = count if count >= default else default
+    _save_page_size(school_code, page_size)
+    logger.info(f"Negotiated page size for {school_code}: {page_size}")
+    return page_size
+
+def check_page_size(school_code, page_size, count, has_more, default):
+    """
+    Detect upstream capping during a crawl
+
+    Args:
+        school_code: School code
+        page_size: Page size requested
+        count: Number of items returned
+        has_more: Whether the upstream reports more items after this page
+        default: Fallback page size
+
+    Returns:
+        int: Page size to use for the following requests
+    """
+    if count >= page_size or not has_more or page_size <= default:
+        return page_size
+
+    logger = get_logger(__name__)
+    new_size = count if count >= default else default
+    logger.warning(f"Upstream for {school_code} capped page size {page_size} to {count}, "
+                   f"falling back to {new_size}")
+    _save_page_size(school_code, new_size)
+    return new_size
@@ -0,0 +1,156 @@
+from pathlib import Path
+import os
+from utils.format_utils import render_jobs_to_xml
+from utils.school_utils import get_categories
+from utils.store_utils import count_feed_entries, load_category_jobs, load_feed_entries
+
+# Items per feed page, both for the subscription document and archives
+ARCHIVE_PAGE_SIZE = 50
+
+# Sealed archive documents, rendered once and never rewritten
+ARCHIVE_DIR = Path('data/xml/archive')
+
+# Render items with a description summary linking to /item/<school>/<seq>
+# instead of the full text
+COMPACT_FEEDS = os.environ.get('COMPACT_FEEDS', '') == '1'
+
+# Seconds item pages may be cached, edits are picked up through the ETag after that
+ITEM_MAX_AGE = 3600
+
+def feed_url(base_url, school_code):
+    return f"{base_url}/rss/{school_code}"
+
+def category_url(base_url, school_code, category):
+    return f"{base_url}/rss/{school_code}/category/{category}"
+
+def archive_url(base_url, school_code, index):
+    return f"{base_url}/rss/{school_code}/archive/{index}"
+
+def item_url(base_url, school_code, seq):
+    return f"{base_url}/item/{school_code}/{seq}"
+
+def item_etag(job):
+    """Entity tag of an item page, changes with the job's version"""
+    return f"{job['seq']}-{job.get('version') or 1}"
+
+def item_url_function(base_url):
+    """Return item_url argument of render_jobs_to_xml, None unless feeds are compact"""
+    if not COMPACT_FEEDS:
+        return None
+    return lambda job: item_url(base_url, job['school'], job['seq'])
+
+def sealed_archive_count(school_code):
+    """Number of full, immutable archive pages of a school"""
+    return count_feed_entries(school_code) // ARCHIVE_PAGE_SIZE
+
+def render_subscription_page(school_code, school_name, base_url):
+    """
+    Render the RFC 5005 subscription document with the newest items
+
+    Args:
+        school_code: School code
+        school_name: School name for channel metadata
+        base_url: Absolute URL prefix of the RSS server
+
+    Returns:
+        str: RSS document, None if the school has no stored items
+    """
+    total = count_feed_entries(school_code)
+    if not total:
+        return None
+
+    jobs = load_feed_entries(school_code, max(0, total - ARCHIVE_PAGE_SIZE), total)
+    links = [('self', feed_url(base_url, school_code))]
+    sealed = total // ARCHIVE_PAGE_SIZE
+    if sealed:
+        links.append(('prev-archive', archive_url(base_url, school_code, sealed - 1)))
+
+    return render_jobs_to_xml(jobs, school_name, links=links, item_url=item_url_function(base_url))
+
+def render_category_feed(school_code, school_name, category, base_url, limit=ARCHIVE_PAGE_SIZE):
+    """
+    Render the feed of one listing category of a school
+
+    Args:
+        school_code: School code
+        school_name: School name for channel metadata
+        category: Upstream category value, see school_utils.get_categories
+        base_url: Absolute URL prefix of the RSS server
+        limit: Maximum number of items
+
+    Returns:
+        str: RSS document, None if the school doesn't crawl that category
+    """
+    categories = get_categories(school_code)
+    if category not in categories:
+        return None
+
+    # Jobs stored before categories were recorded came from the first one
+    jobs = load_category_jobs(school_code, category, limit,
+                              include_uncategorized=category == next(iter(categories)))
+    links = [('self', category_url(base_url, school_code, category))]
+    return render_jobs_to_xml(jobs, f"{school_name}（{categories[category]}）", links=links,
+                              item_url=item_url_function(base_url))
+
+def render_archive_page(school_code, school_name, index, base_url):
+    """
+    Render a sealed archive document
+
+    Args:
+        school_code: School code
+        school_name: School name for channel metadata
+        index: Archive index, 0 holds the oldest items
+        base_url: Absolute URL prefix of the RSS server
+
+    Returns:
+        str: RSS document, None if the archive is not sealed yet
+    """
+    if index < 0 or index >= sealed_archive_count(school_code):
+        return None
+
+    start = index * ARCHIVE_PAGE_SIZE
+    jobs = load_feed_entries(school_code, start, start + ARCHIVE_PAGE_SIZE)
+    # No next-archive link: it would change once the next page is sealed
+    links = [
+        ('self', archive_url(base_url, school_code, index)),
+        ('current', feed_url(base_url, school_code))
+    ]
+    if index > 0:
+        links.append(('prev-archive', archive_url(base_url, school_code, index - 1)))
+
+    return render_jobs_to_xml(jobs, school_name, links=links, archive=True,
+                              item_url=item_url_function(base_url))
+
+def get_archive_path(school_code, school_name, index, base_url):
+    """
+    Return path of a sealed archive document, rendering it on first use
+
+    The file is shared by all later requests, so base_url must be the
+    configured FEED_BASE_URL: a URL taken from the request's Host header
+    would be baked into every copy served afterwards.
+
+    Args:
+        school_code: School code
+        school_name: School name for channel metadata
+        index: Archive index, 0 holds the oldest items
+        base_url: Configured absolute URL prefix of the RSS server
+
+    Returns:
+        Path: Archive file, None if the archive is not sealed yet
+    """
+    # Compact and full archives are kept apart so switching modes needs no cleanup
+    suffix = '.compact.xml' if COMPACT_FEEDS else '.xml'
+    archive_path = ARCHIVE_DIR / school_code / f'{index}{suffix}'
+    if archive_path.exists():
+        return archive_path
+
+    xml = render_archive_page(school_code, school_name, index, base_url)
+    if xml is None:
+        return None
+
+    archive_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = archive_path.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(xml)
+    os.replace(tmp_path, archive_path)
+    return archive_path
@@ -0,0 +1,244 @@
+from pathlib import Path
+import os
+import sqlite3
+import time
+
+# Crawl task queue shared by all workers. Workers on other machines need the
+# file on a shared filesystem with working POSIX locks.
+QUEUE_PATH = Path(os.environ.get('CRAWL_QUEUE_PATH', 'data/queue.db'))
+
+# Seconds a claimed task stays leased without a heartbeat
+LEASE_SECONDS = 120
+
+# Minimum seconds between the end of one task's fetch and the next request
+# to the same upstream host, across all workers
+HOST_DELAY = 2.0
+
+# Attempts before a task is given up
+MAX_ATTEMPTS = 3
+
+# Seconds before a failed task is retried, multiplied by its attempts
+RETRY_DELAY = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    school TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    page_size INTEGER,
+    category TEXT,
+    host TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, not_before);
+CREATE TABLE IF NOT EXISTS hosts (
+    host TEXT PRIMARY KEY,
+    next_allowed REAL NOT NULL
+);
+"""
+
+# Columns added after the first release, created on queues that lack them
+MIGRATIONS = [
+    ('tasks', 'category', 'TEXT')
+]
+
+def get_connection(queue_path=None):
+    """Open the task queue, creating the schema if needed"""
+    queue_path = Path(queue_path or QUEUE_PATH)
+    queue_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Autocommit mode, transactions are opened explicitly with BEGIN IMMEDIATE
+    conn = sqlite3.connect(queue_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(SCHEMA)
+    _migrate(conn)
+    return conn
+
+def _migrate(conn):
+    """Add columns missing from queues created by older versions"""
+    columns = {}
+    for table, column, definition in MIGRATIONS:
+        if table not in columns:
+            columns[table] = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if column not in columns[table]:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+            columns[table].add(column)
+
+def enqueue_tasks(school_code, host, pages, page_size=None, category=None, queue_path=None):
+    """
+    Queue page tasks of a school, skipping pages already queued or leased
+
+    Args:
+        school_code: School code
+        host: Upstream host the pages are fetched from
+        pages: Page numbers, 1-based
+        page_size: Page size to request, None for sites with a fixed size
+        category: Listing category of the pages, None for sites without categories
+        queue_path: Optional queue path
+
+    Returns:
+        int: Number of tasks added
+    """
+    conn = get_connection(queue_path)
+    try:
+        now = time.time()
+        added = 0
+        conn.execute('BEGIN IMMEDIATE')
+        for page in pages:
+            cursor = conn.execute(
+                """INSERT INTO tasks (school, page, page_size, category, host, created_at, updated_at)
+                   SELECT ?, ?, ?, ?, ?, ?, ? WHERE NOT EXISTS (
+                       SELECT 1 FROM tasks WHERE school = ? AND category IS ? AND page = ?
+                       AND status IN ('queued', 'leased'))""",
+                (school_code, page, page_size, category, host, now, now, school_code, category, page)
+            )
+            added += cursor.rowcount
+        conn.execute('COMMIT')
+        return added
+    finally:
+        conn.close()
+
+def _requeue_expired(conn, now):
+    """Return tasks whose lease ran out to the queue, or fail them after MAX_ATTEMPTS"""
+    conn.execute(
+        """UPDATE tasks SET
+               status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+               error = COALESCE(error, 'lease expired'),
+               lease_owner = NULL, lease_expires = NULL, updated_at = ?
+           WHERE status = 'leased' AND lease_expires < ?""",
+        (MAX_ATTEMPTS, now, now)
+    )
+
+def claim_task(worker_id, lease_seconds=LEASE_SECONDS, queue_path=None):
+    """
+    Lease the next task whose upstream host may be contacted now
+
+    Claiming reserves the host for as long as the lease, including the
+    fetch's own retries, until release_host() frees it HOST_DELAY seconds
+    after the fetch ended. Politeness holds no matter how many workers
+    share the queue, and a crashed worker's host frees up with its lease.
+
+    Args:
+        worker_id: Unique ID of the claiming worker
+        lease_seconds: Lease duration, extend it with heartbeat()
+        queue_path: Optional queue path
+
+    Returns:
+        dict: Leased task, None if no task is ready
+    """
+    conn = get_connection(queue_path)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        now = time.time()
+        _requeue_expired(conn, now)
+        row = conn.execute(
+            """SELECT t.* FROM tasks t LEFT JOIN hosts h ON h.host = t.host
+               WHERE t.status = 'queued' AND t.not_before <= ?
+               AND COALESCE(h.next_allowed, 0) <= ?
+               ORDER BY t.page, t.task_id LIMIT 1""",
+            (now, now)
+        ).fetchone()
+        if row is None:
+            conn.execute('COMMIT')
+            return None
+
+        conn.execute(
+            """UPDATE tasks SET status = 'leased', lease_owner = ?, lease_expires = ?,
+                   attempts = attempts + 1, updated_at = ?
+               WHERE task_id = ?""",
+            (worker_id, now + lease_seconds, now, row['task_id'])
+        )
+        conn.execute(
+            'INSERT OR REPLACE INTO hosts (host, next_allowed) VALUES (?, ?)',
+            (row['host'], now + lease_seconds)
+        )
+        conn.execute('COMMIT')
+
+        task = dict(row)
+        task['attempts'] += 1
+        return task
+    finally:
+        conn.close()
+
+def heartbeat(task_id, worker_id, lease_seconds=LEASE_SECONDS, queue_path=None):
+    """Extend a lease and its host reservation, False if the worker no longer holds it"""
+    conn = get_connection(queue_path)
+    try:
+        expires = time.time() + lease_seconds
+        conn.execute('BEGIN IMMEDIATE')
+        cursor = conn.execute(
+            """UPDATE tasks SET lease_expires = ?, updated_at = ?
+               WHERE task_id = ? AND lease_owner = ? AND status = 'leased'""",
+            (expires, time.time(), task_id, worker_id)
+        )
+        if cursor.rowcount:
+            conn.execute(
+                """UPDATE hosts SET next_allowed = MAX(next_allowed, ?)
+                   WHERE host = (SELECT host FROM tasks WHERE task_id = ?)""",
+                (expires, task_id)
+            )
+        conn.execute('COMMIT')
+        return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+def release_host(host, queue_path=None):
+    """Let the next request to a host start HOST_DELAY seconds from now"""
+    conn = get_connection(queue_path)
+    try:
+        conn.execute('UPDATE hosts SET next_allowed = ? WHERE host = ?', (time.time() + HOST_DELAY, host))
+    finally:
+        conn.close()
+
+def complete_task(task_id, worker_id, queue_path=None):
+    """Mark a leased task done, False if the lease was lost in the meantime"""
+    conn = get_connection(queue_path)
+    try:
+        cursor = conn.execute(
+            """UPDATE tasks SET status = 'done', lease_owner = NULL, lease_expires = NULL,
+                   error = NULL, updated_at = ?
+               WHERE task_id = ? AND lease_owner = ? AND status = 'leased'""",
+            (time.time(), task_id, worker_id)
+        )
+        return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+def fail_task(task_id, worker_id, error, queue_path=None):
+    """Requeue a leased task with backoff, or fail it after MAX_ATTEMPTS"""
+    conn = get_connection(queue_path)
+    try:
+        now = time.time()
+        cursor = conn.execute(
+            """UPDATE tasks SET
+                   status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                   not_before = ? + attempts * ?, error = ?,
+                   lease_owner = NULL, lease_expires = NULL, updated_at = ?
+               WHERE task_id = ? AND lease_owner = ? AND status = 'leased'""",
+            (MAX_ATTEMPTS, now, RETRY_DELAY, str(error), now, task_id, worker_id)
+        )
+        return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+def queue_stats(queue_path=None):
+    """Return number of tasks per status"""
+    conn = get_connection(queue_path)
+    try:
+        rows = conn.execute('SELECT status, COUNT(*) AS count FROM tasks GROUP BY status')
+        return {row['status']: row['count'] for row in rows}
+    finally:
+        conn.close()
+
+def pending_count(queue_path=None):
+    """Return number of tasks that are queued or leased"""
+    stats = queue_stats(queue_path)
+    return stats.get('queued', 0) + stats.get('leased', 0)
@@ -0,0 +1,35 @@
+import threading
+import time
+
+# Requests per second of regular crawls to one host, shared by all
+# categories of a school
+CRAWL_RATE = 0.5
+
+class RateLimiter:
+    """Spaces request starts at least 1 / rate seconds apart across threads"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until the next request may start"""
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(host, rate):
+    """Return the process-wide limiter of a host, created with rate on first use"""
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = RateLimiter(rate)
+            _limiters[host] = limiter
+        return limiter
@@ -1,8 +1,330 @@
 import requests
 import time
+import json
+import os
+import hashlib
+import codecs
+import re
+import threading
+from bs4 import BeautifulSoup
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
 from utils.log_utils import get_logger
+from utils.latency_utils import get_host_latency, record_latency
 
-def fetch_page(url, max_retries=3, retry_delay=5):
+# On-disk response cache shared by every crawler process
+CACHE_DIR = Path('data/cache/http')
+CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# Default seconds crawlers serve a fetched listing page from the cache:
+# enough to absorb feed requests and cron runs fetching the same pages
+# within minutes of each other, short enough to pick up new postings on
+# the next scheduled crawl
+CACHE_TTL = 300
+
+# Send one duplicate request when a response takes longer than the host's p95
+HEDGE_REQUESTS = os.environ.get('HEDGE_REQUESTS', '') == '1'
+
+_hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='hedge')
+
+# Keep-alive connections per host, enough for detail fetches, backfill
+# workers and hedges running at once
+POOL_SIZE = 16
+
+# Charset parameter of a Content-Type header
+CHARSET_PATTERN = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+
+# Requests sent and fetch outcomes per host, for run reports
+_request_counts = {}
+_counts_lock = threading.Lock()
+
+def _count(url, key):
+    host = urlsplit(url).netloc
+    with _counts_lock:
+        _request_counts.setdefault(host, Counter())[key] += 1
+
+def get_request_counts(host):
+    """
+    Return request counters of a host since the process started
+
+    Returns:
+        dict: 'requests' sent, including hedges and retries, and fetches
+            that succeeded ('fetched'), came from the cache ('cache_hits')
+            or were given up after all retries ('failures')
+    """
+    with _counts_lock:
+        counts = _request_counts.get(host, Counter())
+        return {key: counts[key] for key in ('requests', 'fetched', 'cache_hits', 'failures')}
+
+class RawContent(bytes):
+    """
+    Undecoded response body with the encoding it should be read with
+
+    encoding is the charset configured for the school, else the one the
+    upstream declared, None if neither is known. Parsers decode while they
+    read, see parse_json and parse_html.
+    """
+
+    def __new__(cls, body, encoding=None):
+        content = super().__new__(cls, body)
+        content.encoding = encoding
+        return content
+
+    def __reduce__(self):
+        return RawContent, (bytes(self), self.encoding)
+
+def declared_encoding(response):
+    """Return charset declared in the Content-Type header, None if there is none"""
+    match = CHARSET_PATTERN.search(response.headers.get('content-type', ''))
+    return match.group(1) if match else None
+
+def _is_utf(encoding):
+    try:
+        return codecs.lookup(encoding).name.startswith('utf')
+    except LookupError:
+        return False
+
+def parse_json(content):
+    """
+    Parse JSON from fetched text or RawContent
+
+    UTF bodies go to json.loads as bytes, which detects UTF-8/16/32 from
+    the first bytes, so only bodies in other encodings are decoded here.
+    """
+    encoding = getattr(content, 'encoding', None)
+    if isinstance(content, bytes) and encoding and not _is_utf(encoding):
+        content = content.decode(encoding, errors='replace')
+    return json.loads(content)
+
+def parse_html(content, features='html.parser'):
+    """
+    Parse HTML from fetched text or RawContent
+
+    A known encoding is handed to BeautifulSoup, which then skips sniffing
+    <meta> declarations and guessing the charset.
+    """
+    return BeautifulSoup(content, features, from_encoding=getattr(content, 'encoding', None))
+
+def _cache_key(method, url, data=None):
+    """Build cache key from request method, URL and POST body"""
+    if isinstance(data, dict):
+        body = urlencode(sorted(data.items()))
+    else:
+        body = data or ''
+    raw = f"{method.upper()}\n{url}\n{body}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def _cache_get(key, ttl):
+    """
+    Return cached response text if it is younger than ttl seconds
+
+    Args:
+        key: Cache key
+        ttl: Time to live in seconds
+
+    Returns:
+        str: Cached content if fresh, None otherwise
+    """
+    path = CACHE_DIR / f'{key}.json'
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if time.time() - entry.get('stored_at', 0) > ttl:
+        return None
+
+    # Touch the file so eviction treats it as recently used
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+    return entry.get('text')
+
+def _cache_set(key, text):
+    """Store response text in cache and evict least recently used entries"""
+    logger = get_logger(__name__)
+
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        path = CACHE_DIR / f'{key}.json'
+        tmp_path = CACHE_DIR / f'{key}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'stored_at': time.time(), 'text': text}, f, ensure_ascii=False)
+        # Atomic replace so concurrent readers never see partial entries
+        os.replace(tmp_path, path)
+        _evict_cache()
+    except OSError as e:
+        logger.warning(f"Failed to write response cache: {str(e)}")
+
+def _raw_cache_get(key, ttl):
+    """
+    Return cached raw response if it is younger than ttl seconds
+
+    Raw entries are a JSON header line followed by the undecoded body.
+
+    Returns:
+        RawContent: Cached content if fresh, None otherwise
+    """
+    path = CACHE_DIR / f'{key}.raw'
+    try:
+        with open(path, 'rb') as f:
+            entry = json.loads(f.readline())
+            if time.time() - entry.get('stored_at', 0) > ttl:
+                return None
+            body = f.read()
+    except (OSError, ValueError):
+        return None
+
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+    return RawContent(body, entry.get('encoding'))
+
+def _raw_cache_set(key, content):
+    """Store raw response in cache and evict least recently used entries"""
+    logger = get_logger(__name__)
+
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        path = CACHE_DIR / f'{key}.raw'
+        tmp_path = CACHE_DIR / f'{key}.{os.getpid()}.tmp'
+        header = json.dumps({'stored_at': time.time(), 'encoding': content.encoding})
+        with open(tmp_path, 'wb') as f:
+            f.write(header.encode('utf-8') + b'\n')
+            f.write(content)
+        os.replace(tmp_path, path)
+        _evict_cache()
+    except OSError as e:
+        logger.warning(f"Failed to write response cache: {str(e)}")
+
+def _evict_cache(max_bytes=None):
+    """Remove least recently used cache entries until total size fits max_bytes"""
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    entries = []
+    total = 0
+    for path in [*CACHE_DIR.glob('*.json'), *CACHE_DIR.glob('*.raw')]:
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    if total <= max_bytes:
+        return
+
+    # Oldest access time first
+    entries.sort()
+    for _, size, path in entries:
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        total -= size
+        if total <= max_bytes:
+            break
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def _get_session(host):
+    """Return the process-wide session of a host, reusing its connections"""
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[host] = session
+        return session
+
+def _timed_request(method, url, **kwargs):
+    """Send a request over the host's pooled session and record its latency"""
+    host = urlsplit(url).netloc
+    _count(url, 'requests')
+    start = time.monotonic()
+    try:
+        response = _get_session(host).request(method, url, **kwargs)
+    except requests.Timeout:
+        # Count timeouts at the limit so slow hosts get longer timeouts
+        record_latency(host, time.monotonic() - start)
+        raise
+    record_latency(host, response.elapsed.total_seconds())
+    return response
+
+def _request(method, url, **kwargs):
+    """
+    Send a request with timeouts derived from the host's latency history
+
+    With HEDGE_REQUESTS enabled, a second identical request is sent once the
+    first has been pending longer than the host's p95 latency, and whichever
+    succeeds first wins. An error status only wins if the other attempt
+    fails as well.
+
+    Returns:
+        requests.Response: Response of the first successful attempt, else
+            the error response of the last one
+    """
+    logger = get_logger(__name__)
+
+    latency = get_host_latency(urlsplit(url).netloc)
+    kwargs['timeout'] = latency.timeouts()
+
+    hedge_after = latency.percentile(95) if HEDGE_REQUESTS else None
+    if hedge_after is None:
+        return _timed_request(method, url, **kwargs)
+
+    primary = _hedge_pool.submit(_timed_request, method, url, **kwargs)
+    try:
+        return primary.result(timeout=hedge_after)
+    except FutureTimeoutError:
+        pass
+
+    logger.info(f"Hedging request to {url} after {hedge_after:.2f}s")
+    pending = {primary, _hedge_pool.submit(_timed_request, method, url, **kwargs)}
+    error = None
+    failed_response = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                response = future.result()
+            except requests.RequestException as e:
+                error = e
+                continue
+            # A fast 5xx must not beat a slower success
+            if response.ok:
+                return response
+            failed_response = response
+    if failed_response is not None:
+        return failed_response
+    raise error
+
+def _response_content(response, cache_key, raw, encoding):
+    """Return body of a response as text or RawContent, caching it under cache_key"""
+    if raw:
+        content = RawContent(response.content, encoding or declared_encoding(response))
+        if cache_key:
+            _raw_cache_set(cache_key, content)
+        return content
+
+    if encoding:
+        response.encoding = encoding
+    if cache_key:
+        _cache_set(cache_key, response.text)
+    return response.text
+
+def fetch_page(url, max_retries=3, retry_delay=5, cache_ttl=0, raw=False, encoding=None):
     """
     Fetch HTML content from given URL with retry mechanism
     
@@ -10,12 +332,25 @@ def fetch_page(url, max_retries=3, retry_delay=5):
         url: Target URL
         max_retries: Maximum number of retry attempts
         retry_delay: Delay between retries in seconds
+        cache_ttl: Serve responses from the on-disk cache if younger than
+            this many seconds, 0 disables caching
+        raw: Return the undecoded body as RawContent instead of text
+        encoding: Known encoding of the upstream, overrides the declared
+            charset and skips charset detection
     
     Returns:
-        str: HTML content if successful, None if failed
+        str: HTML content if successful (RawContent if raw), None if failed
     """
     logger = get_logger(__name__)
     
+    if cache_ttl:
+        cache_key = _cache_key('GET', url)
+        cached = _raw_cache_get(cache_key, cache_ttl) if raw else _cache_get(cache_key, cache_ttl)
+        if cached is not None:
+            logger.info(f"Cache hit for URL: {url}")
+            _count(url, 'cache_hits')
+            return cached
+    
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     }
@@ -23,7 +358,7 @@ def fetch_page(url, max_retries=3, retry_delay=5):
     for attempt in range(max_retries):
         try:
             logger.info(f"Fetching URL: {url} (Attempt {attempt + 1}/{max_retries})")
-            response = requests.get(url, headers=headers, timeout=30)
+            response = _request('GET', url, headers=headers)
             response.raise_for_status()
             
             # Check if response is HTML
@@ -31,7 +366,8 @@ def fetch_page(url, max_retries=3, retry_delay=5):
             if 'text/html' not in content_type.lower():
                 logger.warning(f"Unexpected content type: {content_type}")
             
-            return response.text
+            _count(url, 'fetched')
+            return _response_content(response, cache_key if cache_ttl else None, raw, encoding)
             
         except requests.RequestException as e:
             logger.error(f"Error fetching URL: {url}")
@@ -42,11 +378,13 @@ def fetch_page(url, max_retries=3, retry_delay=5):
                 time.sleep(retry_delay)
             else:
                 logger.error("Max retries reached. Giving up.")
+                _count(url, 'failures')
                 return None
     
     return None 
 
-def fetch_page_post(url, headers=None, data=None, max_retries=3, retry_delay=5):
+def fetch_page_post(url, headers=None, data=None, max_retries=3, retry_delay=5, cache_ttl=0,
+                    raw=False, encoding=None):
     """
     Fetch content from given URL using POST request with retry mechanism
     
@@ -56,19 +394,33 @@ def fetch_page_post(url, headers=None, data=None, max_retries=3, retry_delay=5):
         data: POST data
         max_retries: Maximum number of retry attempts
         retry_delay: Delay between retries in seconds
+        cache_ttl: Serve responses from the on-disk cache if younger than
+            this many seconds, 0 disables caching
+        raw: Return the undecoded body as RawContent instead of text
+        encoding: Known encoding of the upstream, overrides the declared
+            charset and skips charset detection
     
     Returns:
-        str: Response content if successful, None if failed
+        str: Response content if successful (RawContent if raw), None if failed
     """
     logger = get_logger(__name__)
     
+    if cache_ttl:
+        cache_key = _cache_key('POST', url, data)
+        cached = _raw_cache_get(cache_key, cache_ttl) if raw else _cache_get(cache_key, cache_ttl)
+        if cached is not None:
+            logger.info(f"Cache hit for URL: {url}")
+            _count(url, 'cache_hits')
+            return cached
+    
     for attempt in range(max_retries):
         try:
             logger.info(f"Posting to URL: {url} (Attempt {attempt + 1}/{max_retries})")
-            response = requests.post(url, headers=headers, data=data, timeout=30)
+            response = _request('POST', url, headers=headers, data=data)
             response.raise_for_status()
             
-            return response.text
+            _count(url, 'fetched')
+            return _response_content(response, cache_key if cache_ttl else None, raw, encoding)
             
         except requests.RequestException as e:
             logger.error(f"Error posting to URL: {url}")
@@ -79,6 +431,7 @@ def fetch_page_post(url, headers=None, data=None, max_retries=3, retry_delay=5):
                 time.sleep(retry_delay)
             else:
                 logger.error("Max retries reached. Giving up.")
+                _count(url, 'failures')
                 return None
     
     return None 
\ No newline at end of file
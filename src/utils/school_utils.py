@@ -0,0 +1,81 @@
+import importlib
+import os
+import threading
+import time
+from utils.log_utils import get_logger
+
+# School code mapping, crawler modules are importable with src/ on sys.path
+SCHOOL_CODES = {
+    'fudan': {'module': 'fudan_job_crawl', 'name': '复旦大学'},
+    'sjtu': {'module': 'sjtu_job_crawl', 'name': '上海交通大学'},
+    'tongji': {'module': 'tongji_job_crawl', 'name': '同济大学'},
+    'hust': {'module': 'hust_job_crawl', 'name': '华中科技大学'},
+    'nankai': {'module': 'nankai_job_crawl', 'name': '南开大学'},
+    'dlut': {'module': 'dlut_job_crawl', 'name': '大连理工大学'}
+}
+
+# Listing categories of schools whose upstream filters by one, upstream
+# parameter value to label. Override with <SCHOOL>_CATEGORIES, e.g.
+# FUDAN_CATEGORIES='1:招聘信息,<value>:<label>'
+DEFAULT_CATEGORIES = {
+    'fudan': {'1': '招聘信息'},
+    'tongji': {'1012': '招聘信息'},
+    'hust': {'2': '招聘信息'},
+    'dlut': {'08': '招聘信息'}
+}
+
+def get_categories(school_code):
+    """
+    Return listing categories crawled for a school, in crawl order
+
+    The first category also owns jobs stored before categories were
+    recorded and those stored by backfills, which don't pass one.
+
+    Returns:
+        dict: Upstream category value to label, empty if the school has none
+    """
+    value = os.environ.get(f'{school_code.upper()}_CATEGORIES')
+    if not value:
+        return dict(DEFAULT_CATEGORIES.get(school_code, {}))
+    categories = {}
+    for entry in value.split(','):
+        category, _, label = entry.strip().partition(':')
+        if category:
+            categories[category] = label or category
+    return categories or dict(DEFAULT_CATEGORIES.get(school_code, {}))
+
+def run_crawler(school_code):
+    """Run the crawler for specified school"""
+    logger = get_logger(__name__)
+    # Kept on the thread, the servers import this module under two names
+    thread = threading.current_thread()
+    thread.crawl = {'school': school_code, 'started_at': time.time()}
+    try:
+        # Import crawler module dynamically
+        module = importlib.import_module(SCHOOL_CODES[school_code]['module'])
+        # Run crawler
+        module.main()
+        return True
+    except Exception as e:
+        logger.error(f"Error running crawler for {school_code}: {str(e)}")
+        return False
+    finally:
+        thread.crawl = None
+
+def crawl_state():
+    """
+    Return crawls running in this process by school
+
+    Returns:
+        dict: School code to list of {'thread', 'thread_name', 'started_at'}
+    """
+    state = {code: [] for code in SCHOOL_CODES}
+    for thread in threading.enumerate():
+        crawl = getattr(thread, 'crawl', None)
+        if crawl:
+            state[crawl['school']].append({
+                'thread': thread.ident,
+                'thread_name': thread.name,
+                'started_at': crawl['started_at']
+            })
+    return state
@@ -0,0 +1,360 @@
+"""Deduplicated archive of daily feed snapshots
+
+Dated snapshots of a school's feed repeat most of their items from one day
+to the next. The archive splits each snapshot into its items and a small
+skeleton (the document without them), and stores every distinct item once:
+
+    data/snapshots/blocks.pack  compressed blocks of items, append-only
+    data/snapshots/index.db     block offsets, the block and position of
+                                each item, and per-day manifests listing
+                                the items of each snapshot in order
+
+Blocks are zstd frames when the zstandard package is installed, zlib
+streams otherwise; each block records its codec, so archives written with
+either stay readable. Daily blocks hold few items, so all blocks after the
+first are compressed with the first block's items as preset dictionary,
+which roughly halves them. Reading a day decompresses only the blocks
+holding its items, plus the first.
+
+Items are stored in exclusive XML canonical form, so the same item hashes
+alike in every snapshot; rebuilt snapshots are equivalent XML, not
+byte-identical copies.
+"""
+from collections import OrderedDict
+from pathlib import Path
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+from lxml import etree
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Archive directory, see module docstring
+SNAPSHOT_DIR = Path('data/snapshots')
+
+# Uncompressed bytes of items per block; larger blocks compress better,
+# smaller ones cost less to read a day that needs one item of them
+BLOCK_SIZE = 256 * 1024
+
+# Decompressed blocks kept in memory per archive
+BLOCK_CACHE_SIZE = 64
+
+# Bytes of the first block used as preset dictionary, zlib's window size
+DICTIONARY_SIZE = 32 * 1024
+
+# Elements stored as items: <job> in legacy snapshots, <item> in RSS feeds
+ITEM_TAGS = ('job', 'item')
+
+# Placeholder for the items in a stored skeleton
+ITEMS_MARKER = b'<!--snapshot-items-->'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    block_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    codec TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    hash BLOB NOT NULL UNIQUE,
+    block_id INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS days (
+    school TEXT NOT NULL,
+    day TEXT NOT NULL,
+    skeleton BLOB NOT NULL,
+    manifest BLOB NOT NULL,
+    source_bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (school, day)
+);
+"""
+
+def compress_block(data, dictionary=None):
+    """
+    Compress a block
+
+    Args:
+        data: Concatenated items
+        dictionary: Optional preset dictionary bytes
+
+    Returns:
+        tuple: (codec, compressed bytes)
+    """
+    if zstandard is not None:
+        if dictionary:
+            zdict = zstandard.ZstdCompressionDict(dictionary, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+            return 'zstd-dict', zstandard.ZstdCompressor(level=19, dict_data=zdict).compress(data)
+        return 'zstd', zstandard.ZstdCompressor(level=19).compress(data)
+    if dictionary:
+        compressor = zlib.compressobj(9, zdict=dictionary)
+        return 'zlib-dict', compressor.compress(data) + compressor.flush()
+    return 'zlib', zlib.compress(data, 9)
+
+def decompress_block(codec, data, dictionary=None):
+    """Decompress a block written by compress_block with the same dictionary"""
+    if codec.startswith('zstd'):
+        if zstandard is None:
+            raise RuntimeError('Snapshot block is zstd compressed: pip install zstandard')
+        if codec == 'zstd-dict':
+            zdict = zstandard.ZstdCompressionDict(dictionary, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+            return zstandard.ZstdDecompressor(dict_data=zdict).decompress(data)
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == 'zlib-dict':
+        decompressor = zlib.decompressobj(zdict=dictionary)
+        return decompressor.decompress(data) + decompressor.flush()
+    return zlib.decompress(data)
+
+def split_snapshot(content):
+    """
+    Split a snapshot document into its skeleton and items
+
+    Args:
+        content: XML bytes of a <jobs> snapshot or an RSS feed
+
+    Returns:
+        tuple: (skeleton bytes with ITEMS_MARKER where the items were,
+            list of canonical item bytes in document order)
+    """
+    root = etree.fromstring(content, etree.XMLParser(recover=True, huge_tree=True))
+    elements = [elem for elem in root.iter(*ITEM_TAGS)]
+    items = [etree.tostring(elem, method='c14n', exclusive=True) for elem in elements]
+
+    marker = etree.Comment(ITEMS_MARKER[4:-3].decode('ascii'))
+    if elements:
+        parent = elements[0].getparent()
+        parent.insert(parent.index(elements[0]), marker)
+        for elem in elements:
+            elem.getparent().remove(elem)
+    else:
+        root.append(marker)
+    skeleton = etree.tostring(root.getroottree(), xml_declaration=True, encoding='utf-8')
+    return skeleton, items
+
+def item_hash(item):
+    return hashlib.blake2b(item, digest_size=16).digest()
+
+def encode_manifest(item_ids):
+    """Pack the item IDs of a day; consecutive days repeat runs of IDs, so deltas compress well"""
+    deltas = [item_id - previous for previous, item_id in zip([0] + item_ids, item_ids)]
+    return zlib.compress(json.dumps(deltas, separators=(',', ':')).encode('ascii'), 9)
+
+def decode_manifest(manifest):
+    item_ids = []
+    item_id = 0
+    for delta in json.loads(zlib.decompress(manifest)):
+        item_id += delta
+        item_ids.append(item_id)
+    return item_ids
+
+class SnapshotArchive:
+    """Archive of daily snapshots, see the module docstring"""
+
+    def __init__(self, path=None):
+        self.path = Path(path or SNAPSHOT_DIR)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.pack_path = self.path / 'blocks.pack'
+        self.conn = sqlite3.connect(self.path / 'index.db', timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        self._blocks = OrderedDict()
+        self._dictionary = None
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write_blocks(self, pending):
+        """
+        Append items to the pack file in blocks of up to BLOCK_SIZE bytes
+
+        Args:
+            pending: List of (hash, item bytes) not stored yet
+
+        Returns:
+            dict: Hash to item_id of the stored items
+        """
+        item_ids = {}
+        with open(self.pack_path, 'a+b') as pack:
+            dictionary = self._read_dictionary(pack)
+            index = 0
+            while index < len(pending):
+                block = []
+                size = 0
+                while index < len(pending) and (not block or size + len(pending[index][1]) <= BLOCK_SIZE):
+                    block.append(pending[index])
+                    size += len(pending[index][1])
+                    index += 1
+
+                content = b''.join(item for _, item in block)
+                codec, data = compress_block(content, dictionary)
+                offset = pack.seek(0, os.SEEK_END)
+                pack.write(data)
+                block_id = self.conn.execute(
+                    'INSERT INTO blocks (codec, offset, length) VALUES (?, ?, ?)',
+                    (codec, offset, len(data))
+                ).lastrowid
+                if dictionary is None:
+                    dictionary = self._dictionary = content[:DICTIONARY_SIZE]
+
+                start = 0
+                for digest, item in block:
+                    item_ids[digest] = self.conn.execute(
+                        'INSERT INTO items (hash, block_id, start, size) VALUES (?, ?, ?, ?)',
+                        (digest, block_id, start, len(item))
+                    ).lastrowid
+                    start += len(item)
+            # Blocks must be on disk before the index points at them
+            pack.flush()
+            os.fsync(pack.fileno())
+        return item_ids
+
+    def add(self, school_code, day, content):
+        """
+        Archive the snapshot of a school on a day, replacing an earlier one
+
+        Args:
+            school_code: School code
+            day: Date as 'YYYY-MM-DD'
+            content: XML bytes of the snapshot
+
+        Returns:
+            dict: 'items' in the snapshot, 'new_items' stored by this call,
+                'new_bytes' compressed bytes appended to the pack file
+        """
+        skeleton, items = split_snapshot(content)
+        hashes = [item_hash(item) for item in items]
+
+        pack_size = self.pack_path.stat().st_size if self.pack_path.exists() else 0
+        with self.conn:
+            # One writer at a time, the pack offsets depend on it
+            self.conn.execute('BEGIN IMMEDIATE')
+            item_ids = {}
+            for start in range(0, len(hashes), 500):
+                chunk = list(set(hashes[start:start + 500]))
+                rows = self.conn.execute(
+                    f"SELECT hash, item_id FROM items WHERE hash IN ({', '.join('?' * len(chunk))})", chunk
+                )
+                item_ids.update((row['hash'], row['item_id']) for row in rows)
+
+            pending = []
+            for digest, item in zip(hashes, items):
+                if digest not in item_ids:
+                    item_ids[digest] = None
+                    pending.append((digest, item))
+            if pending:
+                item_ids.update(self._write_blocks(pending))
+
+            manifest = encode_manifest([item_ids[digest] for digest in hashes])
+            self.conn.execute(
+                """INSERT OR REPLACE INTO days (school, day, skeleton, manifest, source_bytes, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (school_code, day, zlib.compress(skeleton), manifest, len(content), time.time())
+            )
+
+        new_bytes = (self.pack_path.stat().st_size if self.pack_path.exists() else 0) - pack_size
+        return {'items': len(items), 'new_items': len(pending), 'new_bytes': new_bytes}
+
+    def _read_dictionary(self, pack):
+        """Return the preset dictionary, None while the archive has no block"""
+        if self._dictionary is None:
+            row = self.conn.execute('SELECT MIN(block_id) FROM blocks').fetchone()
+            if row[0] is not None:
+                self._dictionary = self._read_block(pack, row[0])[:DICTIONARY_SIZE]
+        return self._dictionary
+
+    def _read_block(self, pack, block_id):
+        """Return a decompressed block, from the cache if possible"""
+        data = self._blocks.get(block_id)
+        if data is not None:
+            self._blocks.move_to_end(block_id)
+            return data
+
+        row = self.conn.execute(
+            'SELECT codec, offset, length FROM blocks WHERE block_id = ?', (block_id,)
+        ).fetchone()
+        dictionary = self._read_dictionary(pack) if row['codec'].endswith('-dict') else None
+        pack.seek(row['offset'])
+        data = decompress_block(row['codec'], pack.read(row['length']), dictionary)
+        self._blocks[block_id] = data
+        if len(self._blocks) > BLOCK_CACHE_SIZE:
+            self._blocks.popitem(last=False)
+        return data
+
+    def read(self, school_code, day):
+        """
+        Rebuild the snapshot of a school on a day
+
+        Returns:
+            bytes: XML document, None if that day is not archived
+        """
+        row = self.conn.execute(
+            'SELECT skeleton, manifest FROM days WHERE school = ? AND day = ?', (school_code, day)
+        ).fetchone()
+        if row is None:
+            return None
+
+        item_ids = decode_manifest(row['manifest'])
+        locations = {}
+        for start in range(0, len(item_ids), 500):
+            chunk = list(set(item_ids[start:start + 500]))
+            rows = self.conn.execute(
+                f"SELECT item_id, block_id, start, size FROM items WHERE item_id IN ({', '.join('?' * len(chunk))})",
+                chunk
+            )
+            locations.update((r['item_id'], (r['block_id'], r['start'], r['size'])) for r in rows)
+
+        items = []
+        if item_ids:
+            with open(self.pack_path, 'rb') as pack:
+                for item_id in item_ids:
+                    block_id, start, size = locations[item_id]
+                    items.append(self._read_block(pack, block_id)[start:start + size])
+        return zlib.decompress(row['skeleton']).replace(ITEMS_MARKER, b'\n'.join(items), 1)
+
+    def days(self, school_code=None):
+        """
+        List archived snapshots, oldest first
+
+        Returns:
+            list: (school, day) tuples
+        """
+        if school_code:
+            rows = self.conn.execute('SELECT school, day FROM days WHERE school = ? ORDER BY day', (school_code,))
+        else:
+            rows = self.conn.execute('SELECT school, day FROM days ORDER BY day, school')
+        return [(row['school'], row['day']) for row in rows]
+
+    def stats(self):
+        """
+        Return size figures of the archive
+
+        Returns:
+            dict: Number of snapshots, distinct items and blocks, total size
+                of the archived snapshots and of the archive on disk
+        """
+        snapshots, source_bytes = self.conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(source_bytes), 0) FROM days'
+        ).fetchone()
+        archive_bytes = sum(path.stat().st_size for path in self.path.iterdir() if path.is_file())
+        return {
+            'snapshots': snapshots,
+            'items': self.conn.execute('SELECT COUNT(*) FROM items').fetchone()[0],
+            'blocks': self.conn.execute('SELECT COUNT(*) FROM blocks').fetchone()[0],
+            'source_bytes': source_bytes,
+            'archive_bytes': archive_bytes
+        }
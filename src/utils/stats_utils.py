@@ -0,0 +1,159 @@
+"""Aggregate statistics over all stored jobs
+
+Counts postings per school and day, per company, location and industry.
+The counters live in memory and catch up with the job store by reading
+only jobs stored after the last one they have seen, so each refresh costs
+O(new jobs) whichever process stored them. A snapshot with the last seen
+sequence number is saved to disk, so a restarted server resumes from it
+instead of rescanning the store.
+"""
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+import atexit
+import json
+import os
+import threading
+import time
+from utils.store_utils import iter_stored_jobs
+
+# Snapshot of the counters and the last counted job
+STATS_PATH = Path('data/cache/stats.json')
+
+# Seconds between checks of the store for new jobs
+REFRESH_INTERVAL = 2
+
+# Seconds between snapshot writes while jobs keep arriving
+SAVE_INTERVAL = 60
+
+# Companies, locations and industries listed by default and at most
+DEFAULT_TOP = 20
+MAX_TOP = 100
+
+def _location(job):
+    """Province of a job; sjtu locations are 'province city'"""
+    location = (job.get('location') or '').split()
+    return location[0] if location else None
+
+class JobStats:
+    """Posting counters, updated one job at a time"""
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.last_seq = state.get('last_seq', 0)
+        self.schools = Counter(state.get('schools', {}))
+        self.days = {school: Counter(days) for school, days in state.get('days', {}).items()}
+        self.companies = Counter(state.get('companies', {}))
+        self.locations = Counter(state.get('locations', {}))
+        self.industries = Counter(state.get('industries', {}))
+
+    def add(self, created_at, job):
+        """Count one stored job"""
+        school = job.get('school')
+        self.schools[school] += 1
+        # Postings per day by publish date, store date when there is none
+        day = (job.get('publish_date') or '')[:10] or datetime.fromtimestamp(created_at).strftime('%Y-%m-%d')
+        self.days.setdefault(school, Counter())[day] += 1
+        if job.get('company'):
+            self.companies[job['company']] += 1
+        location = _location(job)
+        if location:
+            self.locations[location] += 1
+        if job.get('industry'):
+            self.industries[job['industry']] += 1
+        self.last_seq = job['seq']
+
+    def to_state(self):
+        return {
+            'last_seq': self.last_seq,
+            'schools': self.schools,
+            'days': self.days,
+            'companies': self.companies,
+            'locations': self.locations,
+            'industries': self.industries
+        }
+
+    def summary(self, top=DEFAULT_TOP):
+        """Return the counters as served by /stats"""
+        return {
+            'total': sum(self.schools.values()),
+            'last_seq': self.last_seq,
+            'schools': dict(self.schools),
+            'per_day': {school: dict(sorted(days.items())) for school, days in self.days.items()},
+            'top_companies': self.companies.most_common(top),
+            'locations': self.locations.most_common(top),
+            'industries': self.industries.most_common(top)
+        }
+
+def load_stats():
+    """Load the counter snapshot, empty counters if there is none"""
+    try:
+        with open(STATS_PATH, 'r', encoding='utf-8') as f:
+            return JobStats(json.load(f))
+    except (OSError, ValueError):
+        return JobStats()
+
+def save_stats(stats):
+    STATS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = STATS_PATH.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(stats.to_state(), f, ensure_ascii=False)
+    os.replace(tmp_path, STATS_PATH)
+
+_stats = []
+_rendered = {}
+_lock = threading.Lock()
+_checked = [0.0]
+# Time and last counted job of the latest snapshot
+_saved = [0.0, 0]
+
+def refresh_stats(db_path=None):
+    """
+    Count jobs stored since the last refresh and save a snapshot now and then
+
+    Returns:
+        JobStats: Up to date counters
+    """
+    with _lock:
+        if not _stats:
+            _stats.append(load_stats())
+            _saved[:] = [time.monotonic(), _stats[0].last_seq]
+        stats = _stats[0]
+        if time.monotonic() - _checked[0] < REFRESH_INTERVAL:
+            return stats
+
+        before = stats.last_seq
+        for created_at, job in iter_stored_jobs(stats.last_seq, db_path):
+            stats.add(created_at, job)
+        _checked[0] = time.monotonic()
+
+        if stats.last_seq != before:
+            _rendered.clear()
+            # Save right away after the initial full count
+            if time.monotonic() - _saved[0] > SAVE_INTERVAL or not before:
+                save_stats(stats)
+                _saved[:] = [time.monotonic(), stats.last_seq]
+        return stats
+
+def _save_on_exit():
+    with _lock:
+        if _stats and _stats[0].last_seq != _saved[1]:
+            save_stats(_stats[0])
+
+atexit.register(_save_on_exit)
+
+def render_stats(top=DEFAULT_TOP, db_path=None):
+    """
+    Return /stats response body, re-rendered only after new jobs arrived
+
+    Returns:
+        bytes: JSON document
+    """
+    top = min(max(top, 1), MAX_TOP)
+    stats = refresh_stats(db_path)
+    with _lock:
+        body = _rendered.get(top)
+        if body is None:
+            body = json.dumps(stats.summary(top), ensure_ascii=False).encode('utf-8')
+            _rendered[top] = body
+        return body
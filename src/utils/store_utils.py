@@ -0,0 +1,617 @@
+from pathlib import Path
+import json
+import sqlite3
+import time
+from utils.dedupe_utils import (
+    MIN_SIMILARITY, bucket_keys, content_hash, job_signature, pack_signature, similarity,
+    unpack_signature
+)
+from utils.job_utils import Job
+from utils.keyword_utils import SubscriptionMatcher
+from utils.log_utils import get_logger
+
+# Job store shared by all crawlers and the RSS server
+DB_PATH = Path('data/jobs.db')
+
+# Upper bound on candidates verified per new job, keeps huge buckets of
+# identical postings from turning inserts into scans
+MAX_CANDIDATES = 500
+
+# Stored jobs matched against a subscription when it is created or changed
+SUBSCRIPTION_BACKFILL = 500
+
+# Kept in PRAGMA user_version, bumped whenever job_signature changes so
+# signatures and clusters of stored jobs are rebuilt once
+SIGNATURE_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    school TEXT NOT NULL,
+    url TEXT NOT NULL,
+    title TEXT,
+    company TEXT,
+    publish_date TEXT,
+    data TEXT NOT NULL,
+    signature BLOB,
+    cluster_id INTEGER,
+    created_at REAL NOT NULL,
+    content_hash TEXT,
+    version INTEGER NOT NULL DEFAULT 1,
+    updated_at REAL,
+    category TEXT,
+    UNIQUE (school, url)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_school ON jobs (school, seq);
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    bucket INTEGER NOT NULL,
+    seq INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_lsh_buckets ON lsh_buckets (bucket);
+CREATE TABLE IF NOT EXISTS feed_entries (
+    entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    school TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    data TEXT,
+    UNIQUE (school, position)
+);
+CREATE TABLE IF NOT EXISTS subscriptions (
+    name TEXT PRIMARY KEY,
+    keywords TEXT NOT NULL,
+    exclude TEXT NOT NULL,
+    schools TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS subscription_entries (
+    entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    subscription TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (subscription, seq)
+);
+"""
+
+# Columns added after the first release, created on databases that lack them
+MIGRATIONS = [
+    ('jobs', 'content_hash', 'TEXT'),
+    ('jobs', 'version', 'INTEGER NOT NULL DEFAULT 1'),
+    ('jobs', 'updated_at', 'REAL'),
+    ('feed_entries', 'version', 'INTEGER NOT NULL DEFAULT 1'),
+    ('jobs', 'category', 'TEXT'),
+    ('feed_entries', 'data', 'TEXT')
+]
+
+# Indexes on migrated columns, created once the columns exist
+MIGRATION_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_jobs_category ON jobs (school, category, seq);
+"""
+
+# Row metadata kept out of the stored job JSON
+META_FIELDS = ('school', 'cluster_id', 'seq', 'version', 'updated_at')
+
+# Matcher built from the subscriptions table and the table state it reflects
+_matcher_cache = {'state': None, 'matcher': None}
+
+def get_connection(db_path=None):
+    """
+    Open the job store, creating the schema if needed
+
+    Args:
+        db_path: Optional database path, defaults to DB_PATH
+
+    Returns:
+        sqlite3.Connection: Connection with sqlite3.Row rows
+    """
+    db_path = Path(db_path or DB_PATH)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    # WAL lets the server read while a crawler process writes
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(SCHEMA)
+    _migrate(conn)
+    return conn
+
+def _migrate(conn):
+    """Add columns missing from databases created by older versions"""
+    columns = {}
+    for table, column, definition in MIGRATIONS:
+        if table not in columns:
+            columns[table] = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if column not in columns[table]:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+            columns[table].add(column)
+    conn.executescript(MIGRATION_INDEXES)
+    if conn.execute('PRAGMA user_version').fetchone()[0] < SIGNATURE_VERSION:
+        _rebuild_clusters(conn)
+
+def _rebuild_clusters(conn):
+    """Recompute signatures and clusters of all stored jobs, oldest first"""
+    logger = get_logger(__name__)
+
+    with conn:
+        # Taking the write lock first keeps concurrent openers from rebuilding twice
+        conn.execute('BEGIN IMMEDIATE')
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= SIGNATURE_VERSION:
+            return
+        conn.execute('DELETE FROM lsh_buckets')
+        rows = conn.execute('SELECT seq, data FROM jobs ORDER BY seq').fetchall()
+        for row in rows:
+            signature = job_signature(json.loads(row['data']))
+            conn.execute(
+                'UPDATE jobs SET signature = ?, cluster_id = ? WHERE seq = ?',
+                (pack_signature(signature), _cluster_job(conn, row['seq'], signature), row['seq'])
+            )
+        conn.execute(f'PRAGMA user_version = {SIGNATURE_VERSION}')
+
+    if rows:
+        logger.info(f"Rebuilt signatures and clusters of {len(rows)} stored jobs")
+
+def _row_to_job(row):
+    """Convert a jobs row into a Job"""
+    job = Job(json.loads(row['data']))
+    job['school'] = row['school']
+    job['cluster_id'] = row['cluster_id']
+    job['seq'] = row['seq']
+    job['version'] = row['version']
+    if row['updated_at']:
+        job['updated_at'] = row['updated_at']
+    return job
+
+def _row_to_entry(row):
+    """
+    Convert a feed log row joined with its job into the Job as it was logged
+
+    Entries logged before their data was kept show the job's current data.
+    """
+    job = Job(json.loads(row['entry_data'] if row['entry_data'] is not None else row['data']))
+    job['school'] = row['school']
+    job['cluster_id'] = row['cluster_id']
+    job['seq'] = row['seq']
+    job['version'] = row['entry_version']
+    if row['entry_version'] > 1:
+        job['updated_at'] = row['entry_created_at']
+    return job
+
+def _find_cluster(conn, signature, keys):
+    """Return cluster ID of the most similar near-duplicate, None if there is none"""
+    rows = conn.execute(
+        f"""SELECT DISTINCT j.seq, j.signature, j.cluster_id
+            FROM lsh_buckets b JOIN jobs j ON j.seq = b.seq
+            WHERE b.bucket IN ({', '.join('?' * len(keys))})
+            ORDER BY j.seq DESC LIMIT ?""",
+        [*keys, MAX_CANDIDATES]
+    )
+    best = None
+    for row in rows:
+        score = similarity(signature, unpack_signature(row['signature']))
+        if score >= MIN_SIMILARITY and (best is None or score > best[0]):
+            best = (score, row['cluster_id'])
+    return best[1] if best else None
+
+def _cluster_job(conn, seq, signature):
+    """Index a job's LSH buckets and return the cluster ID it joins"""
+    if not signature:
+        return seq
+    keys = bucket_keys(signature)
+    cluster_id = _find_cluster(conn, signature, keys) or seq
+    conn.executemany('INSERT INTO lsh_buckets (bucket, seq) VALUES (?, ?)', [(key, seq) for key in keys])
+    return cluster_id
+
+def _append_feed_entry(conn, school_code, seq, data, version=1):
+    """
+    Append a job version to the school's feed log at the next position
+
+    The entry keeps the job data of its version, so archive pages rendered
+    after a later edit still show the version their guid names.
+    """
+    conn.execute(
+        """INSERT INTO feed_entries (school, position, seq, created_at, version, data)
+           SELECT ?, COALESCE(MAX(position) + 1, 0), ?, ?, ?, ? FROM feed_entries WHERE school = ?""",
+        (school_code, seq, time.time(), version, data, school_code)
+    )
+
+def _update_if_changed(conn, school_code, job, data, digest):
+    """
+    Update a stored job in place if its content hash changed
+
+    An edited job gets a new version and is appended to the feed log again,
+    so feeds re-emit it under a new guid.
+
+    Returns:
+        bool: True if the job was updated
+    """
+    row = conn.execute(
+        'SELECT seq, content_hash, version FROM jobs WHERE school = ? AND url = ?',
+        (school_code, job['url'])
+    ).fetchone()
+    if row is None or row['content_hash'] == digest:
+        return False
+    if row['content_hash'] is None:
+        # Stored before hashes were kept, nothing to compare with
+        conn.execute('UPDATE jobs SET content_hash = ? WHERE seq = ?', (digest, row['seq']))
+        return False
+
+    version = row['version'] + 1
+    conn.execute(
+        """UPDATE jobs SET title = ?, company = ?, publish_date = ?, data = ?,
+               content_hash = ?, version = ?, updated_at = ?
+           WHERE seq = ?""",
+        (job.get('title'), job.get('company'), job.get('publish_date'), data,
+         digest, version, time.time(), row['seq'])
+    )
+    _append_feed_entry(conn, school_code, row['seq'], data, version)
+    return True
+
+def _get_matcher(conn):
+    """Return subscription matcher, rebuilt only when subscriptions changed"""
+    state = tuple(conn.execute('SELECT COUNT(*), MAX(updated_at) FROM subscriptions').fetchone())
+    if _matcher_cache['state'] != state:
+        rows = conn.execute('SELECT * FROM subscriptions')
+        _matcher_cache['matcher'] = SubscriptionMatcher([_row_to_subscription(row) for row in rows])
+        _matcher_cache['state'] = state
+    return _matcher_cache['matcher']
+
+def _append_subscription_entries(conn, names, seq):
+    """Append job to the feeds of the given subscriptions"""
+    now = time.time()
+    conn.executemany(
+        'INSERT OR IGNORE INTO subscription_entries (subscription, seq, created_at) VALUES (?, ?, ?)',
+        [(name, seq, now) for name in names]
+    )
+
+def store_jobs(school_code, jobs, db_path=None):
+    """
+    Store crawled jobs, updating URLs already stored for the school in place
+    when their content hash changed
+
+    New jobs get a MinHash signature of their title and company and join
+    the cluster of their most similar near-duplicate across all schools.
+    Only jobs sharing an LSH bucket are compared. New jobs are also appended
+    to the feeds of all keyword subscriptions they match.
+
+    Args:
+        school_code: School code, e.g. 'fudan'
+        jobs: List of job dicts
+        db_path: Optional database path
+
+    Returns:
+        list: Newly stored Jobs, including school and cluster_id
+    """
+    logger = get_logger(__name__)
+
+    conn = get_connection(db_path)
+    new_jobs = []
+    updated = 0
+    try:
+        matcher = _get_matcher(conn)
+        with conn:
+            for job in jobs:
+                data = json.dumps(
+                    {key: value for key, value in job.items() if key not in META_FIELDS},
+                    ensure_ascii=False
+                )
+                digest = content_hash(job)
+                signature = job_signature(job)
+                cursor = conn.execute(
+                    """INSERT OR IGNORE INTO jobs
+                        (school, url, title, company, publish_date, data, signature, created_at,
+                         content_hash, category)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (school_code, job['url'], job.get('title'), job.get('company'),
+                     job.get('publish_date'), data, pack_signature(signature), time.time(),
+                     digest, job.get('category'))
+                )
+                if not cursor.rowcount:
+                    updated += _update_if_changed(conn, school_code, job, data, digest)
+                    continue
+
+                seq = cursor.lastrowid
+                cluster_id = _cluster_job(conn, seq, signature)
+                conn.execute('UPDATE jobs SET cluster_id = ? WHERE seq = ?', (cluster_id, seq))
+                _append_feed_entry(conn, school_code, seq, data)
+                if matcher:
+                    _append_subscription_entries(conn, matcher.match(job, school_code), seq)
+
+                stored = Job(job)
+                stored['school'] = school_code
+                stored['cluster_id'] = cluster_id
+                new_jobs.append(stored)
+    finally:
+        conn.close()
+
+    logger.info(f"Stored {len(new_jobs)} new jobs for {school_code}, {updated} updated")
+    return new_jobs
+
+def load_jobs(school_code=None, limit=None, collapse_duplicates=False, db_path=None):
+    """
+    Load stored jobs, newest first
+
+    Args:
+        school_code: Only load jobs of this school, None for all schools
+        limit: Maximum number of jobs to return
+        collapse_duplicates: Keep only the newest job of each near-duplicate cluster
+        db_path: Optional database path
+
+    Returns:
+        list: Jobs including school and cluster_id
+    """
+    conn = get_connection(db_path)
+    try:
+        if school_code:
+            rows = conn.execute(
+                'SELECT * FROM jobs WHERE school = ? ORDER BY seq DESC', (school_code,)
+            )
+        else:
+            rows = conn.execute('SELECT * FROM jobs ORDER BY seq DESC')
+
+        jobs = []
+        seen_clusters = set()
+        for row in rows:
+            if collapse_duplicates:
+                if row['cluster_id'] in seen_clusters:
+                    continue
+                seen_clusters.add(row['cluster_id'])
+            jobs.append(_row_to_job(row))
+            if limit and len(jobs) >= limit:
+                break
+        return jobs
+    finally:
+        conn.close()
+
+def iter_stored_jobs(after_seq=0, db_path=None):
+    """
+    Yield stored jobs in store order, without loading them all at once
+
+    Args:
+        after_seq: Only yield jobs with a larger sequence number
+        db_path: Optional database path
+
+    Yields:
+        tuple: (created_at timestamp, Job)
+    """
+    conn = get_connection(db_path)
+    try:
+        rows = conn.execute('SELECT * FROM jobs WHERE seq > ? ORDER BY seq', (after_seq,))
+        for row in rows:
+            yield row['created_at'], _row_to_job(row)
+    finally:
+        conn.close()
+
+def load_category_jobs(school_code, category, limit=50, include_uncategorized=False, db_path=None):
+    """
+    Load the newest stored jobs of one listing category of a school
+
+    Jobs listed in several categories belong to the one they were first
+    found in, so category feeds never repeat each other.
+
+    Args:
+        school_code: School code
+        category: Upstream category value, e.g. '1012'
+        limit: Maximum number of jobs to return
+        include_uncategorized: Also return jobs stored without a category
+        db_path: Optional database path
+
+    Returns:
+        list: Jobs including school and cluster_id, newest first
+    """
+    conn = get_connection(db_path)
+    try:
+        condition = '(category = ? OR category IS NULL)' if include_uncategorized else 'category = ?'
+        rows = conn.execute(
+            f'SELECT * FROM jobs WHERE school = ? AND {condition} ORDER BY seq DESC LIMIT ?',
+            (school_code, category, limit)
+        )
+        return [_row_to_job(row) for row in rows]
+    finally:
+        conn.close()
+
+def load_job(school_code, seq, db_path=None):
+    """
+    Load one stored job by its store sequence number
+
+    Args:
+        school_code: School the job must belong to
+        seq: Sequence number, as in the job's 'seq' field
+        db_path: Optional database path
+
+    Returns:
+        Job: Current version of the job, None if there is no such job
+    """
+    conn = get_connection(db_path)
+    try:
+        row = conn.execute(
+            'SELECT * FROM jobs WHERE seq = ? AND school = ?', (seq, school_code)
+        ).fetchone()
+        return _row_to_job(row) if row else None
+    finally:
+        conn.close()
+
+def count_feed_entries(school_code, db_path=None):
+    """Return number of entries in the school's feed log"""
+    conn = get_connection(db_path)
+    try:
+        row = conn.execute(
+            'SELECT COALESCE(MAX(position) + 1, 0) FROM feed_entries WHERE school = ?',
+            (school_code,)
+        ).fetchone()
+        return row[0]
+    finally:
+        conn.close()
+
+def load_feed_entries(school_code, start, end, db_path=None):
+    """
+    Load jobs at feed log positions [start, end) of a school, newest first
+
+    The feed log is append-only and keeps each entry's job data, so a given
+    position range always yields the same items once it is full.
+
+    Args:
+        school_code: School code
+        start: First position, inclusive
+        end: Last position, exclusive
+        db_path: Optional database path
+
+    Returns:
+        list: Jobs including school and cluster_id
+    """
+    conn = get_connection(db_path)
+    try:
+        rows = conn.execute(
+            """SELECT j.*, f.version AS entry_version, f.data AS entry_data, f.created_at AS entry_created_at
+               FROM feed_entries f JOIN jobs j ON j.seq = f.seq
+               WHERE f.school = ? AND f.position >= ? AND f.position < ?
+               ORDER BY f.position DESC""",
+            (school_code, start, end)
+        )
+        return [_row_to_entry(row) for row in rows]
+    finally:
+        conn.close()
+
+def latest_feed_entry_id(db_path=None):
+    """Return ID of the newest feed log entry across all schools, 0 if empty"""
+    conn = get_connection(db_path)
+    try:
+        row = conn.execute('SELECT COALESCE(MAX(entry_id), 0) FROM feed_entries').fetchone()
+        return row[0]
+    finally:
+        conn.close()
+
+def load_feed_events(after_id, upto_id=None, school_code=None, limit=1000, db_path=None):
+    """
+    Load feed log entries newer than after_id, oldest first
+
+    Args:
+        after_id: Only return entries with a larger entry ID
+        upto_id: Optional largest entry ID to return
+        school_code: Only return entries of this school
+        limit: Maximum number of entries
+        db_path: Optional database path
+
+    Returns:
+        list: (entry_id, Job) tuples
+    """
+    query = ('SELECT f.entry_id, f.version AS entry_version, f.data AS entry_data, '
+             'f.created_at AS entry_created_at, j.* '
+             'FROM feed_entries f JOIN jobs j ON j.seq = f.seq WHERE f.entry_id > ?')
+    params = [after_id]
+    if upto_id is not None:
+        query += ' AND f.entry_id <= ?'
+        params.append(upto_id)
+    if school_code:
+        query += ' AND f.school = ?'
+        params.append(school_code)
+    query += ' ORDER BY f.entry_id LIMIT ?'
+    params.append(limit)
+
+    conn = get_connection(db_path)
+    try:
+        return [(row['entry_id'], _row_to_entry(row)) for row in conn.execute(query, params)]
+    finally:
+        conn.close()
+
+def _row_to_subscription(row):
+    """Convert a subscriptions row into a subscription dict"""
+    return {
+        'name': row['name'],
+        'keywords': json.loads(row['keywords']),
+        'exclude': json.loads(row['exclude']),
+        'schools': json.loads(row['schools'])
+    }
+
+def save_subscription(name, keywords, exclude=(), schools=(), db_path=None):
+    """
+    Create or replace a keyword subscription
+
+    The subscription's feed is rebuilt from the newest SUBSCRIPTION_BACKFILL
+    stored jobs; later jobs are appended by store_jobs as they arrive.
+
+    Args:
+        name: Subscription name, used in its feed URL
+        keywords: Jobs containing any of these match, empty matches all jobs
+        exclude: Jobs containing any of these never match
+        schools: School codes to match, empty for all schools
+        db_path: Optional database path
+
+    Returns:
+        int: Number of stored jobs matched by the backfill
+    """
+    subscription = {
+        'name': name,
+        'keywords': list(keywords),
+        'exclude': list(exclude),
+        'schools': list(schools)
+    }
+    matcher = SubscriptionMatcher([subscription])
+
+    conn = get_connection(db_path)
+    try:
+        with conn:
+            conn.execute(
+                """INSERT OR REPLACE INTO subscriptions (name, keywords, exclude, schools, updated_at)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (name, json.dumps(subscription['keywords'], ensure_ascii=False),
+                 json.dumps(subscription['exclude'], ensure_ascii=False),
+                 json.dumps(subscription['schools']), time.time())
+            )
+            conn.execute('DELETE FROM subscription_entries WHERE subscription = ?', (name,))
+
+            rows = conn.execute('SELECT * FROM jobs ORDER BY seq DESC LIMIT ?',
+                                (SUBSCRIPTION_BACKFILL,)).fetchall()
+            matched = 0
+            for row in reversed(rows):
+                if matcher.match(_row_to_job(row), row['school']):
+                    _append_subscription_entries(conn, [name], row['seq'])
+                    matched += 1
+            return matched
+    finally:
+        conn.close()
+
+def delete_subscription(name, db_path=None):
+    """Delete a subscription and its feed, False if it does not exist"""
+    conn = get_connection(db_path)
+    try:
+        with conn:
+            cursor = conn.execute('DELETE FROM subscriptions WHERE name = ?', (name,))
+            conn.execute('DELETE FROM subscription_entries WHERE subscription = ?', (name,))
+            return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+def load_subscriptions(db_path=None):
+    """Return all subscriptions, ordered by name"""
+    conn = get_connection(db_path)
+    try:
+        return [_row_to_subscription(row)
+                for row in conn.execute('SELECT * FROM subscriptions ORDER BY name')]
+    finally:
+        conn.close()
+
+def load_subscription_jobs(name, limit=50, db_path=None):
+    """
+    Load newest jobs of a subscription's feed
+
+    Args:
+        name: Subscription name
+        limit: Maximum number of jobs
+        db_path: Optional database path
+
+    Returns:
+        list: Jobs, None if the subscription does not exist
+    """
+    conn = get_connection(db_path)
+    try:
+        if not conn.execute('SELECT 1 FROM subscriptions WHERE name = ?', (name,)).fetchone():
+            return None
+        rows = conn.execute(
+            """SELECT j.* FROM subscription_entries s JOIN jobs j ON j.seq = s.seq
+               WHERE s.subscription = ? ORDER BY s.entry_id DESC LIMIT ?""",
+            (name, limit)
+        )
+        return [_row_to_job(row) for row in rows]
+    finally:
+        conn.close()
@@ -0,0 +1,200 @@
+"""Server-Sent Events stream of newly stored jobs
+
+One asyncio event loop in a single background thread serves every
+subscriber. A broadcaster task tails the feed log of the job store and
+writes each new entry to all matching connections, so crawls running in
+this process or in cron jobs reach subscribers alike. Event IDs are feed
+log entry IDs, so a client reconnecting with Last-Event-ID resumes exactly
+where it stopped.
+"""
+from urllib.parse import parse_qs, urlsplit
+import asyncio
+import json
+import os
+import threading
+from utils.log_utils import get_logger
+from utils.store_utils import latest_feed_entry_id, load_feed_events
+
+# Port of the stream server, next to the RSS server's 5001
+STREAM_PORT = int(os.environ.get('STREAM_PORT', '5002'))
+
+# Seconds between polls of the feed log
+POLL_INTERVAL = 1.0
+
+# Seconds between keep-alive comments, lets us notice dropped clients
+KEEPALIVE_INTERVAL = 15
+
+# Clients with more unsent bytes than this are disconnected
+MAX_CLIENT_BUFFER = 1024 * 1024
+
+# Entries read from the feed log per poll
+POLL_BATCH = 1000
+
+# Entries replayed at most when a client resumes
+MAX_REPLAY = 1000
+
+def format_event(entry_id, job):
+    """Encode a stored job as an SSE event"""
+    data = json.dumps(dict(job), ensure_ascii=False)
+    return f"id: {entry_id}\nevent: job\ndata: {data}\n\n".encode('utf-8')
+
+class _Client:
+    def __init__(self, writer, school_code):
+        self.writer = writer
+        self.school_code = school_code
+
+    def send(self, payload):
+        """Queue payload without waiting, False if the client is gone or too slow"""
+        transport = self.writer.transport
+        if transport.is_closing() or transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+            return False
+        self.writer.write(payload)
+        return True
+
+class Broadcaster:
+    """Fans feed log entries out to all connected SSE clients"""
+
+    def __init__(self, school_codes, host='0.0.0.0', port=STREAM_PORT):
+        self.school_codes = set(school_codes)
+        self.host = host
+        self.port = port
+        self.clients = set()
+        self.cursor = 0
+        self.logger = get_logger(__name__)
+
+    async def _poll(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                events = await loop.run_in_executor(
+                    None, load_feed_events, self.cursor, None, None, POLL_BATCH
+                )
+            except Exception as e:
+                self.logger.error(f"Error polling feed log: {str(e)}")
+                events = []
+
+            for entry_id, job in events:
+                payload = format_event(entry_id, job)
+                for client in list(self.clients):
+                    if client.school_code and client.school_code != job['school']:
+                        continue
+                    if not client.send(payload):
+                        self._drop(client)
+                self.cursor = entry_id
+
+            # A full batch means more entries are waiting
+            if len(events) < POLL_BATCH:
+                await asyncio.sleep(POLL_INTERVAL)
+
+    async def _keepalive(self):
+        while True:
+            await asyncio.sleep(KEEPALIVE_INTERVAL)
+            for client in list(self.clients):
+                if not client.send(b': ping\n\n'):
+                    self._drop(client)
+
+    def _drop(self, client):
+        self.clients.discard(client)
+        client.writer.close()
+
+    async def _replay(self, client, last_id):
+        """Send entries after last_id until the client has caught up with the broadcaster"""
+        loop = asyncio.get_running_loop()
+        # Replay is bounded, older entries are left to the RSS feed
+        if self.cursor - last_id > MAX_REPLAY:
+            last_id = self.cursor - MAX_REPLAY
+        while last_id < self.cursor:
+            upto = self.cursor
+            events = await loop.run_in_executor(
+                None, load_feed_events, last_id, upto, client.school_code, MAX_REPLAY
+            )
+            for entry_id, job in events:
+                client.writer.write(format_event(entry_id, job))
+            await client.writer.drain()
+            last_id = upto
+
+    async def _handle(self, reader, writer):
+        client = None
+        try:
+            request_line = await reader.readline()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            parts = request_line.decode('latin-1').split()
+            if len(parts) < 2 or parts[0] != 'GET':
+                await self._reject(writer, '405 Method Not Allowed')
+                return
+
+            url = urlsplit(parts[1])
+            path = url.path.rstrip('/').split('/')[1:]
+            if not path or path[0] != 'stream' or len(path) > 2 or \
+                    (len(path) == 2 and path[1] not in self.school_codes):
+                await self._reject(writer, '404 Not Found')
+                return
+            school_code = path[1] if len(path) == 2 else None
+
+            # Browsers send Last-Event-ID on reconnect, other clients may use the query
+            last_id = headers.get('last-event-id') or parse_qs(url.query).get('last_event_id', [''])[0]
+            last_id = int(last_id) if last_id.isdigit() else self.cursor
+
+            writer.write(
+                b'HTTP/1.1 200 OK\r\n'
+                b'Content-Type: text/event-stream; charset=utf-8\r\n'
+                b'Cache-Control: no-cache\r\n'
+                b'Connection: keep-alive\r\n'
+                b'Access-Control-Allow-Origin: *\r\n'
+                b'\r\n'
+                b'retry: 5000\n\n'
+            )
+            client = _Client(writer, school_code)
+            await self._replay(client, last_id)
+            # No await between catching up and registering, so no entry is missed
+            self.clients.add(client)
+            self.logger.info(f"Stream client connected for {school_code or 'all schools'}, "
+                             f"{len(self.clients)} connected")
+
+            # Wait for the client to hang up, it never sends anything else
+            await reader.read()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if client:
+                self.clients.discard(client)
+            writer.close()
+
+    async def _reject(self, writer, status):
+        writer.write(f'HTTP/1.1 {status}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+
+    async def serve(self):
+        """Run the stream server until cancelled"""
+        loop = asyncio.get_running_loop()
+        self.cursor = await loop.run_in_executor(None, latest_feed_entry_id)
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.logger.info(f"Streaming new jobs on port {self.port} from entry {self.cursor}")
+        async with server:
+            await asyncio.gather(self._poll(), self._keepalive(), server.serve_forever())
+
+def start_stream_server(school_codes, host='0.0.0.0', port=STREAM_PORT):
+    """
+    Start the SSE stream server in a daemon thread
+
+    Args:
+        school_codes: Valid school codes for /stream/<school_code>
+        host: Interface to bind
+        port: Port to listen on
+
+    Returns:
+        Broadcaster: The running broadcaster
+    """
+    broadcaster = Broadcaster(school_codes, host, port)
+    thread = threading.Thread(
+        target=asyncio.run, args=(broadcaster.serve(),), name='stream-server', daemon=True
+    )
+    thread.start()
+    return broadcaster
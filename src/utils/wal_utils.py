@@ -0,0 +1,185 @@
+"""Write-ahead log of a crawl in progress
+
+Crawlers append the new jobs of each page to a per-school log as soon as
+the page is parsed, and truncate it once the jobs are published to the
+XML feed and the job store. A crawl that crashes or is killed leaves its
+log behind; the next run replays it, continues after the last logged page
+and publishes everything together, so pages fetched before the crash are
+not requested again.
+
+Crawlers of several listing categories log the category with each page
+and mark each category finished, so a resumed run skips finished ones.
+
+Each record is one JSON line. Lines are flushed to the OS right away,
+which survives a crash of the process; fsync, which also survives a crash
+of the machine, is batched to at most one per FSYNC_INTERVAL seconds plus
+one when the crawl finishes. A torn last line is dropped on replay.
+
+A crawl holds an flock on <school_code>.lock next to the log from start to
+finish, so crawls of one school started by the scheduler, cron runs of
+src/crawl.py and other server processes don't write to one log or
+truncate each other's. The OS drops the lock when its process dies.
+"""
+from pathlib import Path
+import json
+import os
+import time
+from utils.job_utils import Job
+from utils.log_utils import get_logger
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where crawls of a school aren't serialized
+    fcntl = None
+
+# Logs of unpublished crawls, one file per school
+WAL_DIR = Path('data/wal')
+
+# Minimum seconds between two fsyncs of a log
+FSYNC_INTERVAL = 5.0
+
+# Logs older than this are still published, but the crawl starts over at
+# the first page because the listing has moved on since
+RESUME_MAX_AGE = 3600
+
+class CrawlLog:
+    """Append-only log of one school's crawl, see the module docstring"""
+
+    def __init__(self, school_code, path=None):
+        self.school_code = school_code
+        self.path = Path(path) if path else WAL_DIR / f'{school_code}.jsonl'
+        self._file = None
+        self._lock_file = None
+        self._synced_at = 0.0
+
+    def acquire(self):
+        """
+        Take the school's crawl lock without waiting
+
+        Returns:
+            bool: True if acquired, False if another crawl of the school holds it
+        """
+        if fcntl is None or self._lock_file is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Opened per call, so threads of one process exclude each other too
+        lock_file = open(self.path.with_suffix('.lock'), 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def release(self):
+        """Close the log and drop the crawl lock, safe to call more than once"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._lock_file is not None:
+            # Closing the file releases the flock
+            self._lock_file.close()
+            self._lock_file = None
+
+    def recover(self):
+        """
+        Replay the log of an unpublished crawl
+
+        Later records of the same URL replace earlier ones, so a page that
+        was logged twice yields each job once.
+
+        Returns:
+            dict: 'jobs' list of Job, 'page' last logged page (0 if none or
+                stale), 'state' crawler state logged with it, 'done' True if
+                the crawl had finished fetching, 'categories_done' set of
+                finished categories
+        """
+        logger = get_logger(__name__)
+        recovered = {'jobs': [], 'page': 0, 'state': {}, 'done': False, 'categories_done': set()}
+        try:
+            with open(self.path, 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return recovered
+
+        jobs = {}
+        valid_length = 0
+        logged_at = 0
+        for line in content.splitlines(keepends=True):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Torn write of the last record, later lines can't exist
+                break
+            if not line.endswith(b'\n'):
+                break
+            valid_length += len(line)
+            logged_at = record['time']
+            if record.get('done'):
+                if record.get('category') is None:
+                    recovered['done'] = True
+                else:
+                    recovered['categories_done'].add(record['category'])
+                continue
+            for job in record['jobs']:
+                jobs[job['url']] = Job(job)
+            recovered['page'] = record['page']
+            recovered['state'] = record.get('state', {})
+
+        if valid_length < len(content):
+            logger.warning(f"Dropping {len(content) - valid_length} bytes of torn record from {self.path}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_length)
+
+        recovered['jobs'] = list(jobs.values())
+        if time.time() - logged_at > RESUME_MAX_AGE:
+            recovered.update(page=0, state={}, done=False, categories_done=set())
+        if jobs or recovered['done']:
+            logger.info(f"Recovered {len(jobs)} unpublished {self.school_code} jobs up to page "
+                        f"{recovered['page']}{', crawl had finished' if recovered['done'] else ''}")
+        return recovered
+
+    def _write(self, record, sync=False):
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, 'ab')
+        record['time'] = time.time()
+        self._file.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+        self._file.flush()
+        if sync or time.monotonic() - self._synced_at >= FSYNC_INTERVAL:
+            os.fsync(self._file.fileno())
+            self._synced_at = time.monotonic()
+
+    def append(self, page, jobs, **state):
+        """
+        Log the new jobs of a parsed page
+
+        Args:
+            page: Page number
+            jobs: New jobs found on the page
+            **state: JSON-serializable crawler state needed to continue
+                after this page, e.g. page_size
+        """
+        self._write({'page': page, 'jobs': [dict(job) for job in jobs], 'state': state})
+
+    def finish(self, category=None):
+        """
+        Log that fetching is complete, so a crash while publishing doesn't refetch
+
+        Args:
+            category: Only mark this listing category as complete
+        """
+        if category is not None:
+            self._write({'done': True, 'category': category})
+        elif self._file is not None or self.path.exists():
+            self._write({'done': True}, sync=True)
+
+    def truncate(self):
+        """Drop the log after its jobs were published and release the lock"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.path.unlink(missing_ok=True)
+        self.release()
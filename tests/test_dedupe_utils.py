@@ -0,0 +1,94 @@
+from utils.dedupe_utils import (
+    BAND_COUNT, MIN_SIMILARITY, NUM_PERM, bucket_keys, content_hash, job_signature, job_tokens,
+    minhash, normalize_text, pack_signature, similarity, strip_tags, unpack_signature
+)
+from utils.store_utils import get_connection, load_jobs, store_jobs
+
+def test_normalize_text_drops_stopwords_and_punctuation():
+    assert normalize_text('ＡＢＣ科技有限公司 2025届 校园招聘！') == 'abc科技2025'
+    assert strip_tags('【线下】软件工程师[宣讲会]') == '软件工程师'
+
+def test_minhash_is_stable_and_empty_job_has_none():
+    job = {'title': '软件开发工程师', 'company': '华为技术有限公司'}
+    signature = job_signature(job)
+    assert len(signature) == NUM_PERM
+    assert signature == job_signature(dict(job))
+    assert minhash(set()) is None
+    assert job_signature({'title': '【宣讲会】', 'company': None}) is None
+
+def test_company_keeps_bracketed_text():
+    # nankai puts the company itself in brackets
+    assert job_tokens({'title': '', 'company': '【北京强新制药有限公司】 北京市'})
+
+def test_similarity_separates_near_duplicates():
+    a = job_signature({'title': '2025届校园招聘 软件开发工程师', 'company': '华为技术有限公司'})
+    b = job_signature({'title': '【线上】软件开发工程师 2025届', 'company': '华为技术有限公司'})
+    c = job_signature({'title': '财务会计', 'company': '中国工商银行上海分行'})
+    assert similarity(a, a) == 1.0
+    assert similarity(a, b) >= MIN_SIMILARITY
+    assert similarity(a, c) < MIN_SIMILARITY
+
+def test_shared_company_alone_is_not_a_duplicate():
+    # Real postings from the 2024-11-21 snapshots that a lower threshold merged
+    pairs = [
+        ({'title': '宿迁学院2024年高层次人才招聘公告', 'company': '北京月生信息技术有限公司'},
+         {'title': '嘉兴职业技术学院2024年公开招聘高层次人才（教职人员）公告',
+          'company': '北京月生信息技术有限公司'}),
+        ({'title': '合成研究员', 'company': '【北京强新制药有限公司】 北京市'},
+         {'title': '制剂研究员', 'company': '【北京强新制药有限公司】 北京市'}),
+        ({'title': '高中化学老师', 'company': '【石家庄云臻实验高级中学有限公司】 河北省'},
+         {'title': '高中数学老师', 'company': '【石家庄云臻实验高级中学有限公司】 河北省'})
+    ]
+    for a, b in pairs:
+        assert similarity(job_signature(a), job_signature(b)) < MIN_SIMILARITY
+
+def test_same_posting_without_company_is_a_duplicate():
+    a = job_signature({'title': '北京同仁堂医养投资股份有限公司2025届管理培训生',
+                       'company': '北京同仁堂医养投资股份有限公司'})
+    b = job_signature({'title': '北京同仁堂医养投资股份有限公司2025届管理培训生秋季招生简章',
+                       'company': None})
+    assert similarity(a, b) >= MIN_SIMILARITY
+
+def test_bucket_keys_are_per_band():
+    signature = job_signature({'title': '软件开发工程师'})
+    keys = bucket_keys(signature)
+    assert len(keys) == BAND_COUNT
+    assert len(set(keys)) == BAND_COUNT
+    assert keys == bucket_keys(unpack_signature(pack_signature(signature)))
+
+def test_content_hash_ignores_volatile_fields_and_whitespace():
+    job = {'url': 'u', 'title': '软件  工程师', 'views': '1', 'category': '1'}
+    assert content_hash(job) == content_hash({'title': '软件 工程师', 'url': 'u', 'views': '2'})
+    assert content_hash(job) != content_hash(dict(job, title='硬件工程师'))
+
+def test_near_duplicates_across_schools_share_a_cluster(tmp_path):
+    db_path = tmp_path / 'jobs.db'
+    store_jobs('fudan', [{'url': 'https://a/1', 'title': '2025届校园招聘 软件开发工程师',
+                          'company': '华为技术有限公司'}], db_path)
+    store_jobs('sjtu', [{'url': 'https://b/1', 'title': '【线上】软件开发工程师 2025届',
+                         'company': '华为技术有限公司'}], db_path)
+    store_jobs('tongji', [{'url': 'https://c/1', 'title': '财务会计',
+                           'company': '中国工商银行上海分行'}], db_path)
+
+    clusters = {job['school']: job['cluster_id'] for job in load_jobs(db_path=db_path)}
+    assert clusters['sjtu'] == clusters['fudan']
+    assert clusters['tongji'] != clusters['fudan']
+    assert len(load_jobs(collapse_duplicates=True, db_path=db_path)) == 2
+
+def test_old_signatures_are_rebuilt(tmp_path):
+    db_path = tmp_path / 'jobs.db'
+    store_jobs('nankai', [{'url': 'https://a/1', 'title': '合成研究员', 'company': '【北京强新制药有限公司】 北京市'},
+                          {'url': 'https://a/2', 'title': '制剂研究员', 'company': '【北京强新制药有限公司】 北京市'}],
+               db_path)
+    conn = get_connection(db_path)
+    with conn:
+        # As left by an older version that merged the two
+        conn.execute('UPDATE jobs SET cluster_id = 1, signature = NULL')
+        conn.execute('DELETE FROM lsh_buckets')
+        conn.execute('PRAGMA user_version = 0')
+    conn.close()
+
+    assert {job['cluster_id'] for job in load_jobs(db_path=db_path)} == {1, 2}
+    conn = get_connection(db_path)
+    assert conn.execute('SELECT COUNT(*) FROM jobs WHERE signature IS NULL').fetchone()[0] == 0
+    conn.close()
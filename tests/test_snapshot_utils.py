@@ -0,0 +1,105 @@
+import pytest
+from utils import snapshot_utils
+from utils.snapshot_utils import (
+    SnapshotArchive, compress_block, decode_manifest, decompress_block, encode_manifest,
+    split_snapshot
+)
+
+def _snapshot(numbers, root='jobs'):
+    jobs = ''.join(
+        f'<job><title>职位 {n}</title><url>https://example.com/job/{n}</url></job>' for n in numbers
+    )
+    return f'<?xml version="1.0" encoding="utf-8"?><{root}>{jobs}</{root}>'.encode('utf-8')
+
+def _rss(numbers):
+    items = ''.join(
+        f'<item><title>Job {n}</title><link>https://example.com/job/{n}</link></item>' for n in numbers
+    )
+    return (f'<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>'
+            f'<title>Feed</title>{items}</channel></rss>').encode('utf-8')
+
+@pytest.fixture
+def archive(tmp_path):
+    with SnapshotArchive(tmp_path / 'snapshots') as archive:
+        yield archive
+
+def test_round_trip(archive):
+    content = _snapshot(range(10))
+    result = archive.add('fudan', '2024-11-21', content)
+    assert result['items'] == 10
+    assert result['new_items'] == 10
+
+    rebuilt = archive.read('fudan', '2024-11-21')
+    assert split_snapshot(rebuilt) == split_snapshot(content)
+
+def test_round_trip_rss(archive):
+    content = _rss(range(5))
+    archive.add('hust', '2024-11-21', content)
+    skeleton, items = split_snapshot(archive.read('hust', '2024-11-21'))
+    assert items == split_snapshot(content)[1]
+    assert b'<title>Feed</title>' in skeleton
+
+def test_repeated_items_are_stored_once(archive):
+    archive.add('fudan', '2024-11-21', _snapshot(range(10)))
+    result = archive.add('fudan', '2024-11-22', _snapshot(range(2, 12)))
+    assert result['new_items'] == 2
+    assert archive.stats()['items'] == 12
+
+    for day, numbers in (('2024-11-21', range(10)), ('2024-11-22', range(2, 12))):
+        assert split_snapshot(archive.read('fudan', day))[1] == split_snapshot(_snapshot(numbers))[1]
+
+def test_items_keep_order_and_duplicates(archive):
+    content = _snapshot([3, 1, 2, 1])
+    archive.add('fudan', '2024-11-21', content)
+    assert split_snapshot(archive.read('fudan', '2024-11-21'))[1] == split_snapshot(content)[1]
+
+def test_snapshot_without_items(archive):
+    content = _snapshot([])
+    archive.add('fudan', '2024-11-21', content)
+    assert split_snapshot(archive.read('fudan', '2024-11-21')) == split_snapshot(content)
+
+def test_items_span_several_blocks(archive, monkeypatch):
+    monkeypatch.setattr(snapshot_utils, 'BLOCK_SIZE', 200)
+    content = _snapshot(range(30))
+    archive.add('fudan', '2024-11-21', content)
+    assert archive.stats()['blocks'] > 1
+
+    with SnapshotArchive(archive.path) as reopened:
+        assert split_snapshot(reopened.read('fudan', '2024-11-21'))[1] == split_snapshot(content)[1]
+
+def test_later_blocks_use_first_as_dictionary(archive):
+    archive.add('fudan', '2024-11-21', _snapshot(range(10)))
+    archive.add('fudan', '2024-11-22', _snapshot(range(10, 20)))
+    codecs = [row[0] for row in archive.conn.execute('SELECT codec FROM blocks ORDER BY block_id')]
+    assert not codecs[0].endswith('-dict')
+    assert codecs[1].endswith('-dict')
+
+    # A new instance has no cached dictionary and must load it from the first block
+    with SnapshotArchive(archive.path) as reopened:
+        assert split_snapshot(reopened.read('fudan', '2024-11-22'))[1] == \
+            split_snapshot(_snapshot(range(10, 20)))[1]
+
+def test_add_replaces_same_day(archive):
+    archive.add('fudan', '2024-11-21', _snapshot(range(3)))
+    archive.add('fudan', '2024-11-21', _snapshot(range(5)))
+    assert archive.days() == [('fudan', '2024-11-21')]
+    assert len(split_snapshot(archive.read('fudan', '2024-11-21'))[1]) == 5
+
+def test_days_and_missing_day(archive):
+    archive.add('sjtu', '2024-11-22', _snapshot([1]))
+    archive.add('fudan', '2024-11-21', _snapshot([1]))
+    assert archive.days() == [('fudan', '2024-11-21'), ('sjtu', '2024-11-22')]
+    assert archive.days('sjtu') == [('sjtu', '2024-11-22')]
+    assert archive.read('fudan', '2024-11-22') is None
+
+def test_manifest_round_trip():
+    item_ids = [5, 6, 7, 1, 7, 100]
+    assert decode_manifest(encode_manifest(item_ids)) == item_ids
+    assert decode_manifest(encode_manifest([])) == []
+
+def test_block_round_trip_with_dictionary():
+    dictionary = b'<job><title>shared</title></job>' * 10
+    data = b'<job><title>shared</title><url>x</url></job>'
+    for preset in (None, dictionary):
+        codec, compressed = compress_block(data, preset)
+        assert decompress_block(codec, compressed, preset) == data
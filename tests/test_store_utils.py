@@ -0,0 +1,51 @@
+from utils.store_utils import count_feed_entries, load_feed_entries, load_feed_events, load_job, store_jobs
+
+def _job(n, **fields):
+    job = {'url': f'https://example.com/job/{n}', 'title': f'软件工程师 {n}', 'company': f'公司{n}'}
+    job.update(fields)
+    return job
+
+def test_unchanged_job_is_stored_once(tmp_path):
+    db_path = tmp_path / 'jobs.db'
+    assert len(store_jobs('fudan', [_job(1)], db_path)) == 1
+    assert store_jobs('fudan', [_job(1)], db_path) == []
+    assert count_feed_entries('fudan', db_path) == 1
+
+def test_volatile_fields_dont_make_a_new_version(tmp_path):
+    db_path = tmp_path / 'jobs.db'
+    store_jobs('fudan', [_job(1, views='10', category='1')], db_path)
+    store_jobs('fudan', [_job(1, views='11', category='2')], db_path)
+    assert count_feed_entries('fudan', db_path) == 1
+    assert load_job('fudan', 1, db_path)['version'] == 1
+
+def test_edited_job_gets_new_version(tmp_path):
+    db_path = tmp_path / 'jobs.db'
+    store_jobs('fudan', [_job(1)], db_path)
+    assert store_jobs('fudan', [_job(1, title='高级软件工程师')], db_path) == []
+
+    job = load_job('fudan', 1, db_path)
+    assert job['version'] == 2
+    assert job['title'] == '高级软件工程师'
+    assert job['updated_at']
+
+    entries = load_feed_entries('fudan', 0, 10, db_path)
+    assert [(entry['seq'], entry['version']) for entry in entries] == [(1, 2), (1, 1)]
+
+def test_feed_entries_keep_their_version(tmp_path):
+    db_path = tmp_path / 'jobs.db'
+    store_jobs('fudan', [_job(1)], db_path)
+    store_jobs('fudan', [_job(1, title='高级软件工程师')], db_path)
+
+    # Rendered after the edit, the first entry still shows what it logged
+    entries = {entry['version']: entry for entry in load_feed_entries('fudan', 0, 10, db_path)}
+    assert entries[1]['title'] == '软件工程师 1'
+    assert 'updated_at' not in entries[1]
+    assert entries[2]['title'] == '高级软件工程师'
+
+    events = [job for _, job in load_feed_events(0, db_path=db_path)]
+    assert [(job['version'], job['title']) for job in events] == [(1, '软件工程师 1'), (2, '高级软件工程师')]
+
+def test_same_url_at_two_schools_is_two_jobs(tmp_path):
+    db_path = tmp_path / 'jobs.db'
+    store_jobs('fudan', [_job(1)], db_path)
+    assert len(store_jobs('sjtu', [_job(1)], db_path)) == 1
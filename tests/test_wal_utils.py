@@ -0,0 +1,115 @@
+import json
+import time
+from utils import wal_utils
+from utils.wal_utils import CrawlLog
+
+def _job(n):
+    return {'url': f'https://example.com/job/{n}', 'title': f'Job {n}'}
+
+def test_recover_without_log(tmp_path):
+    recovered = CrawlLog('fudan', tmp_path / 'fudan.jsonl').recover()
+    assert recovered == {'jobs': [], 'page': 0, 'state': {}, 'done': False, 'categories_done': set()}
+
+def test_recover_replays_pages(tmp_path):
+    wal = CrawlLog('fudan', tmp_path / 'fudan.jsonl')
+    wal.append(1, [_job(1), _job(2)], page_size=20)
+    wal.append(2, [_job(3)], page_size=10)
+    wal.release()
+
+    recovered = CrawlLog('fudan', tmp_path / 'fudan.jsonl').recover()
+    assert [job['url'] for job in recovered['jobs']] == [_job(n)['url'] for n in (1, 2, 3)]
+    assert recovered['page'] == 2
+    assert recovered['state'] == {'page_size': 10}
+    assert not recovered['done']
+
+def test_recover_keeps_latest_record_of_a_url(tmp_path):
+    wal = CrawlLog('fudan', tmp_path / 'fudan.jsonl')
+    wal.append(1, [_job(1)])
+    wal.append(1, [dict(_job(1), title='Edited')])
+    wal.release()
+
+    recovered = CrawlLog('fudan', tmp_path / 'fudan.jsonl').recover()
+    assert [job['title'] for job in recovered['jobs']] == ['Edited']
+
+def test_recover_drops_torn_last_line(tmp_path):
+    path = tmp_path / 'fudan.jsonl'
+    wal = CrawlLog('fudan', path)
+    wal.append(1, [_job(1)])
+    wal.release()
+    valid_size = path.stat().st_size
+    with open(path, 'ab') as f:
+        f.write(b'{"page": 2, "jobs": [{"url": "https://exa')
+
+    recovered = CrawlLog('fudan', path).recover()
+    assert [job['url'] for job in recovered['jobs']] == [_job(1)['url']]
+    assert recovered['page'] == 1
+    assert path.stat().st_size == valid_size
+
+def test_recover_drops_complete_json_without_newline(tmp_path):
+    path = tmp_path / 'fudan.jsonl'
+    wal = CrawlLog('fudan', path)
+    wal.append(1, [_job(1)])
+    wal.release()
+    valid_size = path.stat().st_size
+    with open(path, 'ab') as f:
+        f.write(json.dumps({'page': 2, 'jobs': [_job(2)], 'state': {}, 'time': time.time()}).encode())
+
+    recovered = CrawlLog('fudan', path).recover()
+    assert recovered['page'] == 1
+    assert len(recovered['jobs']) == 1
+    assert path.stat().st_size == valid_size
+
+def test_stale_log_is_published_but_not_resumed(tmp_path):
+    path = tmp_path / 'fudan.jsonl'
+    logged_at = time.time() - wal_utils.RESUME_MAX_AGE - 60
+    records = [
+        {'page': 1, 'jobs': [_job(1)], 'state': {'category': '1'}, 'time': logged_at},
+        {'done': True, 'category': '1', 'time': logged_at},
+        {'done': True, 'time': logged_at}
+    ]
+    path.write_text(''.join(json.dumps(record) + '\n' for record in records), encoding='utf-8')
+
+    recovered = CrawlLog('fudan', path).recover()
+    assert [job['url'] for job in recovered['jobs']] == [_job(1)['url']]
+    assert recovered['page'] == 0
+    assert recovered['state'] == {}
+    assert not recovered['done']
+    assert recovered['categories_done'] == set()
+
+def test_recover_reports_finished_categories(tmp_path):
+    wal = CrawlLog('fudan', tmp_path / 'fudan.jsonl')
+    wal.append(1, [_job(1)], category='1', page_size=20)
+    wal.finish('1')
+    wal.append(1, [_job(2)], category='2', page_size=20)
+    wal.release()
+
+    recovered = CrawlLog('fudan', tmp_path / 'fudan.jsonl').recover()
+    assert recovered['categories_done'] == {'1'}
+    assert recovered['state'] == {'category': '2', 'page_size': 20}
+    assert not recovered['done']
+
+    wal = CrawlLog('fudan', tmp_path / 'fudan.jsonl')
+    wal.finish('2')
+    wal.finish()
+    wal.release()
+    recovered = CrawlLog('fudan', tmp_path / 'fudan.jsonl').recover()
+    assert recovered['categories_done'] == {'1', '2'}
+    assert recovered['done']
+
+def test_truncate_removes_log(tmp_path):
+    path = tmp_path / 'fudan.jsonl'
+    wal = CrawlLog('fudan', path)
+    wal.append(1, [_job(1)])
+    wal.truncate()
+    assert not path.exists()
+    assert CrawlLog('fudan', path).recover()['jobs'] == []
+
+def test_lock_excludes_second_crawl(tmp_path):
+    first = CrawlLog('fudan', tmp_path / 'fudan.jsonl')
+    second = CrawlLog('fudan', tmp_path / 'fudan.jsonl')
+    assert first.acquire()
+    if wal_utils.fcntl is not None:
+        assert not second.acquire()
+    first.truncate()
+    assert second.acquire()
+    second.release()
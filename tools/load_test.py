@@ -0,0 +1,136 @@
+"""End-to-end load driver for rss_server.py
+
+Simulates N concurrent feed subscribers against a running RSS server and
+reports latency percentiles together with upstream request amplification,
+i.e. how many upstream requests the mock career sites received per feed
+request. Start the mock and the server first:
+
+    python tools/mock_upstream.py --port 8001 --latency 0.2
+    FUDAN_BASE_URL=http://localhost:8001 SJTU_BASE_URL=http://localhost:8001 \\
+    TONGJI_BASE_URL=http://localhost:8001 DLUT_BASE_URL=http://localhost:8001 \\
+    HUST_BASE_URL=http://localhost:8001 NANKAI_BASE_URL=http://localhost:8001 \\
+    python rss_server.py
+
+    python tools/load_test.py --subscribers 50 --requests 4
+"""
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import urlopen, Request
+from urllib.error import URLError
+import argparse
+import json
+import random
+import time
+
+DEFAULT_PATHS = [
+    '/rss/fudan',
+    '/rss/sjtu',
+    '/rss/tongji',
+    '/rss/hust',
+    '/rss/nankai',
+    '/rss/dlut'
+]
+
+def percentile(values, pct):
+    """Return the pct-th percentile of values using nearest rank"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+def http_json(url, method='GET'):
+    request = Request(url, method=method, data=b'' if method == 'POST' else None)
+    with urlopen(request, timeout=30) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+def subscriber(server, paths, count, timeout, rng):
+    """Fetch count random feeds and return (latency, ok) samples"""
+    samples = []
+    for _ in range(count):
+        url = server + rng.choice(paths)
+        start = time.perf_counter()
+        try:
+            with urlopen(url, timeout=timeout) as response:
+                response.read()
+                ok = response.status == 200
+        except (URLError, OSError):
+            ok = False
+        samples.append((time.perf_counter() - start, ok))
+    return samples
+
+def run(server, mock, subscribers, requests_per_subscriber, paths, timeout, seed=None):
+    """
+    Run the load test
+
+    Args:
+        server: Base URL of rss_server.py
+        mock: Base URL of tools/mock_upstream.py, None to skip amplification
+        subscribers: Number of concurrent subscribers
+        requests_per_subscriber: Feed requests issued by each subscriber
+        paths: Feed paths to choose from
+        timeout: Per-request timeout in seconds
+        seed: Optional random seed
+
+    Returns:
+        dict: Report with latency percentiles and amplification
+    """
+    if mock:
+        http_json(mock + '/__reset', method='POST')
+
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=subscribers) as executor:
+        futures = [
+            executor.submit(subscriber, server, paths, requests_per_subscriber,
+                            timeout, random.Random(rng.random()))
+            for _ in range(subscribers)
+        ]
+        samples = [sample for future in futures for sample in future.result()]
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, ok in samples if ok]
+    report = {
+        'subscribers': subscribers,
+        'requests': len(samples),
+        'errors': sum(1 for _, ok in samples if not ok),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            name: round(percentile(latencies, pct) * 1000, 1) if latencies else None
+            for name, pct in (('p50', 50), ('p90', 90), ('p95', 95), ('p99', 99), ('max', 100))
+        }
+    }
+
+    if mock:
+        upstream = http_json(mock + '/__stats')
+        report['upstream_requests'] = upstream['total']
+        report['upstream_by_school'] = upstream['schools']
+        report['amplification'] = round(upstream['total'] / len(samples), 3) if samples else None
+
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test rss_server.py')
+    parser.add_argument('--server', default='http://localhost:5001')
+    parser.add_argument('--mock', default='http://localhost:8001',
+                        help="Mock upstream base URL, '' to skip amplification")
+    parser.add_argument('--subscribers', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=5, help='Requests per subscriber')
+    parser.add_argument('--paths', default=','.join(DEFAULT_PATHS))
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    report = run(
+        args.server.rstrip('/'),
+        args.mock.rstrip('/') or None,
+        args.subscribers,
+        args.requests,
+        [p for p in args.paths.split(',') if p],
+        args.timeout,
+        seed=args.seed
+    )
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+"""Local stand-in for the university career sites
+
+Replays the listing APIs and pages of all supported schools from the
+fixtures in data/api and data/web, so crawlers can be load-tested without
+touching the real sites. Point the crawlers at it with the
+<SCHOOL>_BASE_URL environment variables, e.g.
+
+    python tools/mock_upstream.py --port 8001 --latency 0.2 --error-rate 0.05
+    FUDAN_BASE_URL=http://localhost:8001 python rss_server.py
+
+Request counters are exposed at GET /__stats and cleared by POST /__reset.
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from pathlib import Path
+import argparse
+import copy
+import json
+import math
+import random
+import re
+import threading
+import time
+
+DATA_DIR = Path('data')
+
+# Items per listing page each upstream serves by default
+NATIVE_PAGE_SIZES = {
+    'fudan': 20,
+    'sjtu': 10,
+    'tongji': 10,
+    'dlut': 15
+}
+
+class MockUpstream:
+    """Generates listing responses from fixtures and counts requests"""
+
+    def __init__(self, pages=50, latency=0.0, jitter=0.0, error_rate=0.0, seed=None, max_page_size=None):
+        self.pages = pages
+        self.max_page_size = max_page_size
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {}
+
+        with open(DATA_DIR / 'api' / 'info.json', 'r', encoding='utf-8') as f:
+            self.fudan = json.load(f)
+        with open(DATA_DIR / 'api' / 'info1.json', 'r', encoding='utf-8') as f:
+            self.dlut = json.load(f)
+        with open(DATA_DIR / 'api' / 'info2.json', 'r', encoding='utf-8') as f:
+            self.sjtu = json.load(f)
+        with open(DATA_DIR / 'api' / 'info3.json', 'r', encoding='utf-8') as f:
+            self.tongji = json.load(f)
+        with open(DATA_DIR / 'web' / 'page.html', 'r', encoding='utf-8') as f:
+            self.hust = f.read()
+        with open(DATA_DIR / 'web' / 'page2.html', 'r', encoding='utf-8') as f:
+            self.nankai = f.read()
+
+    def record(self, school):
+        with self.lock:
+            self.counts[school] = self.counts.get(school, 0) + 1
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+        return {'total': sum(counts.values()), 'schools': counts}
+
+    def reset(self):
+        with self.lock:
+            self.counts = {}
+
+    def delay(self):
+        """Sleep for the configured latency and decide whether to fail"""
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+        return self.random.random() < self.error_rate
+
+    def _slice(self, fixture_items, school, page, size):
+        """Return items for a 1-based page, cycling through the fixture"""
+        total = self.pages * NATIVE_PAGE_SIZES[school]
+        if self.max_page_size:
+            size = min(size, self.max_page_size)
+        start = (page - 1) * size
+        items = []
+        for index in range(start, min(start + size, total)):
+            item = copy.deepcopy(fixture_items[index % len(fixture_items)])
+            items.append((index, item))
+        return items, total
+
+    def fudan_list(self, page, size):
+        items, total = self._slice(self.fudan['data']['list'], 'fudan', page, size)
+        result = []
+        for index, item in items:
+            item['id'] = f"{item['id']}-{index}"
+            item['addtime'] = int(item['addtime']) - index * 60
+            result.append(item)
+        body = copy.deepcopy(self.fudan)
+        body['data'].update({
+            'list': result,
+            'count': total,
+            'page': page,
+            'size': size,
+            'allpage': math.ceil(total / size)
+        })
+        return body
+
+    def sjtu_list(self, page, size):
+        items, total = self._slice(self.sjtu['data']['list'], 'sjtu', page, size)
+        result = []
+        for index, item in items:
+            item['zpxxid'] = f"{item['zpxxid']}{index:06d}"
+            result.append(item)
+        body = copy.deepcopy(self.sjtu)
+        body['data'].update({
+            'list': result,
+            'total': str(total),
+            'pageNum': page,
+            'pageSize': size,
+            'size': len(result),
+            'pages': math.ceil(total / size)
+        })
+        return body
+
+    def tongji_list(self, page, size):
+        items, total = self._slice(self.tongji['object']['newsPage']['list'], 'tongji', page, size)
+        result = []
+        for index, item in items:
+            item['id'] = f"{item['id']}-{index}"
+            item['url'] = f"/frontpage/tongji/html/newsDetail.html?id={item['id']}"
+            result.append(item)
+        body = copy.deepcopy(self.tongji)
+        body['object']['newsPage'].update({
+            'list': result,
+            'pageNo': page,
+            'pageSize': size,
+            'count': total,
+            'length': len(result),
+            'totalPage': math.ceil(total / size)
+        })
+        return body
+
+    def dlut_list(self, page, size):
+        # dlut pages are 0-based
+        items, total = self._slice(self.dlut['newsDTOS'], 'dlut', page + 1, size)
+        result = []
+        for index, item in items:
+            item['id'] = f"{item['id']}-{index}"
+            result.append(item)
+        return {'newsDTOS': result, 'newsDTOSTotal': total}
+
+    def hust_page(self, page):
+        if page > self.pages:
+            # Keep the page layout but drop every job link
+            return re.sub(r'/zpinfo1/[^"]*\.htm', '#', self.hust)
+        html = re.sub(r'/zpinfo1/(\d+)\.htm', rf'/zpinfo1/\1-{page}.htm', self.hust)
+        return re.sub(r'searchJob_(\d+)\.jspx',
+                      lambda m: f'searchJob_{min(int(m.group(1)), self.pages)}.jspx', html)
+
+    def nankai_page(self, page):
+        if page > self.pages:
+            return self.nankai.replace('class="title1"', 'class="title-empty"')
+        html = re.sub(r'/correcruit/content/id/(\d+)\.html', rf'/correcruit/content/id/\1-{page}.html', self.nankai)
+        return re.sub(r'/correcruit/index/p/(\d+)\.html">(\d+)</a>',
+                      lambda m: f'/correcruit/index/p/{min(int(m.group(1)), self.pages)}.html">'
+                                f'{min(int(m.group(2)), self.pages)}</a>', html)
+
+    def detail_page(self, school, key):
+        """Render a minimal detail page for any job ID"""
+        return (
+            '<html><head><meta charset="utf-8"><title>招聘详情</title></head><body>'
+            f'<div class="content"><p>{school} 招聘详情 {key}</p>'
+            '<p>岗位职责：负责相关业务开发与维护。任职要求：本科及以上学历，专业不限。</p></div>'
+            '</body></html>'
+        )
+
+def make_handler(upstream):
+    """Build request handler class bound to a MockUpstream instance"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body, content_type):
+            if isinstance(body, (dict, list)):
+                body = json.dumps(body, ensure_ascii=False)
+            data = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _form(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length).decode('utf-8') if length else ''
+            return {k: v[0] for k, v in parse_qs(raw).items()}
+
+        def _route(self, method):
+            parsed = urlparse(self.path)
+            path = parsed.path
+            query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+            form = self._form() if method == 'POST' else {}
+
+            if path == '/__stats':
+                return self._send(200, upstream.stats(), 'application/json')
+            if path == '/__reset':
+                upstream.reset()
+                return self._send(200, {'ok': True}, 'application/json')
+
+            routes = [
+                ('POST', r'/mobile\.php/enrollment/getlist', 'fudan'),
+                ('POST', r'/career/+zpxx/search/zpxx/(\d+)/(\d+)', 'sjtu'),
+                ('POST', r'/f/newsCenter/ajax_thisNewsAndSiblingCategoryList', 'tongji'),
+                ('GET', r'/portals/ZCMoreNews', 'dlut'),
+                ('GET', r'/searchJob_(\d+)\.jspx', 'hust'),
+                ('GET', r'/correcruit/index/p/(\d+)\.html', 'nankai'),
+                ('GET', r'/zpinfo1/([^/]+)\.htm', 'hust'),
+                ('GET', r'/portals/newspage\.html', 'dlut'),
+                ('GET', r'/correcruit/content/id/([^/]+)\.html', 'nankai')
+            ]
+            for route_method, pattern, school in routes:
+                match = re.fullmatch(pattern, path)
+                if route_method != method or not match:
+                    continue
+
+                upstream.record(school)
+                if upstream.delay():
+                    return self._send(503, 'Service Unavailable', 'text/plain')
+
+                if pattern.startswith(('/zpinfo1', '/portals/newspage', '/correcruit/content')):
+                    key = match.group(1) if match.groups() else query.get('id', '')
+                    return self._send(200, upstream.detail_page(school, key), 'text/html; charset=utf-8')
+
+                if school == 'fudan':
+                    body = upstream.fudan_list(int(form.get('page', 1)), int(form.get('size', 20)))
+                elif school == 'sjtu':
+                    body = upstream.sjtu_list(int(match.group(1)), int(match.group(2)))
+                elif school == 'tongji':
+                    body = upstream.tongji_list(int(form.get('pageNo', 1)), int(form.get('pageSize', 10)))
+                elif school == 'dlut':
+                    body = upstream.dlut_list(int(query.get('page', 0)), int(query.get('size', 15)))
+                elif school == 'hust':
+                    return self._send(200, upstream.hust_page(int(match.group(1))), 'text/html; charset=utf-8')
+                else:
+                    return self._send(200, upstream.nankai_page(int(match.group(1))), 'text/html; charset=utf-8')
+                return self._send(200, body, 'application/json; charset=utf-8')
+
+            self._send(404, 'Not Found', 'text/plain')
+
+        def do_GET(self):
+            self._route('GET')
+
+        def do_POST(self):
+            self._route('POST')
+
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock career-site upstream for load tests')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--pages', type=int, default=50, help='Listing pages available per school')
+    parser.add_argument('--latency', type=float, default=0.0, help='Mean response latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Uniform latency jitter in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--max-page-size', type=int, default=None,
+                        help='Cap on items per page the JSON APIs honor')
+    args = parser.parse_args()
+
+    upstream = MockUpstream(
+        pages=args.pages,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        seed=args.seed,
+        max_page_size=args.max_page_size
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(upstream))
+    print(f"Mock upstream listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()